@@ -1,62 +1,314 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, g, has_request_context, request, jsonify, stream_with_context
 import mysql.connector
 import jwt
 import datetime
-import bcrypt
+import os
+import sys
+import time
+import uuid
 from functools import wraps
 from mysql.connector import Error
+from mysql.connector.constants import ClientFlag
 from pydantic import ValidationError
-from models  import CreateItemRequest, UpdateItemRequest, ItemResponse, GetAllItems
+from werkzeug.local import LocalProxy
+from models  import CreateItemRequest, UpdateItemRequest, BulkUpdateItemRequest, ItemResponse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.blocklist import make_blocklist
+from common.bulk import bulk_payload, parse_ids, row_results, validate_rows
+from common.cache import make_item_cache
+from common.compression import Compression
+from common.csv_io import csv_chunks, import_progress, read_csv_items
+from common.db_pool import ConnectionPool, PoolTimeout
+from common.etag import (add_validators, if_match_version, is_not_modified, item_cache_entry, item_entry_response,
+                         item_etag, not_modified)
+from common.filters import ItemQuery
+from common.hashing import HasherBusy, PasswordHasher
+from common.item_events import EventsRepository, make_item_events
+from common.item_feed import ItemFeed
+from common.item_stats import ItemStats, StatsRepository
+from common.lifecycle import Lifecycle
+from common.metrics import Metrics, TimedConnection, timed
+from common.migrations import create_database, migrate
+from common.pagination import STREAM_CONTENT_TYPES, next_link, parse_page_args, stream_body
+from common.ratelimit import client_address, make_rate_limiter, parse_rate_limit, retry_after_header
+from common.replicas import ReplicaRouter, parse_hosts
+from common.repository import RepositoryError, make_item_repository
+from common.serializers import ItemSerializer, dumps_str, install_json_provider, parse_fields
+from common.write_behind import GroupCommitter, QueueFull, make_ticket_store
+
+# Settings from the environment (and the defaults this app has always used);
+# create_app(config) overrides any of them
+def load_config():
+    return {
+        'SECRET_KEY': 'fc3e90f3c184d87568ba60c8dcddcc30',
+
+        'DB_CONFIG': {
+            "host": "localhost",
+            "user": "root",
+            "password": "user@123",
+            "database": "TestDB"
+        },
+        # Callable returning a new DB-API connection in place of mysql.connector.connect(**DB_CONFIG)
+        'MYSQL_CONNECTION_CREATOR': None,
+
+        # Optional read replicas ("host[:port],..."); lagging ones fall back to the primary
+        'MYSQL_REPLICA_HOSTS': parse_hosts(os.getenv('MYSQL_REPLICA_HOSTS')),
+        'MYSQL_REPLICA_STRATEGY': os.getenv('MYSQL_REPLICA_STRATEGY', 'least_busy'),
+        'MYSQL_REPLICA_MAX_LAG': float(os.getenv('MYSQL_REPLICA_MAX_LAG', 5)),
+        'READ_YOUR_WRITES_SECONDS': float(os.getenv('READ_YOUR_WRITES_SECONDS', 5)),
+
+        'REDIS_URL': os.getenv('REDIS_URL'),
+
+        # /items/events keeps the last ITEM_FEED_BUFFER_SIZE changes per worker for Last-Event-ID resume
+        'ITEM_FEED_BUFFER_SIZE': int(os.getenv('ITEM_FEED_BUFFER_SIZE', 1000)),
+        'ITEM_FEED_MAX_CLIENTS': int(os.getenv('ITEM_FEED_MAX_CLIENTS', 100)),
+
+        # Items live in MySQL unless ITEM_BACKEND says otherwise (sqlite, memory or mongo)
+        'ITEM_BACKEND': os.getenv('ITEM_BACKEND', 'mysql'),
+        'ITEM_SQLITE_PATH': os.getenv('ITEM_SQLITE_PATH'),
+        'MONGO_URI': os.getenv('MONGO_URI'),
+
+        # /items/stats is rebuilt from the table every ITEM_STATS_RECONCILE_INTERVAL seconds
+        'ITEM_STATS_RECONCILE_INTERVAL': float(os.getenv('ITEM_STATS_RECONCILE_INTERVAL', 300)),
+
+        # CREATE_ITEM_MODE: direct (INSERT + COMMIT per request), async (queue the item and
+        # answer 202 with a ticket) or strong (queue it and answer once its group commit lands)
+        'CREATE_ITEM_MODE': os.getenv('CREATE_ITEM_MODE', 'direct'),
+        'GROUP_COMMIT_WAIT': float(os.getenv('GROUP_COMMIT_WAIT', 5)),
+        'GROUP_COMMIT_MAX_BATCH': int(os.getenv('GROUP_COMMIT_MAX_BATCH', 500)),
+        'GROUP_COMMIT_MAX_DELAY': float(os.getenv('GROUP_COMMIT_MAX_DELAY', 0.005)),
+        'GROUP_COMMIT_MAX_QUEUE': int(os.getenv('GROUP_COMMIT_MAX_QUEUE', 10000)),
+
+        # Token lifetime, and the users allowed to revoke other users' tokens
+        'TOKEN_MAX_AGE': 60 * 60,
+        'ADMIN_USERS': set(filter(None, os.getenv('ADMIN_USERS', '').split(','))),
+
+        # Token buckets for /login and /register per client IP and per username, and for authenticated
+        # routes per token identity ("count/period" or "off"), checked before any hashing or DB work;
+        # shared across workers through Redis when REDIS_URL is set
+        'RATE_LIMITS': {
+            ('login', 'ip'): parse_rate_limit(os.getenv('LOGIN_RATE_LIMIT_IP', '60/minute')),
+            ('login', 'user'): parse_rate_limit(os.getenv('LOGIN_RATE_LIMIT_USER', '10/minute')),
+            ('register', 'ip'): parse_rate_limit(os.getenv('REGISTER_RATE_LIMIT_IP', '30/minute')),
+            ('register', 'user'): parse_rate_limit(os.getenv('REGISTER_RATE_LIMIT_USER', '5/minute')),
+            ('api', 'user'): parse_rate_limit(os.getenv('API_RATE_LIMIT_USER', 'off')),
+        },
+        # Proxies in front of the app whose X-Forwarded-For is trusted for the client address
+        'TRUSTED_PROXIES': int(os.getenv('TRUSTED_PROXIES', 0)),
+
+        # gzip/brotli for JSON bodies over COMPRESSION_MIN_SIZE bytes, streamed listings included,
+        # plus a small cache of compressed collection snapshots
+        'COMPRESSION_MIN_SIZE': int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),
+        'COMPRESSION_LEVEL': int(os.getenv('COMPRESSION_LEVEL', 6)),
+        'BROTLI_QUALITY': int(os.getenv('BROTLI_QUALITY', 4)),
+        'COMPRESSION_CACHE_SIZE': int(os.getenv('COMPRESSION_CACHE_SIZE', 32)),
+
+        'JSON_SERIALIZER': os.getenv('JSON_SERIALIZER', 'raw'),
+
+        # MIGRATE_ON_STARTUP=1 runs migrations once in the gunicorn master, before forking
+        'MIGRATE_ON_STARTUP': os.getenv('MIGRATE_ON_STARTUP', '0') == '1',
+    }
+
+# The authenticated username, if there is a request and it carried a token
+def request_username():
+    return g.get('token', {}).get('username') if has_request_context() else None
+
+# What the routes share, built per app by create_app and kept at
+# app.extensions['crud_mysql']. Nothing here connects or starts a thread: pools
+# open on first checkout, and start() runs in each worker after the fork.
+class Resources:
+    def __init__(self, config):
+        db_config = config['DB_CONFIG']
+        # FOUND_ROWS: UPDATE rowcount reports matched rows, so "not found" needs no extra SELECT
+        self.db_pool = ConnectionPool(pool_size=5, max_overflow=10, timeout=10, recycle=3600,
+                                      creator=config['MYSQL_CONNECTION_CREATOR'],
+                                      client_flags=[ClientFlag.FOUND_ROWS], **db_config)
+
+        self.replica_router = ReplicaRouter.from_hosts(
+            self.db_pool,
+            config['MYSQL_REPLICA_HOSTS'],
+            pool_size=5, max_overflow=10, timeout=10, recycle=3600,
+            strategy=config['MYSQL_REPLICA_STRATEGY'],
+            max_lag=config['MYSQL_REPLICA_MAX_LAG'],
+            sticky_seconds=config['READ_YOUR_WRITES_SECONDS'],
+            user=db_config['user'], password=db_config['password'], database=db_config['database']
+        )
 
-# Initialize Flask app
-app = Flask(__name__)
+        # bcrypt runs in a bounded process pool; raising `rounds` rehashes users on their next login
+        self.password_hasher = PasswordHasher(scheme='bcrypt', rounds=12, workers=2, max_pending=32)
 
+        self.item_cache = make_item_cache(redis_url=config['REDIS_URL'], maxsize=1024, ttl=60)
 
-app.config['SECRET_KEY'] = 'fc3e90f3c184d87568ba60c8dcddcc30'
+        # Writes publish change events through Redis (when REDIS_URL is set) that evict the
+        # item from every other worker's local cache
+        self.item_events = make_item_events(redis_url=config['REDIS_URL'], cache=self.item_cache.local)
 
-def get_db_connection():
-    try:
-        connection = mysql.connector.connect(
-            host="localhost",  
-            user="root", 
-            password="user@123", 
-            database="TestDB"
+        # /items/events fans those events out to connected clients
+        self.item_feed = ItemFeed(buffer_size=config['ITEM_FEED_BUFFER_SIZE'],
+                                  max_clients=config['ITEM_FEED_MAX_CLIENTS'])
+        self.item_events.add_listener(self.item_feed.notify)
+
+        # Revoked token ids, checked in token_required; shared across workers through Redis when REDIS_URL is set
+        self.token_blocklist = make_blocklist(redis_url=config['REDIS_URL'], max_token_age=config['TOKEN_MAX_AGE'])
+
+        self.rate_limiter = make_rate_limiter(redis_url=config['REDIS_URL'])
+
+        item_repository = make_item_repository(
+            config['ITEM_BACKEND'],
+            get_connection=self.get_db_connection,
+            get_read_connection=self.get_read_db_connection,
+            sqlite_path=config['ITEM_SQLITE_PATH'],
+            mongo_uri=config['MONGO_URI']
         )
-        if connection.is_connected():
-            return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
 
+        # Price statistics for /items/stats, maintained on every write through item_repository
+        self.item_stats = ItemStats(item_repository, reconcile_interval=config['ITEM_STATS_RECONCILE_INTERVAL'])
+        item_repository = StatsRepository(item_repository, self.item_stats)
+        self.item_repository = EventsRepository(item_repository, self.item_events)
+
+        # Write-behind queue for the async/strong create modes. Ticket states live in
+        # Redis when REDIS_URL is set, so any worker can answer a poll.
+        self.group_committer = GroupCommitter(
+            self.item_repository,
+            max_batch=config['GROUP_COMMIT_MAX_BATCH'],
+            max_delay=config['GROUP_COMMIT_MAX_DELAY'],
+            max_queue=config['GROUP_COMMIT_MAX_QUEUE'],
+            tickets=make_ticket_store(redis_url=config['REDIS_URL'])
+        )
+
+        self.item_serializer = ItemSerializer(ItemResponse, mode=config['JSON_SERIALIZER'])
+
+    def get_db_connection(self):
+        try:
+            with timed('pool_wait'):
+                conn = self.db_pool.get_connection()
+            return TimedConnection(conn)
+        except (Error, PoolTimeout) as e:
+            print(f"Error connecting to MySQL: {e}")
+            return None
+
+    # Same, for read-only queries: a replica unless the user wrote recently or none is fit
+    def get_read_db_connection(self):
+        try:
+            with timed('pool_wait'):
+                conn = self.replica_router.get_connection(request_username())
+            return TimedConnection(conn)
+        except (Error, PoolTimeout) as e:
+            print(f"Error connecting to MySQL: {e}")
+            return None
+
+    # Each worker subscribes to item events and syncs the blocklist right after the
+    # fork; both also start on first use when there is no post-fork hook
+    def start(self):
+        self.item_events.ensure_started()
+        self.token_blocklist.ensure_started()
+
+    # Flush queued creates first; they still need the pools
+    def close(self):
+        self.group_committer.close()
+        self.item_events.stop()
+        self.item_stats.close()
+        self.token_blocklist.stop()
+        self.password_hasher.shutdown()
+        self.replica_router.dispose()
+        self.db_pool.dispose()
+
+# The current app's Resources
+def resources():
+    return current_app.extensions['crud_mysql']
+
+# The routes below use these names; each resolves to the current app's resource
+def _resource(name):
+    return LocalProxy(lambda: getattr(resources(), name))
+
+db_pool = _resource('db_pool')
+replica_router = _resource('replica_router')
+password_hasher = _resource('password_hasher')
+item_cache = _resource('item_cache')
+item_feed = _resource('item_feed')
+token_blocklist = _resource('token_blocklist')
+rate_limiter = _resource('rate_limiter')
+item_repository = _resource('item_repository')
+item_stats = _resource('item_stats')
+group_committer = _resource('group_committer')
+item_serializer = _resource('item_serializer')
+compression = LocalProxy(lambda: current_app.extensions['compression'])
+
+def get_db_connection():
+    return resources().get_db_connection()
+
+# Create the database if needed and apply pending schema migrations for the current app
+# (also available as `python -m common.migrations upgrade`)
 def initialize_db():
+    create_database(**current_app.config['DB_CONFIG'])
     conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
 
-    cursor.execute(f"CREATE DATABASE IF NOT EXISTS TestDB")
-    
-    
-    # Create the items table if it doesn't exist
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS items (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        name VARCHAR(100) NOT NULL,
-        description TEXT,
-        price DECIMAL(10, 2),
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # Create the users table for login
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        username VARCHAR(100) NOT NULL,
-        password VARCHAR(255) NOT NULL
-    )
-    """)
-
-    cursor.close()
-    conn.close()
+bp = Blueprint('crud_mysql', __name__)
+
+# WSGI entry point for gunicorn ('crud_mysql:create_app()'): a new app with its
+# own pools, caches and threads, configured by load_config() and then `config`
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+
+    # Use orjson for jsonify() when it is installed
+    install_json_provider(app)
+
+    res = app.extensions['crud_mysql'] = Resources(app.config)
+    app.before_request(res.item_events.ensure_started)
+
+    # Request latency and per-phase timings, served at /metrics
+    metrics = Metrics().init_app(app)
+    metrics.add_gauges('mysql_pool', res.db_pool.stats, "Connection pool statistics.")
+    metrics.add_gauges('rate_limit', res.rate_limiter.stats, "Login, registration and per-user API throttling.")
+
+    app.extensions['compression'] = Compression(
+        min_size=app.config['COMPRESSION_MIN_SIZE'],
+        level=app.config['COMPRESSION_LEVEL'],
+        brotli_quality=app.config['BROTLI_QUALITY'],
+        cache_size=app.config['COMPRESSION_CACHE_SIZE']
+    ).init_app(app)
+    metrics.add_gauges('compression', app.extensions['compression'].stats,
+                       "Response compression and compressed body cache.")
+    metrics.add_gauges('mysql_replicas', res.replica_router.stats, "Read routing between primary and replicas.")
+    metrics.add_gauges('item_stats', res.item_stats.stats, "Incremental item price statistics.")
+    metrics.add_gauges('item_events', res.item_events.stats, "Cross-node item change events.")
+    metrics.add_gauges('item_feed', res.item_feed.stats, "Connected /items/events clients and their backlog.")
+    metrics.add_gauges('group_commit', res.group_committer.stats, "Write-behind create_item queue statistics.")
+
+    app.register_blueprint(bp)
+
+    # gunicorn hooks (see gunicorn.conf.py)
+    lifecycle = Lifecycle().init_app(app)
+
+    @lifecycle.on_startup
+    def migrate_on_startup():
+        if app.config['MIGRATE_ON_STARTUP']:
+            with app.app_context():
+                initialize_db()
+            res.db_pool.dispose()
+
+    lifecycle.on_worker_start(res.start)
+    lifecycle.on_drain(res.item_feed.close_all)
+    lifecycle.on_shutdown(res.close)
+    return app
+
+# Read your writes: after a successful write the user reads from the primary for a while
+@bp.after_app_request
+def pin_writers_to_primary(response):
+    if request.method not in ('GET', 'HEAD') and response.status_code < 400:
+        replica_router.note_write(request_username())
+    return response
+
+@bp.app_errorhandler(RepositoryError)
+def repository_error(e):
+    return jsonify({"message": str(e)}), 500
 
 def token_required(f):
     @wraps(f)
@@ -68,20 +320,44 @@ def token_required(f):
             return jsonify({'message': 'Token is missing!'}), 403
         
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"], options={"verify_exp": True})
+            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"], options={"verify_exp": True})
             current_user = data['username']
         except jwt.ExpiredSignatureError:
             return jsonify({'message': 'Token has expired!'}), 403
         except jwt.InvalidTokenError:
             return jsonify({'message': 'Invalid token!'}), 403
-        
+
+        if token_blocklist.is_revoked(data.get('jti'), current_user, data.get('iat')):
+            return jsonify({'message': 'Token has been revoked!'}), 403
+
+        limited = rate_limited('api', user=current_user)
+        if limited:
+            return limited
+
+        g.token = data
         return f(current_user, *args, **kwargs)
     
     return decorated_function
 
 
-@app.route('/register', methods=['POST'])
+# 429 response if any of `keys` (ip=..., user=...) is over its limit for `endpoint`, else None
+def rate_limited(endpoint, **keys):
+    for kind, value in keys.items():
+        limit = current_app.config['RATE_LIMITS'][(endpoint, kind)]
+        if limit is None or value is None:
+            continue
+        retry_after = rate_limiter.hit(f'{endpoint}:{kind}:{value}', limit)
+        if retry_after:
+            return jsonify({"message": "Too many requests, please retry later"}), 429, retry_after_header(retry_after)
+    return None
+
+
+@bp.route('/register', methods=['POST'])
 def register():
+    limited = rate_limited('register', ip=client_address(request, current_app.config['TRUSTED_PROXIES']))
+    if limited:
+        return limited
+
     data = request.get_json()
 
     if not data.get('username') or not data.get('password'):
@@ -90,6 +366,16 @@ def register():
     username = data.get('username')
     password = data.get('password')
 
+    limited = rate_limited('register', user=username)
+    if limited:
+        return limited
+
+    # Hash before taking a connection so the pool isn't held for the KDF
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HasherBusy:
+        return jsonify({"message": "Server busy, please retry"}), 503, {'Retry-After': '1'}
+
     conn = get_db_connection()
     if not conn:
         return jsonify({"message": "Failed to connect to the database!"}), 500
@@ -102,7 +388,6 @@ def register():
         if existing_user:
             return jsonify({"message": "User already exists"}), 400
 
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
         cursor.execute('INSERT INTO users (username, password) VALUES (%s, %s)', (username, hashed_password))
         conn.commit()
 
@@ -119,8 +404,12 @@ def register():
         conn.close()
 
 # Route for user login (Generate JWT Token)
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
+    limited = rate_limited('login', ip=client_address(request, current_app.config['TRUSTED_PROXIES']))
+    if limited:
+        return limited
+
     data = request.get_json()
 
     if not data.get('username') or not data.get('password'):
@@ -129,6 +418,10 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
+    limited = rate_limited('login', user=username)
+    if limited:
+        return limited
+
     conn = get_db_connection()
     if not conn:
         return jsonify({"message": "Failed to connect to the database!"}), 500
@@ -137,26 +430,71 @@ def login():
     try:
         cursor.execute('SELECT * FROM users WHERE username = %s', (username,))
         user = cursor.fetchone()
-
-        if user and bcrypt.checkpw(password.encode('utf-8'), user[2].encode('utf-8')):
-            # Generate JWT token
-            token = jwt.encode({'username': username, 'exp': datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(hours=1)},
-                               app.config['SECRET_KEY'], algorithm="HS256")
-            return jsonify({"access_token": token}), 200
-        else:
-            return jsonify({"message": "Invalid credentials"}), 401
     except Error as e:
         return jsonify({"message": f"Database error: {str(e)}"}), 500
     finally:
         cursor.close()
         conn.close()
 
+    # The connection is back in the pool before the (much slower) KDF runs
+    try:
+        if not (user and password_hasher.verify(user[2], password)):
+            return jsonify({"message": "Invalid credentials"}), 401
+        new_hash = password_hasher.rehash_if_needed(user[2], password)
+    except HasherBusy:
+        return jsonify({"message": "Server busy, please retry"}), 503, {'Retry-After': '1'}
+
+    if new_hash:
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({"message": "Failed to connect to the database!"}), 500
+        cursor = conn.cursor()
+        try:
+            cursor.execute('UPDATE users SET password = %s WHERE id = %s', (new_hash, user[0]))
+            conn.commit()
+        except Error as e:
+            return jsonify({"message": f"Database error: {str(e)}"}), 500
+        finally:
+            cursor.close()
+            conn.close()
+
+    # Generate JWT token
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    token = jwt.encode({'username': username, 'jti': uuid.uuid4().hex, 'iat': now,
+                        'exp': now + datetime.timedelta(seconds=current_app.config['TOKEN_MAX_AGE'])},
+                       current_app.config['SECRET_KEY'], algorithm="HS256")
+    return jsonify({"access_token": token}), 200
+
+# Route to log out (revokes the token used for this request)
+@bp.route('/logout', methods=['POST'])
+@token_required
+def logout(current_user):
+    token_blocklist.revoke(g.token.get('jti'), g.token['exp'])
+    return jsonify({"message": "Successfully logged out"}), 200
+
+# Route for admins to revoke a token by jti, or all tokens issued so far to a user
+@bp.route('/admin/revoke', methods=['POST'])
+@token_required
+def revoke_token(current_user):
+    if current_user not in current_app.config['ADMIN_USERS']:
+        return jsonify({"message": "Admin access required"}), 403
+
+    data = request.get_json(silent=True) or {}
+    if data.get('jti'):
+        token_blocklist.revoke(data['jti'], time.time() + current_app.config['TOKEN_MAX_AGE'])
+        return jsonify({"message": "Token revoked"}), 200
+    if data.get('username'):
+        token_blocklist.revoke_user(data['username'])
+        return jsonify({"message": f"Tokens for {data['username']} revoked"}), 200
+    return jsonify({"message": "Provide a jti or username"}), 400
+
 # Route to create an item (Protected by JWT)
-@app.route('/create_item', methods=['POST'])
+@bp.route('/create_item', methods=['POST'])
 @token_required
 def create_item(current_user):
     try:
-        data = CreateItemRequest.model_validate(request.get_json())
+        with timed('validation'):
+            data = CreateItemRequest.model_validate(request.get_json())
         print(data)
 
     except ValidationError as e:
@@ -168,90 +506,162 @@ def create_item(current_user):
     description = data.description
     price = data.price
 
-    # Handle database connection
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"message": "Failed to connect to the database!"}), 500
-
-    cursor = conn.cursor()
-    try:
-        # Insert item into the database
-        cursor.execute('INSERT INTO items (name, description, price) VALUES (%s, %s, %s)',
-                       (name, description, price))
-        conn.commit()
-
-        item_id = cursor.lastrowid
-        # Return success message with item details
-        return jsonify({
-            "message": "Item created successfully",
-            "item": {
-                "id":item_id,
-                "name": name,
-                "description": description,
-                "price": str(price) 
-            }
-        }), 201
-    except Error as e:
-        return jsonify({"message": f"Database error: {str(e)}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    if current_app.config['CREATE_ITEM_MODE'] == 'direct':
+        item_id = item_repository.create(name, description, price)
+    else:
+        try:
+            ticket = group_committer.submit(data)
+        except QueueFull:
+            return jsonify({"message": "Server busy, please retry"}), 503, {'Retry-After': '1'}
+
+        item_id = None
+        if current_app.config['CREATE_ITEM_MODE'] == 'strong':
+            with timed('db'):
+                item_id = ticket.result(timeout=current_app.config['GROUP_COMMIT_WAIT'])
+        if item_id is None:
+            location = f'/create_item/tickets/{ticket.id}'
+            return jsonify({"message": "Item queued for creation", "ticket": ticket.id}), 202, {'Location': location}
+
+    # Return success message with item details
+    return jsonify({
+        "message": "Item created successfully",
+        "item": {
+            "id":item_id,
+            "name": name,
+            "description": description,
+            "price": str(price) 
+        }
+    }), 201
+
+# Route to check on a queued create: queued, committed (with the item id) or failed
+@bp.route('/create_item/tickets/<ticket_id>', methods=['GET'])
+@token_required
+def create_item_ticket(current_user, ticket_id):
+    state = group_committer.ticket_state(ticket_id)
+    if state is None:
+        return jsonify({"message": "Ticket not found"}), 404
+    return jsonify(state), 200
 
 # Route to get all items (Protected by JWT)
-@app.route('/get_items', methods=['GET'])
+# Paged with ?limit=&after=<cursor>, or streamed with ?stream=ndjson|json
+# Filters: name_prefix, min_price, max_price, created_after, created_before; sort: id|name|price|created_at (- for desc)
+# ?fields=id,name,price returns (and reads) only those fields
+@bp.route('/get_items', methods=['GET'])
 @token_required
 def get_items(current_user):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"message": "Failed to connect to the database!"}), 500
+    try:
+        limit, after_id, stream = parse_page_args(request.args)
+        fields = parse_fields(request.args.get('fields'), ItemResponse)
+        query = ItemQuery.from_args(request.args).select(fields)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    serializer = item_serializer.project(fields)
 
-    cursor = conn.cursor()
     try:
-        cursor.execute('SELECT * FROM items')
-        items = cursor.fetchall()
-        if items:
-            items_list = [ItemResponse(id=item[0], name=item[1], description=item[2], price=item[3], created_at=item[4].isoformat()) for item in items]
-            response = GetAllItems(items=items_list)
-            return jsonify(response.model_dump()), 200
-        else:
-            return jsonify(message="No items found"), 404
-    except Error as e:
-        return jsonify({"message": f"Database error: {str(e)}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        listing = item_repository.listing(query, request.query_string.decode())
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Conditional requests are answered from the count/max(updated_at) fingerprint alone
+    if is_not_modified(request, listing.etag, listing.last_modified):
+        listing.close()
+        return not_modified(listing.etag, listing.last_modified)
+
+    # Same snapshot as a recent request: replay its compressed body
+    cached = compression.cached_response(listing.etag)
+    if cached is not None:
+        listing.close()
+        return add_validators(cached, listing.etag, listing.last_modified)
+
+    if stream:
+        resp = Response(stream_body(stream, listing.stream(), serializer.item_dict, dumps=dumps_str),
+                        mimetype=STREAM_CONTENT_TYPES[stream])
+        return add_validators(resp, listing.etag, listing.last_modified)
+
+    with listing:
+        items, next_cursor = listing.page(limit)
+    if items or after_id:
+        with timed('serialization'):
+            body = serializer.dumps_page(items, next_cursor)
+        resp = add_validators(Response(body, mimetype='application/json'), listing.etag, listing.last_modified)
+        if next_cursor:
+            resp.headers['Link'] = next_link(request, next_cursor)
+        return resp, 200
+    else:
+        return jsonify(message="No items found"), 404
+
+# CSV export of the items table (same filters, sort and ?fields= as /get_items),
+# streamed from a server-side cursor
+@bp.route('/items/export.csv', methods=['GET'])
+@token_required
+def export_items_csv(current_user):
+    try:
+        fields = parse_fields(request.args.get('fields'), ItemResponse)
+        query = ItemQuery.from_args(request.args).select(fields)
+        listing = item_repository.listing(query, 'csv:' + request.query_string.decode())
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    if is_not_modified(request, listing.etag, listing.last_modified):
+        listing.close()
+        return not_modified(listing.etag, listing.last_modified)
+
+    resp = Response(csv_chunks(listing.stream(), fields or tuple(ItemResponse.model_fields)), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=items.csv'})
+    return add_validators(resp, listing.etag, listing.last_modified)
+
+# CSV import: the body (or multipart field "file") is parsed as it arrives and
+# inserted in validated chunks; progress and per-line errors stream back as NDJSON
+@bp.route('/items/import', methods=['POST'])
+@token_required
+def import_items_csv(current_user):
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({"message": "Missing CSV file field 'file'"}), 400
+        stream = upload.stream
+    else:
+        stream = request.stream
 
-@app.route('/get_item_by_id/<int:item_id>', methods=['GET'])
+    try:
+        chunks = read_csv_items(stream, CreateItemRequest)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    progress = import_progress(chunks, item_repository.create_many, dumps=dumps_str)
+    return Response(stream_with_context(progress), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-transform'})
+
+@bp.route('/get_item_by_id/<int:item_id>', methods=['GET'])
 @token_required
 def get_item_by_id(current_user, item_id):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"message": "Failed to connect to the database!"}), 500
-
-    cursor = conn.cursor()
     try:
-        cursor.execute('SELECT * FROM items WHERE id = %s', (item_id,))
-        item = cursor.fetchone()
+        fields = parse_fields(request.args.get('fields'), ItemResponse)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-        if item:
-            item_data = ItemResponse(id=item[0], name=item[1], description=item[2], price=item[3], created_at=item[4].isoformat())
-            return jsonify(item_data.model_dump()), 200
-        else:
-            return jsonify(message="Item not found"), 404
+    cached = item_cache.get(str(item_id))
+    if cached is not None:
+        return item_entry_response(request, cached, fields)
 
-    except Error as e:
-        return jsonify({"message": f"Database error: {str(e)}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    # The entry is shared through Redis, so fill it from the primary: a lagging
+    # replica's copy would outlive the replica's own lag by the cache TTL
+    item = item_repository.get(item_id, primary=True)
+
+    if item:
+        entry = item_cache_entry(item_serializer.item_dict(item), item_id, item[5], item[6])
+        item_cache.set(str(item_id), entry)
+        return item_entry_response(request, entry, fields)
+    else:
+        return jsonify(message="Item not found"), 404
 
 
 # Route to update an item (Protected by JWT)
-@app.route('/update_item/<int:item_id>', methods=['PUT'])
+@bp.route('/update_item/<int:item_id>', methods=['PUT'])
 @token_required
 def update_item(current_user, item_id):
     try:
-        data = UpdateItemRequest.model_validate(request.get_json())
+        with timed('validation'):
+            data = UpdateItemRequest.model_validate(request.get_json())
     except ValidationError as e:
         return jsonify({"message": "Invalid data", "errors": e.errors()}), 400
     
@@ -265,50 +675,137 @@ def update_item(current_user, item_id):
     description = data.get('description') 
     price = data.get('price')
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"message": "Failed to connect to the database!"}), 500
+    # If-Match makes it a compare-and-set on the item's version: 412 if it moved on
+    conditional, version = if_match_version(request, item_id)
+    if not item_repository.update(item_id, name, description, price, version=version):
+        if conditional:
+            return jsonify({"message": "Item was modified or deleted; fetch it again"}), 412
+        return jsonify({"message": "Item not found"}), 404
+    item_cache.delete(str(item_id))
 
-    cursor = conn.cursor()
-    try:
-        cursor.execute('UPDATE items SET name = %s, description = %s, price = %s WHERE id = %s',
-                       (name, description, price, item_id))
-        conn.commit()
-        return jsonify({"message": "Item updated successfully"}), 200
-    except Error as e:
-        return jsonify({"message": f"Database error: {str(e)}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    resp = jsonify({"message": "Item updated successfully"})
+    if version is not None:
+        resp.set_etag(item_etag(item_id, version + 1))
+    return resp, 200
 
 # Route to delete an item (Protected by JWT)
-@app.route('/delete_item/<int:item_id>', methods=['DELETE'])
+@bp.route('/delete_item/<int:item_id>', methods=['DELETE'])
 @token_required
 def delete_item(current_user, item_id):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"message": "Failed to connect to the database!"}), 500
-
-    cursor = conn.cursor()
-    try:
-        cursor.execute('SELECT * FROM items WHERE id = %s', (item_id,))
-        item = cursor.fetchone()
+    # One round trip: the DELETE's rowcount says whether the item existed
+    if not item_repository.delete(item_id):
+        return jsonify({"message": "Item not found"}), 404
 
-        if not item:
-            return jsonify({"message": "Item not found"}), 404  
+    item_cache.delete(str(item_id))
+    return jsonify({"message": "Item deleted successfully"}), 200
 
-        cursor.execute('DELETE FROM items WHERE id = %s', (item_id,))
-        conn.commit()
-        return jsonify({"message": "Item deleted successfully"}), 200
+# Route to create many items in one transaction (Protected by JWT)
+@bp.route('/items/bulk', methods=['POST'])
+@token_required
+def bulk_create_items(current_user):
+    try:
+        rows = bulk_payload(request.get_json())
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    with timed('validation'):
+        items, errors = validate_rows(CreateItemRequest, rows)
+    if errors:
+        return jsonify({"message": "Invalid data", "errors": errors}), 400
+
+    ids = item_repository.create_many(items)
+    return jsonify({
+        "message": f"{len(ids)} items created successfully",
+        "results": [{"index": index, "id": item_id} for index, item_id in enumerate(ids)]
+    }), 201
+
+# Route to update many items in one transaction (Protected by JWT)
+@bp.route('/items/bulk', methods=['PUT'])
+@token_required
+def bulk_update_items(current_user):
+    try:
+        rows = bulk_payload(request.get_json())
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    with timed('validation'):
+        items, errors = validate_rows(BulkUpdateItemRequest, rows)
+    if errors:
+        return jsonify({"message": "Invalid data", "errors": errors}), 400
+
+    found = item_repository.update_many(items)
+    for item_id in found:
+        item_cache.delete(str(item_id))
+    return jsonify({
+        "message": f"{len(found)} items updated successfully",
+        "results": row_results([item.id for item in items], found, "updated")
+    }), 200
+
+# Route to delete many items in one transaction (Protected by JWT)
+@bp.route('/items/bulk', methods=['DELETE'])
+@token_required
+def bulk_delete_items(current_user):
+    try:
+        ids = parse_ids(bulk_payload(request.get_json(), key='ids'))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    found = item_repository.delete_many(ids)
+    for item_id in found:
+        item_cache.delete(str(item_id))
+    return jsonify({
+        "message": f"{len(found)} items deleted successfully",
+        "results": row_results(ids, found, "deleted")
+    }), 200
+
+# Route to inspect connection pool usage
+@bp.route('/pool_stats', methods=['GET'])
+@token_required
+def pool_stats(current_user):
+    return jsonify(db_pool.stats()), 200
 
-    except Error as e:
-        return jsonify({"message": f"Database error: {str(e)}"}), 500
+# Route to inspect replica health, lag and how reads were routed
+@bp.route('/replica_stats', methods=['GET'])
+@token_required
+def replica_stats(current_user):
+    return jsonify({**replica_router.stats(), "replicas": replica_router.replica_stats()}), 200
 
-    finally:
-        cursor.close()
-        conn.close()
+# Route to inspect the write-behind queue (batch sizes, commit latency, queue depth)
+@bp.route('/group_commit_stats', methods=['GET'])
+@token_required
+def group_commit_stats(current_user):
+    return jsonify(group_committer.stats()), 200
 
-initialize_db()
+# Route for count, sum, min, max, average and approximate percentiles of item prices,
+# answered from the running aggregate without reading the table
+@bp.route('/items/stats', methods=['GET'])
+@token_required
+def item_price_stats(current_user):
+    snapshot = item_stats.snapshot()
+    if snapshot is None:
+        return jsonify({"message": "Statistics are still loading, please retry"}), 503, {'Retry-After': '1'}
+    return jsonify(snapshot), 200
+
+# Server-Sent Events stream of item changes, replacing polling of /get_items.
+# Resumes from Last-Event-ID when the change is still buffered; otherwise sends
+# a `reset` event and the client should reload the collection.
+@bp.route('/items/events', methods=['GET'])
+@token_required
+def item_change_events(current_user):
+    subscription = item_feed.subscribe(request.headers.get('Last-Event-ID'))
+    if subscription is None:
+        return jsonify({"message": "Too many event stream clients, please retry"}), 503, {'Retry-After': '5'}
+    return Response(subscription.chunks(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Route to inspect item cache hit/miss/eviction counters
+@bp.route('/cache_stats', methods=['GET'])
+@token_required
+def cache_stats(current_user):
+    return jsonify(item_cache.stats()), 200
 
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        initialize_db()
     app.run(debug=True,port=3000)
@@ -12,6 +12,12 @@ class UpdateItemRequest(BaseModel):
     description: Optional[str] = Field(None, min_length=3)
     price: float = Field(None, ge=0)
 
+class BulkUpdateItemRequest(BaseModel):
+    id: int
+    name: str = Field(..., min_length=3, max_length=100)
+    description: Optional[str] = Field(None, min_length=3)
+    price: float = Field(..., ge=0)
+
 class ItemResponse(BaseModel):
     id: int
     name: str
@@ -21,4 +27,5 @@ class ItemResponse(BaseModel):
 
 class GetAllItems(BaseModel):
     items: List[ItemResponse]
+    next_cursor: Optional[str] = None
 
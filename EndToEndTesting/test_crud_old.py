@@ -1,8 +1,10 @@
 import pytest
 from flask import Flask
-from crud_mysql import app,  initialize_db, get_db_connection
+from crud_mysql import create_app, initialize_db, get_db_connection
 import json
 
+app = create_app()
+
 # Fixture to initialize the Flask app for testing
 @pytest.fixture(scope='module')
 def client():
@@ -17,16 +19,18 @@ def client():
 # Fixture for setting up and tearing down the database between tests
 @pytest.fixture(autouse=True)
 def setup_and_teardown_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("DROP TABLE IF EXISTS items, users")
-    initialize_db()  
+    # The app context stays pushed for the test, which borrows connections too
+    with app.app_context():
+        conn = get_db_connection()
+        cursor = conn.cursor()
 
-    yield 
+        cursor.execute("DROP TABLE IF EXISTS items, users, schema_version")
+        initialize_db()
 
-    cursor.close()
-    conn.close()
+        yield
+
+        cursor.close()
+        conn.close()
 
 
 # @pytest.fixture
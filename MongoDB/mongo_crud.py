@@ -3,8 +3,13 @@ from flask import Flask, request, jsonify
 from bson import ObjectId
 from pymongo import MongoClient
 import os
+import sys
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.compression import Compression
+from common.metrics import Metrics, timed
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -17,6 +22,19 @@ client = MongoClient(MONGO_URI)
 db = client.mydatabase # Database name
 collection = db.mycollection # Collection name
 
+# Request latency and per-phase timings, served at /metrics
+metrics = Metrics().init_app(app)
+
+# gzip/brotli for JSON bodies over COMPRESSION_MIN_SIZE bytes. /get_all has no
+# snapshot fingerprint to key a body cache on, so there is none here.
+compression = Compression(
+    min_size=int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),
+    level=int(os.getenv('COMPRESSION_LEVEL', 6)),
+    brotli_quality=int(os.getenv('BROTLI_QUALITY', 4)),
+    cache_size=0
+).init_app(app)
+metrics.add_gauges('compression', compression.stats, "Response compression.")
+
 
 # CREATE
 @app.route('/add', methods=['POST'])
@@ -25,13 +43,15 @@ def add_data():
     if not data:
         return jsonify(message="No data provided"), 400
     
-    result = collection.insert_one(data)
+    with timed('db'):
+        result = collection.insert_one(data)
     return jsonify(message="Data added successfully", id=str(result.inserted_id)), 201
 
 # READ
 @app.route('/get_all', methods=['GET'])
 def get_all_data():
-    data = list(collection.find())
+    with timed('db'):
+        data = list(collection.find())
     for item in data:
         item['_id'] = str(item['_id'])
     return jsonify(data=data)
@@ -40,7 +60,8 @@ def get_all_data():
 @app.route('/get/<id>', methods=['GET'])
 def get_data_by_id(id):
     try:
-        data = collection.find_one({"_id": ObjectId(id)})  
+        with timed('db'):
+            data = collection.find_one({"_id": ObjectId(id)})
         if data:
             data['_id'] = str(data['_id']) 
             return jsonify(data=data)
@@ -57,7 +78,8 @@ def update_data(id):
         return jsonify(message="No data provided"), 400
     
     try:
-        result = collection.update_one({"_id": ObjectId(id)}, {"$set": data})
+        with timed('db'):
+            result = collection.update_one({"_id": ObjectId(id)}, {"$set": data})
         if result.matched_count == 0:
             return jsonify(message="No matching document found"), 404
         return jsonify(message="Data updated successfully")
@@ -68,7 +90,8 @@ def update_data(id):
 @app.route('/delete/<id>', methods=['DELETE'])
 def delete_data(id):
     try:
-        result = collection.delete_one({"_id": ObjectId(id)})
+        with timed('db'):
+            result = collection.delete_one({"_id": ObjectId(id)})
         if result.deleted_count == 0:
             return jsonify(message="No matching document found"), 404
         return jsonify(message="Data deleted successfully")
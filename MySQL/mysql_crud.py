@@ -1,253 +1,811 @@
 from datetime import timedelta
-from flask import Flask, jsonify, request 
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, stream_with_context
+from flask_jwt_extended import (JWTManager, create_access_token, get_jwt, get_jwt_identity, jwt_required,
+                                verify_jwt_in_request)
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
 import mysql.connector
+from mysql.connector.constants import ClientFlag
 import os
+import sys
+import time
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field, ValidationError
-from typing import List
+from pydantic import ValidationError
+from werkzeug.local import LocalProxy
+
+from mysql_models import RegisterUser, LoginUser, CreateItem, UpdateItem, BulkUpdateItem, ItemResponse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.blocklist import make_blocklist
+from common.bulk import bulk_payload, parse_ids, row_results, validate_rows
+from common.cache import make_item_cache
+from common.compression import Compression
+from common.csv_io import csv_chunks, import_progress, read_csv_items
+from common.db_pool import ConnectionPool
+from common.etag import (add_validators, if_match_version, is_not_modified, item_cache_entry, item_entry_response,
+                         item_etag, not_modified)
+from common.filters import ItemQuery
+from common.hashing import DEFAULT_WERKZEUG_METHOD, HasherBusy, PasswordHasher
+from common.item_events import EventsRepository, make_item_events
+from common.item_feed import ItemFeed
+from common.item_stats import ItemStats, StatsRepository
+from common.lifecycle import Lifecycle
+from common.metrics import Metrics, TimedConnection, timed
+from common.migrations import create_database, migrate
+from common.pagination import STREAM_CONTENT_TYPES, next_link, parse_page_args, stream_body
+from common.ratelimit import client_address, make_rate_limiter, parse_rate_limit, retry_after_header
+from common.replicas import ReplicaRouter, parse_hosts
+from common.repository import RepositoryError, make_item_repository
+from common.serializers import ItemSerializer, dumps_str, install_json_provider, parse_fields
+from common.write_behind import GroupCommitter, QueueFull, make_ticket_store
 
 load_dotenv()
 
-app = Flask(__name__)
 
-# Load configuration from environment variables
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
-
-app.config['MYSQL_HOST'] = os.getenv('MYSQL_HOST')
-app.config['MYSQL_USER'] = os.getenv('MYSQL_USER')
-app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD')
-app.config['MYSQL_DB'] = os.getenv('MYSQL_DB')
-# app.config['MYSQL_DB'] = 'test_db'
+# Settings from the environment; create_app(config) overrides any of them
+def load_config():
+    return {
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY'),
+
+        'MYSQL_HOST': os.getenv('MYSQL_HOST'),
+        'MYSQL_USER': os.getenv('MYSQL_USER'),
+        'MYSQL_PASSWORD': os.getenv('MYSQL_PASSWORD'),
+        'MYSQL_DB': os.getenv('MYSQL_DB'),
+        # Callable returning a new DB-API connection, in place of mysql.connector.connect
+        # with the settings above (the benchmark passes a SQLite stand-in)
+        'MYSQL_CONNECTION_CREATOR': None,
+
+        # Connection pool settings
+        'MYSQL_POOL_SIZE': int(os.getenv('MYSQL_POOL_SIZE', 5)),
+        'MYSQL_POOL_MAX_OVERFLOW': int(os.getenv('MYSQL_POOL_MAX_OVERFLOW', 10)),
+        'MYSQL_POOL_TIMEOUT': float(os.getenv('MYSQL_POOL_TIMEOUT', 30)),
+        'MYSQL_POOL_RECYCLE': float(os.getenv('MYSQL_POOL_RECYCLE', 3600)),
+
+        # Read replicas ("host[:port],..."); item reads go there unless they lag more than
+        # MYSQL_REPLICA_MAX_LAG seconds or the client wrote within READ_YOUR_WRITES_SECONDS
+        'MYSQL_REPLICA_HOSTS': parse_hosts(os.getenv('MYSQL_REPLICA_HOSTS')),
+        'MYSQL_REPLICA_STRATEGY': os.getenv('MYSQL_REPLICA_STRATEGY', 'least_busy'),
+        'MYSQL_REPLICA_MAX_LAG': float(os.getenv('MYSQL_REPLICA_MAX_LAG', 5)),
+        'READ_YOUR_WRITES_SECONDS': float(os.getenv('READ_YOUR_WRITES_SECONDS', 5)),
+
+        # Where items live: mysql (default), sqlite, memory or mongo. Users always stay in MySQL.
+        'ITEM_BACKEND': os.getenv('ITEM_BACKEND', 'mysql'),
+        'ITEM_SQLITE_PATH': os.getenv('ITEM_SQLITE_PATH', 'items.sqlite3'),
+        'MONGO_URI': os.getenv('MONGO_URI', 'mongodb://localhost:27017'),
+
+        # /items/stats is kept current on every item write and rebuilt from the table this often
+        'ITEM_STATS_RECONCILE_INTERVAL': float(os.getenv('ITEM_STATS_RECONCILE_INTERVAL', 300)),
+
+        # /create_item write path: direct (INSERT + COMMIT per request), async (queue it,
+        # answer 202 with a ticket) or strong (queue it, answer once its group commit lands)
+        'CREATE_ITEM_MODE': os.getenv('CREATE_ITEM_MODE', 'direct'),
+        'GROUP_COMMIT_MAX_BATCH': int(os.getenv('GROUP_COMMIT_MAX_BATCH', 500)),
+        'GROUP_COMMIT_MAX_DELAY': float(os.getenv('GROUP_COMMIT_MAX_DELAY', 0.005)),
+        'GROUP_COMMIT_MAX_QUEUE': int(os.getenv('GROUP_COMMIT_MAX_QUEUE', 10000)),
+        'GROUP_COMMIT_WAIT': float(os.getenv('GROUP_COMMIT_WAIT', 5)),
+
+        # Item cache settings (REDIS_URL enables the shared second tier)
+        'ITEM_CACHE_SIZE': int(os.getenv('ITEM_CACHE_SIZE', 1024)),
+        'ITEM_CACHE_TTL': float(os.getenv('ITEM_CACHE_TTL', 60)),
+        'REDIS_URL': os.getenv('REDIS_URL'),
+
+        # /items/events: the last ITEM_FEED_BUFFER_SIZE changes are kept per worker for
+        # Last-Event-ID resume; each connected client holds a worker thread
+        'ITEM_FEED_BUFFER_SIZE': int(os.getenv('ITEM_FEED_BUFFER_SIZE', 1000)),
+        'ITEM_FEED_MAX_CLIENTS': int(os.getenv('ITEM_FEED_MAX_CLIENTS', 100)),
+
+        # Password hashing settings; changing the method rehashes users on their next login
+        'PASSWORD_HASH_METHOD': os.getenv('PASSWORD_HASH_METHOD', DEFAULT_WERKZEUG_METHOD),
+        'HASH_WORKERS': int(os.getenv('HASH_WORKERS', 2)),
+        'HASH_MAX_PENDING': int(os.getenv('HASH_MAX_PENDING', 32)),
+
+        # Token-bucket limits ("count/period", or "off") checked before any hashing or DB work;
+        # shared across workers and nodes through Redis when REDIS_URL is set
+        'LOGIN_RATE_LIMIT_IP': parse_rate_limit(os.getenv('LOGIN_RATE_LIMIT_IP', '60/minute')),
+        'LOGIN_RATE_LIMIT_USER': parse_rate_limit(os.getenv('LOGIN_RATE_LIMIT_USER', '10/minute')),
+        'REGISTER_RATE_LIMIT_IP': parse_rate_limit(os.getenv('REGISTER_RATE_LIMIT_IP', '30/minute')),
+        'REGISTER_RATE_LIMIT_USER': parse_rate_limit(os.getenv('REGISTER_RATE_LIMIT_USER', '5/minute')),
+        # Authenticated routes, per token identity (off by default)
+        'API_RATE_LIMIT_USER': parse_rate_limit(os.getenv('API_RATE_LIMIT_USER', 'off')),
+        # Proxies in front of the app (load balancer, ingress) whose X-Forwarded-For is
+        # trusted for the client address; 0 keys per-IP limits on the peer address
+        'TRUSTED_PROXIES': int(os.getenv('TRUSTED_PROXIES', 0)),
+
+        # Response compression: gzip (or brotli when installed) for JSON bodies of at least
+        # COMPRESSION_MIN_SIZE bytes, streamed listings included; the last
+        # COMPRESSION_CACHE_SIZE compressed collection snapshots are kept (0 disables)
+        'COMPRESSION_MIN_SIZE': int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),
+        'COMPRESSION_LEVEL': int(os.getenv('COMPRESSION_LEVEL', 6)),
+        'BROTLI_QUALITY': int(os.getenv('BROTLI_QUALITY', 4)),
+        'COMPRESSION_CACHE_SIZE': int(os.getenv('COMPRESSION_CACHE_SIZE', 32)),
+
+        # Serializer for item reads: raw (default), adapter or pydantic
+        'JSON_SERIALIZER': os.getenv('JSON_SERIALIZER', 'raw'),
+
+        # Run migrations once in the gunicorn master before workers are forked (off by
+        # default: production runs them as a deploy step)
+        'MIGRATE_ON_STARTUP': os.getenv('MIGRATE_ON_STARTUP', '0') == '1',
+
+        # Users allowed to revoke other users' tokens
+        'ADMIN_USERS': set(filter(None, os.getenv('ADMIN_USERS', '').split(','))),
+        'TOKEN_MAX_AGE': 30 * 60,
+    }
+
+
+# The JWT identity of the current request, if it carried one
+def request_identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+# Pools, caches, the hasher, the repository chain and the write-behind queue of
+# one app, built by create_app and kept at app.extensions['mysql_crud']. Building
+# them connects nothing and starts no thread: pools open on first checkout, and
+# start() runs in each worker after the fork (see gunicorn.conf.py).
+class Resources:
+    def __init__(self, config):
+        # Shared connection pool; connections are opened lazily on first checkout
+        self.db_pool = ConnectionPool(
+            pool_size=config['MYSQL_POOL_SIZE'],
+            max_overflow=config['MYSQL_POOL_MAX_OVERFLOW'],
+            timeout=config['MYSQL_POOL_TIMEOUT'],
+            recycle=config['MYSQL_POOL_RECYCLE'],
+            creator=config['MYSQL_CONNECTION_CREATOR'],
+            host=config['MYSQL_HOST'],
+            user=config['MYSQL_USER'],
+            password=config['MYSQL_PASSWORD'],
+            database=config['MYSQL_DB'],
+            # UPDATE rowcount reports matched rows, so "not found" needs no extra SELECT
+            client_flags=[ClientFlag.FOUND_ROWS]
+        )
+
+        # Separate pools per replica, same credentials as the primary
+        self.replica_router = ReplicaRouter.from_hosts(
+            self.db_pool,
+            config['MYSQL_REPLICA_HOSTS'],
+            pool_size=config['MYSQL_POOL_SIZE'],
+            max_overflow=config['MYSQL_POOL_MAX_OVERFLOW'],
+            timeout=config['MYSQL_POOL_TIMEOUT'],
+            recycle=config['MYSQL_POOL_RECYCLE'],
+            strategy=config['MYSQL_REPLICA_STRATEGY'],
+            max_lag=config['MYSQL_REPLICA_MAX_LAG'],
+            sticky_seconds=config['READ_YOUR_WRITES_SECONDS'],
+            user=config['MYSQL_USER'],
+            password=config['MYSQL_PASSWORD'],
+            database=config['MYSQL_DB']
+        )
+
+        # Read-through cache for single items, invalidated on update/delete
+        self.item_cache = make_item_cache(
+            redis_url=config['REDIS_URL'],
+            maxsize=config['ITEM_CACHE_SIZE'],
+            ttl=config['ITEM_CACHE_TTL']
+        )
+
+        # Item change events through Redis when REDIS_URL is set: writes here evict
+        # the item from other workers' local caches
+        self.item_events = make_item_events(redis_url=config['REDIS_URL'], cache=self.item_cache.local)
+
+        # Change feed for /items/events, fed from the same subscription
+        self.item_feed = ItemFeed(buffer_size=config['ITEM_FEED_BUFFER_SIZE'],
+                                  max_clients=config['ITEM_FEED_MAX_CLIENTS'])
+        self.item_events.add_listener(self.item_feed.notify)
+
+        # Password hashing runs in a bounded process pool, off the request thread
+        self.password_hasher = PasswordHasher(
+            scheme='werkzeug',
+            method=config['PASSWORD_HASH_METHOD'],
+            workers=config['HASH_WORKERS'],
+            max_pending=config['HASH_MAX_PENDING']
+        )
+
+        # Revoked tokens, checked locally on every request and synced through Redis when REDIS_URL is set
+        self.token_blocklist = make_blocklist(redis_url=config['REDIS_URL'], max_token_age=config['TOKEN_MAX_AGE'])
+
+        # Throttles /login and /register per client IP and per username, and authenticated routes per user
+        self.rate_limiter = make_rate_limiter(redis_url=config['REDIS_URL'])
+
+        # Item storage; every item route goes through this
+        item_repository = make_item_repository(
+            config['ITEM_BACKEND'],
+            get_connection=self.get_db_connection,
+            get_read_connection=self.get_read_db_connection,
+            sqlite_path=config['ITEM_SQLITE_PATH'],
+            mongo_uri=config['MONGO_URI']
+        )
+
+        # Price statistics for /items/stats, fed by every write through item_repository
+        self.item_stats = ItemStats(item_repository, reconcile_interval=config['ITEM_STATS_RECONCILE_INTERVAL'])
+        item_repository = StatsRepository(item_repository, self.item_stats)
+        self.item_repository = EventsRepository(item_repository, self.item_events)
+
+        # Write-behind queue for the async/strong create modes; the flusher thread starts on first use.
+        # Ticket states live in Redis when REDIS_URL is set, so any worker can answer a poll.
+        self.group_committer = GroupCommitter(
+            self.item_repository,
+            max_batch=config['GROUP_COMMIT_MAX_BATCH'],
+            max_delay=config['GROUP_COMMIT_MAX_DELAY'],
+            max_queue=config['GROUP_COMMIT_MAX_QUEUE'],
+            tickets=make_ticket_store(redis_url=config['REDIS_URL'])
+        )
+
+        self.item_serializer = ItemSerializer(ItemResponse, mode=config['JSON_SERIALIZER'])
+
+    # Borrow a MySQL connection from the pool (close() returns it)
+    def get_db_connection(self):
+        with timed('pool_wait'):
+            conn = self.db_pool.get_connection()
+        return TimedConnection(conn)
+
+    # Connection for read-only queries: a replica when one is fit, else the primary
+    def get_read_db_connection(self):
+        with timed('pool_wait'):
+            conn = self.replica_router.get_connection(request_identity())
+        return TimedConnection(conn)
+
+    # In each worker after the fork: the event subscriber and the blocklist sync.
+    # Both are also started on first use, so the dev server needs no hook.
+    def start(self):
+        self.item_events.ensure_started()
+        self.token_blocklist.ensure_started()
+
+    # Queued creates are written before the pools they need are closed
+    def close(self):
+        self.group_committer.close()
+        self.item_events.stop()
+        self.item_stats.close()
+        self.token_blocklist.stop()
+        self.password_hasher.shutdown()
+        self.replica_router.dispose()
+        self.db_pool.dispose()
+
+
+# The current app's Resources
+def resources():
+    return current_app.extensions['mysql_crud']
+
+
+# Module-level names for the current app's resources, as the routes use them
+def _resource(name):
+    return LocalProxy(lambda: getattr(resources(), name))
+
+
+db_pool = _resource('db_pool')
+replica_router = _resource('replica_router')
+item_cache = _resource('item_cache')
+item_feed = _resource('item_feed')
+password_hasher = _resource('password_hasher')
+token_blocklist = _resource('token_blocklist')
+rate_limiter = _resource('rate_limiter')
+item_repository = _resource('item_repository')
+item_stats = _resource('item_stats')
+group_committer = _resource('group_committer')
+item_serializer = _resource('item_serializer')
+compression = LocalProxy(lambda: current_app.extensions['compression'])
+
+
+# Borrow a MySQL connection from the current app's pool (close() returns it)
+def get_db_connection():
+    return resources().get_db_connection()
 
-# Initialize the JWT manager
-jwt = JWTManager(app)
 
-# Function to create MySQL connection
-def get_db_connection():
-    return mysql.connector.connect(
-        host=app.config['MYSQL_HOST'],
-        user=app.config['MYSQL_USER'],
-        password=app.config['MYSQL_PASSWORD'],
-        database=app.config['MYSQL_DB']
-    )
-
-# Function to create the database and table if they don't exist
+# Create the database if needed and apply pending schema migrations, for the
+# current app. Not run at import: deploys call `python -m common.migrations upgrade` once.
 def initialize_db():
-    conn = mysql.connector.connect(
-        host=app.config['MYSQL_HOST'],
-        user=app.config['MYSQL_USER'],
-        password=app.config['MYSQL_PASSWORD']
-    )
-    cursor = conn.cursor()
+    config = current_app.config
+    create_database(config['MYSQL_HOST'], config['MYSQL_USER'], config['MYSQL_PASSWORD'], config['MYSQL_DB'])
+    conn = get_db_connection()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
 
-    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {app.config['MYSQL_DB']}")
-    
-    conn.database = app.config['MYSQL_DB']
-    
-    # Create the items table if it doesn't exist
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS items (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        name VARCHAR(100) NOT NULL,
-        description TEXT,
-        price DECIMAL(10, 2),
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # Create the users table for login
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        username VARCHAR(100) NOT NULL,
-        password VARCHAR(255) NOT NULL
-    )
-    """)
-
-    cursor.close()
-    conn.close()
-
-# Pydantic models for user and item data validation
-class RegisterUser(BaseModel):
-    username: str = Field(..., min_length=8, max_length=10)
-    password: str = Field(..., min_length=6)
-
-class LoginUser(BaseModel):
-    username: str
-    password: str
-
-class CreateItem(BaseModel):
-    name: str = Field(..., min_length=3, max_length=100)
-    description: str = Field(..., min_length=3)
-    price: float = Field(..., ge=0)
-
-class UpdateItem(BaseModel):
-    name: str = Field(..., min_length=3, max_length=100)
-    description: str = Field(..., min_length=3)
-    price: float = Field(..., ge=0)
-
-class ItemResponse(BaseModel):
-    id: int
-    name: str
-    description: str
-    price: float
-    created_at: str
-
-class GetAllItems(BaseModel):
-    items: List[ItemResponse]
+
+bp = Blueprint('mysql_crud', __name__)
+
+
+# Production entry point: gunicorn 'mysql_crud:create_app()'. Settings come from
+# the environment (load_config) with `config` on top; every call builds a new
+# app with its own pools, caches and threads.
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+
+    # Initialize the JWT manager
+    jwt = JWTManager(app)
+
+    # Use orjson for jsonify() when it is installed
+    install_json_provider(app)
+
+    res = app.extensions['mysql_crud'] = Resources(app.config)
+    # Fallback for servers without the post-fork hook (the dev server, tests)
+    app.before_request(res.item_events.ensure_started)
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return res.token_blocklist.is_revoked(jwt_payload['jti'], jwt_payload['sub'], jwt_payload.get('iat'))
+
+    # Request latency and per-phase timings, served at /metrics
+    metrics = Metrics().init_app(app)
+    metrics.add_gauges('mysql_pool', res.db_pool.stats, "Connection pool statistics.")
+    metrics.add_gauges('mysql_replicas', res.replica_router.stats, "Read routing between primary and replicas.")
+    metrics.add_gauges('rate_limit', res.rate_limiter.stats, "Login, registration and per-user API throttling.")
+
+    app.extensions['compression'] = Compression(
+        min_size=app.config['COMPRESSION_MIN_SIZE'],
+        level=app.config['COMPRESSION_LEVEL'],
+        brotli_quality=app.config['BROTLI_QUALITY'],
+        cache_size=app.config['COMPRESSION_CACHE_SIZE']
+    ).init_app(app)
+    metrics.add_gauges('compression', app.extensions['compression'].stats,
+                       "Response compression and compressed body cache.")
+    metrics.add_gauges('item_stats', res.item_stats.stats, "Incremental item price statistics.")
+    metrics.add_gauges('item_events', res.item_events.stats, "Cross-node item change events.")
+    metrics.add_gauges('item_feed', res.item_feed.stats, "Connected /items/events clients and their backlog.")
+    metrics.add_gauges('group_commit', res.group_committer.stats, "Write-behind create_item queue statistics.")
+
+    app.register_blueprint(bp)
+
+    # Startup/drain/shutdown hooks for gunicorn (see gunicorn.conf.py)
+    lifecycle = Lifecycle().init_app(app)
+
+    @lifecycle.on_startup
+    def migrate_on_startup():
+        if app.config['MIGRATE_ON_STARTUP']:
+            with app.app_context():
+                initialize_db()
+            # Workers must not inherit the master's connection
+            res.db_pool.dispose()
+
+    lifecycle.on_worker_start(res.start)
+    lifecycle.on_drain(res.item_feed.close_all)
+    lifecycle.on_shutdown(res.close)
+    return app
+
+
+# Read your writes: a client that just changed something reads from the primary for a while
+@bp.after_app_request
+def pin_writers_to_primary(response):
+    if request.method not in ('GET', 'HEAD') and response.status_code < 400:
+        replica_router.note_write(request_identity())
+    return response
+
+@bp.app_errorhandler(RepositoryError)
+def repository_error(e):
+    return jsonify(message=str(e)), 500
+
+# 429 response if any of `keys` (ip=..., user=...) is over its limit for `endpoint`, else None
+def rate_limited(endpoint, **keys):
+    for kind, value in keys.items():
+        limit = current_app.config[f'{endpoint.upper()}_RATE_LIMIT_{kind.upper()}']
+        if limit is None or value is None:
+            continue
+        retry_after = rate_limiter.hit(f'{endpoint}:{kind}:{value}', limit)
+        if retry_after:
+            return jsonify(message="Too many requests, please retry later"), 429, retry_after_header(retry_after)
+    return None
+
+# Authenticated routes are limited per token identity: behind a proxy every
+# client shares an address. A missing or bad token is left to @jwt_required.
+@bp.before_app_request
+def rate_limit_identity():
+    if current_app.config['API_RATE_LIMIT_USER'] is None:
+        return None
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, PyJWTError):
+        return None
+    identity = get_jwt_identity()
+    return rate_limited('api', user=identity) if identity else None
 
 # User registration endpoint
-@app.route('/register', methods=['POST'])
+@bp.route('/register', methods=['POST'])
 def register():
+    limited = rate_limited('register', ip=client_address(request, current_app.config['TRUSTED_PROXIES']))
+    if limited:
+        return limited
+
     try:
-        data = RegisterUser.model_validate(request.get_json())
+        with timed('validation'):
+            data = RegisterUser.model_validate(request.get_json())
     except ValidationError as e:
         return jsonify(errors=e.errors()), 400
 
-    hashed_password = generate_password_hash(data.password)
+    limited = rate_limited('register', user=data.username)
+    if limited:
+        return limited
+
+    try:
+        hashed_password = password_hasher.hash(data.password)
+    except HasherBusy:
+        return jsonify(message="Server busy, please retry"), 503, {'Retry-After': '1'}
 
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (data.username, hashed_password))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (data.username, hashed_password))
+        conn.commit()
+    except mysql.connector.IntegrityError:
+        return jsonify(message="User already exists"), 400
+    finally:
+        cursor.close()
+        conn.close()
 
     return jsonify(message="User registered successfully!"), 201
 
 # User login endpoint (generate JWT token)
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
+    limited = rate_limited('login', ip=client_address(request, current_app.config['TRUSTED_PROXIES']))
+    if limited:
+        return limited
+
     try:
-        data = LoginUser.model_validate(request.get_json())
+        with timed('validation'):
+            data = LoginUser.model_validate(request.get_json())
     except ValidationError as e:
         return jsonify(errors=e.errors()), 400
 
+    limited = rate_limited('login', user=data.username)
+    if limited:
+        return limited
+
     conn = get_db_connection()
     cursor = conn.cursor()
-
     try:
         cursor.execute("SELECT * FROM users WHERE username = %s", (data.username,))
         user = cursor.fetchone()
-
-        if user and check_password_hash(user[2], data.password):  
-            access_token = create_access_token(identity=data.username, fresh=True, expires_delta=timedelta(minutes=30))
-            return jsonify(access_token=access_token), 200
-        else:
-            return jsonify(message="Invalid credentials"), 401
     except mysql.connector.Error as e:
         return jsonify(message=f"Database error: {str(e)}"), 500
     finally:
         cursor.close()
         conn.close()
 
+    # The connection is back in the pool before the (much slower) KDF runs
+    try:
+        if not (user and password_hasher.verify(user[2], data.password)):
+            return jsonify(message="Invalid credentials"), 401
+        new_hash = password_hasher.rehash_if_needed(user[2], data.password)
+    except HasherBusy:
+        return jsonify(message="Server busy, please retry"), 503, {'Retry-After': '1'}
+
+    if new_hash:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("UPDATE users SET password = %s WHERE id = %s", (new_hash, user[0]))
+            conn.commit()
+        except mysql.connector.Error as e:
+            return jsonify(message=f"Database error: {str(e)}"), 500
+        finally:
+            cursor.close()
+            conn.close()
+
+    access_token = create_access_token(identity=data.username, fresh=True,
+                                       expires_delta=timedelta(seconds=current_app.config['TOKEN_MAX_AGE']))
+    return jsonify(access_token=access_token), 200
+
+# Logout: revoke the token used for this request
+@bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    claims = get_jwt()
+    token_blocklist.revoke(claims['jti'], claims['exp'])
+    return jsonify(message="Successfully logged out"), 200
+
+# Admin: revoke a token by jti, or every token issued so far to a username
+@bp.route('/admin/revoke', methods=['POST'])
+@jwt_required()
+def revoke_token():
+    if get_jwt_identity() not in current_app.config['ADMIN_USERS']:
+        return jsonify(message="Admin access required"), 403
+
+    data = request.get_json(silent=True) or {}
+    if data.get('jti'):
+        token_blocklist.revoke(data['jti'], time.time() + current_app.config['TOKEN_MAX_AGE'])
+        return jsonify(message="Token revoked"), 200
+    if data.get('username'):
+        token_blocklist.revoke_user(data['username'])
+        return jsonify(message=f"Tokens for {data['username']} revoked"), 200
+    return jsonify(message="Provide a jti or username"), 400
+
 # Protected route (requires JWT token)
-@app.route('/protected', methods=['GET'])
+@bp.route('/protected', methods=['GET'])
 @jwt_required()
 def protected():
     return jsonify(message="You have access to this route!")
 
 # Create Item
-@app.route('/create_item', methods=['POST'])
+@bp.route('/create_item', methods=['POST'])
 @jwt_required()
 def create_item():
     try:
-        data = CreateItem.model_validate(request.get_json())
+        with timed('validation'):
+            data = CreateItem.model_validate(request.get_json())
     except ValidationError as e:
         return jsonify(errors=e.errors()), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO items (name, description, price) VALUES (%s, %s, %s)", 
-                   (data.name, data.description, data.price))
-    conn.commit()
-
-    # Get the ID of the newly created item
-    cursor.execute("SELECT LAST_INSERT_ID()")
-    item_id = cursor.fetchone()[0]  # Fetch the generated ID
+    if current_app.config['CREATE_ITEM_MODE'] == 'direct':
+        item_id = item_repository.create(data.name, data.description, data.price)
+        return jsonify(id=item_id, message="Item created successfully!"), 201
 
-    cursor.close()
-    conn.close()
-
-    return jsonify(id=item_id, message="Item created successfully!"), 201
+    try:
+        ticket = group_committer.submit(data)
+    except QueueFull:
+        return jsonify(message="Server busy, please retry"), 503, {'Retry-After': '1'}
+
+    if current_app.config['CREATE_ITEM_MODE'] == 'strong':
+        with timed('db'):
+            item_id = ticket.result(timeout=current_app.config['GROUP_COMMIT_WAIT'])
+        if item_id is not None:
+            return jsonify(id=item_id, message="Item created successfully!"), 201
+
+    # Not committed yet; poll the ticket for the id
+    location = f'/create_item/tickets/{ticket.id}'
+    return jsonify(ticket=ticket.id, message="Item queued for creation"), 202, {'Location': location}
+
+# Status of a queued create: queued, committed (with the item id) or failed
+@bp.route('/create_item/tickets/<ticket_id>', methods=['GET'])
+@jwt_required()
+def create_item_ticket(ticket_id):
+    state = group_committer.ticket_state(ticket_id)
+    if state is None:
+        return jsonify(message="Ticket not found"), 404
+    return jsonify(state), 200
 
 
 # Get Item by ID
-@app.route('/get_item/<int:id>', methods=['GET'])
+@bp.route('/get_item/<int:id>', methods=['GET'])
 @jwt_required()
 def get_item(id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM items WHERE id = %s", (id,))
-    item = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    try:
+        fields = parse_fields(request.args.get('fields'), ItemResponse)
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+
+    cached = item_cache.get(str(id))
+    if cached is not None:
+        return item_entry_response(request, cached, fields)
+
+    # The entry is shared through Redis, so fill it from the primary: a lagging
+    # replica's copy would outlive the replica's own lag by the cache TTL
+    item = item_repository.get(id, primary=True)
 
     if item:
-        item_data = ItemResponse(id=item[0], name=item[1], description=item[2], price=item[3], created_at=item[4].isoformat())
-        return jsonify(item_data.model_dump()), 200
+        entry = item_cache_entry(item_serializer.item_dict(item), id, item[5], item[6])
+        item_cache.set(str(id), entry)
+        return item_entry_response(request, entry, fields)
     else:
         return jsonify(message="Item not found"), 404
 
-# Update Item by ID
-@app.route('/update_item/<int:id>', methods=['PUT'])
+# Update Item by ID. With If-Match (the ETag from get_item) the update only
+# applies if nobody changed the item since: 412 otherwise.
+@bp.route('/update_item/<int:id>', methods=['PUT'])
 @jwt_required()
 def update_item(id):
     try:
-        data = UpdateItem.model_validate(request.get_json())
+        with timed('validation'):
+            data = UpdateItem.model_validate(request.get_json())
     except ValidationError as e:
         return jsonify(errors=e.errors()), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE items SET name = %s, description = %s, price = %s WHERE id = %s", 
-                   (data.name, data.description, data.price, id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    conditional, version = if_match_version(request, id)
+    if not item_repository.update(id, data.name, data.description, data.price, version=version):
+        if conditional:
+            return jsonify(message="Item was modified or deleted; fetch it again"), 412
+        return jsonify(message="Item not found"), 404
+    item_cache.delete(str(id))
 
-    return jsonify(message="Item updated successfully!"), 200
+    resp = jsonify(message="Item updated successfully!")
+    if version is not None:
+        resp.set_etag(item_etag(id, version + 1))
+    return resp, 200
 
 # Delete Item by ID
-@app.route('/delete_item/<int:id>', methods=['DELETE'])
+@bp.route('/delete_item/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete_item(id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM items WHERE id = %s", (id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    item_repository.delete(id)
+    item_cache.delete(str(id))
 
     return jsonify(message="Item deleted successfully!"), 200
 
-# Get all items
-@app.route('/all_items', methods=['GET'])
+# Bulk create items in one transaction
+@bp.route('/items/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_items():
+    try:
+        rows = bulk_payload(request.get_json())
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+
+    with timed('validation'):
+        items, errors = validate_rows(CreateItem, rows)
+    if errors:
+        return jsonify(message="Invalid data", errors=errors), 400
+
+    ids = item_repository.create_many(items)
+    results = [{"index": index, "id": item_id} for index, item_id in enumerate(ids)]
+    return jsonify(results=results, message=f"{len(ids)} items created successfully!"), 201
+
+# Bulk update items in one transaction
+@bp.route('/items/bulk', methods=['PUT'])
+@jwt_required()
+def bulk_update_items():
+    try:
+        rows = bulk_payload(request.get_json())
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+
+    with timed('validation'):
+        items, errors = validate_rows(BulkUpdateItem, rows)
+    if errors:
+        return jsonify(message="Invalid data", errors=errors), 400
+
+    found = item_repository.update_many(items)
+    for item_id in found:
+        item_cache.delete(str(item_id))
+    return jsonify(results=row_results([item.id for item in items], found, "updated"),
+                   message=f"{len(found)} items updated successfully!"), 200
+
+# Bulk delete items in one transaction
+@bp.route('/items/bulk', methods=['DELETE'])
+@jwt_required()
+def bulk_delete_items():
+    try:
+        ids = parse_ids(bulk_payload(request.get_json(), key='ids'))
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+
+    found = item_repository.delete_many(ids)
+    for item_id in found:
+        item_cache.delete(str(item_id))
+    return jsonify(results=row_results(ids, found, "deleted"),
+                   message=f"{len(found)} items deleted successfully!"), 200
+
+# Connection pool statistics
+@bp.route('/pool_stats', methods=['GET'])
+@jwt_required()
+def pool_stats():
+    return jsonify(db_pool.stats()), 200
+
+# Replica health, lag and read counts
+@bp.route('/replica_stats', methods=['GET'])
+@jwt_required()
+def replica_stats():
+    return jsonify({**replica_router.stats(), "replicas": replica_router.replica_stats()}), 200
+
+# Write-behind queue statistics (batch sizes, commit latency, queue depth)
+@bp.route('/group_commit_stats', methods=['GET'])
+@jwt_required()
+def group_commit_stats():
+    return jsonify(group_committer.stats()), 200
+
+# Count, sum, min, max, average and approximate percentiles of item prices,
+# answered from the running aggregate without reading the table
+@bp.route('/items/stats', methods=['GET'])
+@jwt_required()
+def item_price_stats():
+    snapshot = item_stats.snapshot()
+    if snapshot is None:
+        return jsonify(message="Statistics are still loading, please retry"), 503, {'Retry-After': '1'}
+    return jsonify(snapshot), 200
+
+# Item changes as Server-Sent Events (create/update/delete with id and version).
+# Reconnecting with Last-Event-ID replays what was missed; a `reset` event means
+# that isn't possible and the client should reload /all_items.
+@bp.route('/items/events', methods=['GET'])
+@jwt_required()
+def item_change_events():
+    subscription = item_feed.subscribe(request.headers.get('Last-Event-ID'))
+    if subscription is None:
+        return jsonify(message="Too many event stream clients, please retry"), 503, {'Retry-After': '5'}
+    return Response(subscription.chunks(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Item cache statistics
+@bp.route('/cache_stats', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    return jsonify(item_cache.stats()), 200
+
+# Get all items, one keyset page at a time (?limit=&after=) or streamed (?stream=ndjson|json).
+# Filters: name_prefix, min_price, max_price, created_after, created_before; sort: id|name|price|created_at (- for desc)
+# ?fields=id,name,price returns (and reads) only those fields
+@bp.route('/all_items', methods=['GET'])
 @jwt_required()
 def get_all_items():
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        limit, after_id, stream = parse_page_args(request.args)
+        fields = parse_fields(request.args.get('fields'), ItemResponse)
+        query = ItemQuery.from_args(request.args).select(fields)
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+    serializer = item_serializer.project(fields)
 
     try:
-        cursor.execute("SELECT * FROM items")  
-        items = cursor.fetchall()
+        listing = item_repository.listing(query, request.query_string.decode())
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+
+    # Answer conditional requests from the count/max(updated_at) fingerprint alone
+    if is_not_modified(request, listing.etag, listing.last_modified):
+        listing.close()
+        return not_modified(listing.etag, listing.last_modified)
+
+    # Same snapshot as a recent request: replay its compressed body
+    cached = compression.cached_response(listing.etag)
+    if cached is not None:
+        listing.close()
+        return add_validators(cached, listing.etag, listing.last_modified)
+
+    if stream:
+        resp = Response(stream_body(stream, listing.stream(), serializer.item_dict, dumps=dumps_str),
+                        mimetype=STREAM_CONTENT_TYPES[stream])
+        return add_validators(resp, listing.etag, listing.last_modified)
+
+    with listing:
+        items, next_cursor = listing.page(limit)
+
+    if items or after_id:
+        with timed('serialization'):
+            body = serializer.dumps_page(items, next_cursor)
+        resp = add_validators(Response(body, mimetype='application/json'), listing.etag, listing.last_modified)
+        if next_cursor:
+            resp.headers['Link'] = next_link(request, next_cursor)
+        return resp, 200
+    else:
+        return jsonify(message="No items found"), 404
 
-        if items:
-            items_list = [ItemResponse(id=item[0], name=item[1], description=item[2], price=item[3], created_at=item[4].isoformat()) for item in items]
-            response = GetAllItems(items=items_list)
-            return jsonify(response.model_dump()), 200
-        else:
-            return jsonify(message="No items found"), 404
-    except Exception as e:
-        return jsonify(message=f"Error: {str(e)}"), 500
-    finally:
-        cursor.close()
-        conn.close()
+# Export items as CSV, streamed from a server-side cursor. Takes the same
+# filters, sort and ?fields= as /all_items.
+@bp.route('/items/export.csv', methods=['GET'])
+@jwt_required()
+def export_items_csv():
+    try:
+        fields = parse_fields(request.args.get('fields'), ItemResponse)
+        query = ItemQuery.from_args(request.args).select(fields)
+        listing = item_repository.listing(query, 'csv:' + request.query_string.decode())
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+
+    if is_not_modified(request, listing.etag, listing.last_modified):
+        listing.close()
+        return not_modified(listing.etag, listing.last_modified)
+
+    resp = Response(csv_chunks(listing.stream(), fields or tuple(ItemResponse.model_fields)), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=items.csv'})
+    return add_validators(resp, listing.etag, listing.last_modified)
+
+# Import items from CSV (name, description, price columns; others are ignored),
+# sent as the request body or as a multipart "file" field. Rows are validated
+# and inserted a chunk at a time as the upload is read; the response streams one
+# NDJSON progress line per chunk (with per-line errors) and a final summary.
+@bp.route('/items/import', methods=['POST'])
+@jwt_required()
+def import_items_csv():
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify(message="Missing CSV file field 'file'"), 400
+        stream = upload.stream
+    else:
+        stream = request.stream
 
-# Initialize the database before the application runs
-initialize_db()
+    try:
+        chunks = read_csv_items(stream, CreateItem)
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+    progress = import_progress(chunks, item_repository.create_many, dumps=dumps_str)
+    return Response(stream_with_context(progress), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-transform'})
 
 if __name__ == '__main__':
+    # Local development convenience; production runs migrations as a deploy step
+    app = create_app()
+    with app.app_context():
+        initialize_db()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,708 @@
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+import aiomysql
+import jwt as pyjwt
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from quart import Quart, Response, abort, g, jsonify, request
+
+from mysql_models import RegisterUser, LoginUser, CreateItem, UpdateItem, BulkUpdateItem, ItemResponse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.blocklist import make_blocklist
+from common.bulk import ID_CHUNK_SIZE, INSERT_CHUNK_SIZE, bulk_payload, chunked, parse_ids, row_results, validate_rows
+from common.cache import make_item_cache
+from common.db_pool import PoolTimeout
+from common.etag import (COLLECTION_VERSION_QUERY, add_validators, collection_bump, collection_etag, if_match_version,
+                         is_not_modified, item_cache_entry, item_etag)
+from common.filters import TABLE_ESTIMATE_QUERY, ItemQuery, cached_table_estimate, store_table_estimate
+from common.hashing import DEFAULT_WERKZEUG_METHOD, HasherBusy, PasswordHasher
+from common.item_events import make_item_events
+from common.metrics import Metrics, timed
+from common.pagination import STREAM_BATCH_SIZE, STREAM_CONTENT_TYPES, next_link, parse_page_args
+from common.ratelimit import LocalRateLimiter, client_address, make_rate_limiter, parse_rate_limit, retry_after_header
+from common.serializers import ItemSerializer, dumps_str, install_json_provider, parse_fields
+
+# asyncio twin of mysql_crud.py: same routes, models, responses and tokens, served
+# by Quart on an aiomysql pool so a worker can keep many requests in flight while
+# they wait on MySQL. Run with:  hypercorn 'mysql_crud_async:create_app()'
+
+load_dotenv()
+
+JWT_ALGORITHM = 'HS256'
+
+
+def load_config():
+    return {
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY'),
+        'MYSQL_HOST': os.getenv('MYSQL_HOST'),
+        'MYSQL_USER': os.getenv('MYSQL_USER'),
+        'MYSQL_PASSWORD': os.getenv('MYSQL_PASSWORD'),
+        'MYSQL_DB': os.getenv('MYSQL_DB'),
+        'MYSQL_POOL_MIN_SIZE': int(os.getenv('MYSQL_POOL_MIN_SIZE', 1)),
+        'MYSQL_POOL_SIZE': int(os.getenv('MYSQL_POOL_SIZE', 5)) + int(os.getenv('MYSQL_POOL_MAX_OVERFLOW', 10)),
+        'MYSQL_POOL_TIMEOUT': float(os.getenv('MYSQL_POOL_TIMEOUT', 30)),
+        'MYSQL_POOL_RECYCLE': int(float(os.getenv('MYSQL_POOL_RECYCLE', 3600))),
+        'ITEM_CACHE_SIZE': int(os.getenv('ITEM_CACHE_SIZE', 1024)),
+        'ITEM_CACHE_TTL': float(os.getenv('ITEM_CACHE_TTL', 60)),
+        'REDIS_URL': os.getenv('REDIS_URL'),
+        'PASSWORD_HASH_METHOD': os.getenv('PASSWORD_HASH_METHOD', DEFAULT_WERKZEUG_METHOD),
+        'HASH_WORKERS': int(os.getenv('HASH_WORKERS', 2)),
+        'HASH_MAX_PENDING': int(os.getenv('HASH_MAX_PENDING', 32)),
+        'JSON_SERIALIZER': os.getenv('JSON_SERIALIZER', 'raw'),
+        'LOGIN_RATE_LIMIT_IP': parse_rate_limit(os.getenv('LOGIN_RATE_LIMIT_IP', '60/minute')),
+        'LOGIN_RATE_LIMIT_USER': parse_rate_limit(os.getenv('LOGIN_RATE_LIMIT_USER', '10/minute')),
+        'REGISTER_RATE_LIMIT_IP': parse_rate_limit(os.getenv('REGISTER_RATE_LIMIT_IP', '30/minute')),
+        'REGISTER_RATE_LIMIT_USER': parse_rate_limit(os.getenv('REGISTER_RATE_LIMIT_USER', '5/minute')),
+        'API_RATE_LIMIT_USER': parse_rate_limit(os.getenv('API_RATE_LIMIT_USER', 'off')),
+        'TRUSTED_PROXIES': int(os.getenv('TRUSTED_PROXIES', 0)),
+        'ADMIN_USERS': set(filter(None, os.getenv('ADMIN_USERS', '').split(','))),
+        'TOKEN_MAX_AGE': 30 * 60,
+    }
+
+
+# Same claims flask_jwt_extended writes, so tokens work against either app
+def create_access_token(identity, secret, expires_in):
+    now = datetime.now(timezone.utc)
+    claims = {
+        'fresh': True,
+        'iat': now,
+        'jti': str(uuid.uuid4()),
+        'type': 'access',
+        'sub': identity,
+        'nbf': now,
+        'exp': now + timedelta(seconds=expires_in),
+    }
+    return pyjwt.encode(claims, secret, algorithm=JWT_ALGORITHM)
+
+
+# The Redis tier of the item cache is blocking I/O; run it on a thread when it is configured
+async def cache_call(cache, method, *args):
+    if cache.remote is None:
+        return getattr(cache, method)(*args)
+    return await asyncio.to_thread(getattr(cache, method), *args)
+
+
+# Same for the rate limiter's Redis round trip
+async def rate_limit_hit(limiter, key, limit):
+    if isinstance(limiter, LocalRateLimiter):
+        return limiter.hit(key, limit)
+    return await asyncio.to_thread(limiter.hit, key, limit)
+
+
+# And for publishing item change events
+async def publish_event(events, op, ids, version=None):
+    if events.redis is None:
+        return
+    await asyncio.to_thread(events.publish, op, ids, version)
+
+
+# Default cursor for the pool; charges statement time to the request's "db" phase
+class TimedCursor(aiomysql.Cursor):
+    async def execute(self, query, args=None):
+        with timed('db'):
+            return await super().execute(query, args)
+
+    async def executemany(self, query, args):
+        with timed('db'):
+            return await super().executemany(query, args)
+
+
+async def bulk_insert(cursor, items):
+    ids = []
+    for chunk in chunked(items, INSERT_CHUNK_SIZE):
+        await cursor.executemany("INSERT INTO items (name, description, price) VALUES (%s, %s, %s)",
+                                 [(item.name, item.description, item.price) for item in chunk])
+        first_id = cursor.lastrowid
+        ids.extend(range(first_id, first_id + len(chunk)))
+    if ids:
+        await cursor.execute(*collection_bump())
+    return ids
+
+
+async def existing_ids(cursor, ids):
+    found = set()
+    for chunk in chunked(list(set(ids)), ID_CHUNK_SIZE):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        await cursor.execute(f"SELECT id FROM items WHERE id IN ({placeholders})", tuple(chunk))
+        found.update(row[0] for row in await cursor.fetchall())
+    return found
+
+
+async def bulk_update(cursor, items):
+    found = await existing_ids(cursor, [item.id for item in items])
+    params = [(item.name, item.description, item.price, item.id) for item in items if item.id in found]
+    if params:
+        await cursor.executemany("UPDATE items SET name = %s, description = %s, price = %s, version = version + 1 "
+                                 "WHERE id = %s", params)
+        await cursor.execute(*collection_bump())
+    return found
+
+
+async def bulk_delete(cursor, ids):
+    found = await existing_ids(cursor, ids)
+    for chunk in chunked(list(found), ID_CHUNK_SIZE):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        await cursor.execute(f"DELETE FROM items WHERE id IN ({placeholders})", tuple(chunk))
+    if found:
+        await cursor.execute(*collection_bump())
+    return found
+
+
+def not_modified(etag, last_modified=None, weak=True):
+    return add_validators(Response('', status=304), etag, last_modified, weak)
+
+
+def item_entry_response(entry, fields=None):
+    last_modified = datetime.fromisoformat(entry['last_modified']) if entry['last_modified'] else None
+    if is_not_modified(request, entry['etag'], last_modified):
+        return not_modified(entry['etag'], last_modified, weak=False)
+    item = entry['item'] if fields is None else {name: entry['item'][name] for name in fields}
+    return add_validators(jsonify(item), entry['etag'], last_modified, weak=False)
+
+
+def create_app(config=None):
+    app = Quart(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+
+    install_json_provider(app)
+
+    # Request latency and per-phase timings, served at /metrics
+    metrics = Metrics().init_app(app)
+
+    pool = None
+
+    item_cache = make_item_cache(
+        redis_url=app.config['REDIS_URL'],
+        maxsize=app.config['ITEM_CACHE_SIZE'],
+        ttl=app.config['ITEM_CACHE_TTL']
+    )
+
+    # Writes publish change events through Redis that evict the item from other workers' local caches
+    item_events = make_item_events(redis_url=app.config['REDIS_URL'], cache=item_cache.local)
+    metrics.add_gauges('item_events', item_events.stats, "Cross-node item change events.")
+
+    password_hasher = PasswordHasher(
+        scheme='werkzeug',
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['HASH_WORKERS'],
+        max_pending=app.config['HASH_MAX_PENDING']
+    )
+
+    token_blocklist = make_blocklist(redis_url=app.config['REDIS_URL'], max_token_age=app.config['TOKEN_MAX_AGE'])
+
+    rate_limiter = make_rate_limiter(redis_url=app.config['REDIS_URL'])
+    metrics.add_gauges('rate_limit', rate_limiter.stats, "Login, registration and per-user API throttling.")
+
+    item_serializer = ItemSerializer(ItemResponse, mode=app.config['JSON_SERIALIZER'])
+
+    # The pool lives on the serving event loop, so it is opened and closed with it
+    @app.before_serving
+    async def open_pool():
+        nonlocal pool
+        pool = await aiomysql.create_pool(
+            host=app.config['MYSQL_HOST'],
+            user=app.config['MYSQL_USER'],
+            password=app.config['MYSQL_PASSWORD'],
+            db=app.config['MYSQL_DB'],
+            minsize=app.config['MYSQL_POOL_MIN_SIZE'],
+            maxsize=app.config['MYSQL_POOL_SIZE'],
+            pool_recycle=app.config['MYSQL_POOL_RECYCLE'],
+            autocommit=True,
+            cursorclass=TimedCursor
+        )
+
+    @app.before_serving
+    async def start_item_events():
+        item_events.ensure_started()
+
+    # The blocklist's first sync reads the whole revocation stream; do it off the loop
+    @app.before_serving
+    async def start_token_blocklist():
+        await asyncio.to_thread(token_blocklist.ensure_started)
+
+    @app.after_serving
+    async def stop_token_blocklist():
+        token_blocklist.stop()
+
+    @app.after_serving
+    async def close_pool():
+        pool.close()
+        await pool.wait_closed()
+
+    # Borrow a connection; release it with pool.release(conn)
+    async def get_db_connection():
+        try:
+            with timed('pool_wait'):
+                return await asyncio.wait_for(pool.acquire(), app.config['MYSQL_POOL_TIMEOUT'])
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No connection available within {app.config['MYSQL_POOL_TIMEOUT']}s")
+
+    # flask_jwt_extended's @jwt_required(), with the same error responses
+    def jwt_required(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            auth = request.headers.get('Authorization', '')
+            if not auth.startswith('Bearer '):
+                return jsonify(msg="Missing Authorization Header"), 401
+            try:
+                claims = pyjwt.decode(auth[len('Bearer '):], app.config['JWT_SECRET_KEY'], algorithms=[JWT_ALGORITHM])
+            except pyjwt.ExpiredSignatureError:
+                return jsonify(msg="Token has expired"), 401
+            except pyjwt.InvalidTokenError as e:
+                return jsonify(msg=str(e)), 422
+            if claims.get('type') != 'access':
+                return jsonify(msg="Only non-refresh tokens are allowed"), 422
+            if token_blocklist.is_revoked(claims['jti'], claims['sub'], claims.get('iat')):
+                return jsonify(msg="Token has been revoked"), 401
+            limited = await rate_limited('api', user=claims['sub'])
+            if limited:
+                return limited
+            g.jwt = claims
+            return await view(*args, **kwargs)
+        return wrapper
+
+    # 429 response if any of `keys` (ip=..., user=...) is over its limit for `endpoint`, else None.
+    # Runs before any hashing or DB work.
+    async def rate_limited(endpoint, **keys):
+        for kind, value in keys.items():
+            limit = app.config[f'{endpoint.upper()}_RATE_LIMIT_{kind.upper()}']
+            if limit is None or value is None:
+                continue
+            retry_after = await rate_limit_hit(rate_limiter, f'{endpoint}:{kind}:{value}', limit)
+            if retry_after:
+                return jsonify(message="Too many requests, please retry later"), 429, retry_after_header(retry_after)
+        return None
+
+    # User registration endpoint
+    @app.route('/register', methods=['POST'])
+    async def register():
+        limited = await rate_limited('register', ip=client_address(request, app.config['TRUSTED_PROXIES']))
+        if limited:
+            return limited
+
+        try:
+            with timed('validation'):
+                data = RegisterUser.model_validate(await request.get_json())
+        except ValidationError as e:
+            return jsonify(errors=e.errors()), 400
+
+        limited = await rate_limited('register', user=data.username)
+        if limited:
+            return limited
+
+        try:
+            hashed_password = await password_hasher.hash_async(data.password)
+        except HasherBusy:
+            return jsonify(message="Server busy, please retry"), 503, {'Retry-After': '1'}
+
+        conn = await get_db_connection()
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)",
+                                     (data.username, hashed_password))
+        except aiomysql.IntegrityError:
+            return jsonify(message="User already exists"), 400
+        finally:
+            pool.release(conn)
+
+        return jsonify(message="User registered successfully!"), 201
+
+    # User login endpoint (generate JWT token)
+    @app.route('/login', methods=['POST'])
+    async def login():
+        limited = await rate_limited('login', ip=client_address(request, app.config['TRUSTED_PROXIES']))
+        if limited:
+            return limited
+
+        try:
+            with timed('validation'):
+                data = LoginUser.model_validate(await request.get_json())
+        except ValidationError as e:
+            return jsonify(errors=e.errors()), 400
+
+        limited = await rate_limited('login', user=data.username)
+        if limited:
+            return limited
+
+        conn = await get_db_connection()
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT * FROM users WHERE username = %s", (data.username,))
+                user = await cursor.fetchone()
+        except aiomysql.Error as e:
+            return jsonify(message=f"Database error: {str(e)}"), 500
+        finally:
+            pool.release(conn)
+
+        # The connection is back in the pool before the (much slower) KDF runs
+        try:
+            if not (user and await password_hasher.verify_async(user[2], data.password)):
+                return jsonify(message="Invalid credentials"), 401
+            new_hash = await password_hasher.rehash_if_needed_async(user[2], data.password)
+        except HasherBusy:
+            return jsonify(message="Server busy, please retry"), 503, {'Retry-After': '1'}
+
+        if new_hash:
+            conn = await get_db_connection()
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute("UPDATE users SET password = %s WHERE id = %s", (new_hash, user[0]))
+            except aiomysql.Error as e:
+                return jsonify(message=f"Database error: {str(e)}"), 500
+            finally:
+                pool.release(conn)
+
+        access_token = create_access_token(data.username, app.config['JWT_SECRET_KEY'],
+                                           app.config['TOKEN_MAX_AGE'])
+        return jsonify(access_token=access_token), 200
+
+    # Logout: revoke the token used for this request
+    @app.route('/logout', methods=['POST'])
+    @jwt_required
+    async def logout():
+        await asyncio.to_thread(token_blocklist.revoke, g.jwt['jti'], g.jwt['exp'])
+        return jsonify(message="Successfully logged out"), 200
+
+    # Admin: revoke a token by jti, or every token issued so far to a username
+    @app.route('/admin/revoke', methods=['POST'])
+    @jwt_required
+    async def revoke_token():
+        if g.jwt['sub'] not in app.config['ADMIN_USERS']:
+            return jsonify(message="Admin access required"), 403
+
+        data = await request.get_json(silent=True) or {}
+        if data.get('jti'):
+            await asyncio.to_thread(token_blocklist.revoke, data['jti'], time.time() + app.config['TOKEN_MAX_AGE'])
+            return jsonify(message="Token revoked"), 200
+        if data.get('username'):
+            await asyncio.to_thread(token_blocklist.revoke_user, data['username'])
+            return jsonify(message=f"Tokens for {data['username']} revoked"), 200
+        return jsonify(message="Provide a jti or username"), 400
+
+    # Protected route (requires JWT token)
+    @app.route('/protected', methods=['GET'])
+    @jwt_required
+    async def protected():
+        return jsonify(message="You have access to this route!")
+
+    # Create Item
+    @app.route('/create_item', methods=['POST'])
+    @jwt_required
+    async def create_item():
+        try:
+            with timed('validation'):
+                data = CreateItem.model_validate(await request.get_json())
+        except ValidationError as e:
+            return jsonify(errors=e.errors()), 400
+
+        async def insert(cursor):
+            await cursor.execute("INSERT INTO items (name, description, price) VALUES (%s, %s, %s)",
+                                 (data.name, data.description, data.price))
+            item_id = cursor.lastrowid
+            await cursor.execute(*collection_bump())
+            return item_id
+
+        item_id, error = await in_transaction(insert)
+        if error:
+            return error
+        await publish_event(item_events, 'create', [item_id], version=1)
+
+        return jsonify(id=item_id, message="Item created successfully!"), 201
+
+    # Get Item by ID
+    @app.route('/get_item/<int:id>', methods=['GET'])
+    @jwt_required
+    async def get_item(id):
+        try:
+            fields = parse_fields(request.args.get('fields'), ItemResponse)
+        except ValueError as e:
+            return jsonify(message=str(e)), 400
+
+        cached = await cache_call(item_cache, 'get', str(id))
+        if cached is not None:
+            return item_entry_response(cached, fields)
+
+        conn = await get_db_connection()
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT * FROM items WHERE id = %s", (id,))
+                item = await cursor.fetchone()
+        finally:
+            pool.release(conn)
+
+        if item:
+            entry = item_cache_entry(item_serializer.item_dict(item), id, item[5], item[6])
+            await cache_call(item_cache, 'set', str(id), entry)
+            return item_entry_response(entry, fields)
+        else:
+            return jsonify(message="Item not found"), 404
+
+    # Update Item by ID
+    @app.route('/update_item/<int:id>', methods=['PUT'])
+    @jwt_required
+    async def update_item(id):
+        try:
+            with timed('validation'):
+                data = UpdateItem.model_validate(await request.get_json())
+        except ValidationError as e:
+            return jsonify(errors=e.errors()), 400
+
+        sql = "UPDATE items SET name = %s, description = %s, price = %s, version = version + 1 WHERE id = %s"
+        params = (data.name, data.description, data.price, id)
+        conditional, version = if_match_version(request, id)
+        if version is not None:
+            sql += " AND version = %s"
+            params += (version,)
+
+        async def update(cursor):
+            await cursor.execute(sql, params)
+            if cursor.rowcount <= 0:
+                return False
+            await cursor.execute(*collection_bump())
+            return True
+
+        updated, error = await in_transaction(update)
+        if error:
+            return error
+        if not updated:
+            if conditional:
+                return jsonify(message="Item was modified or deleted; fetch it again"), 412
+            return jsonify(message="Item not found"), 404
+        await cache_call(item_cache, 'delete', str(id))
+        await publish_event(item_events, 'update', [id], version=version + 1 if version is not None else None)
+
+        resp = jsonify(message="Item updated successfully!")
+        if version is not None:
+            resp.set_etag(item_etag(id, version + 1))
+        return resp, 200
+
+    # Delete Item by ID
+    @app.route('/delete_item/<int:id>', methods=['DELETE'])
+    @jwt_required
+    async def delete_item(id):
+        async def delete(cursor):
+            await cursor.execute("DELETE FROM items WHERE id = %s", (id,))
+            if cursor.rowcount <= 0:
+                return False
+            await cursor.execute(*collection_bump())
+            return True
+
+        deleted, error = await in_transaction(delete)
+        if error:
+            return error
+        await cache_call(item_cache, 'delete', str(id))
+        if deleted:
+            await publish_event(item_events, 'delete', [id])
+
+        return jsonify(message="Item deleted successfully!"), 200
+
+    # Run `operation(cursor)` in one transaction; returns (result, error response)
+    async def in_transaction(operation):
+        conn = await get_db_connection()
+        try:
+            await conn.begin()
+            async with conn.cursor() as cursor:
+                result = await operation(cursor)
+            await conn.commit()
+            return result, None
+        except aiomysql.Error as e:
+            await conn.rollback()
+            return None, (jsonify(message=f"Database error: {str(e)}"), 500)
+        finally:
+            pool.release(conn)
+
+    # Bulk create items in one transaction
+    @app.route('/items/bulk', methods=['POST'])
+    @jwt_required
+    async def bulk_create_items():
+        try:
+            rows = bulk_payload(await request.get_json())
+        except ValueError as e:
+            return jsonify(message=str(e)), 400
+
+        with timed('validation'):
+            items, errors = validate_rows(CreateItem, rows)
+        if errors:
+            return jsonify(message="Invalid data", errors=errors), 400
+
+        ids, error = await in_transaction(lambda cursor: bulk_insert(cursor, items))
+        if error:
+            return error
+        await publish_event(item_events, 'create', ids, version=1)
+        results = [{"index": index, "id": item_id} for index, item_id in enumerate(ids)]
+        return jsonify(results=results, message=f"{len(ids)} items created successfully!"), 201
+
+    # Bulk update items in one transaction
+    @app.route('/items/bulk', methods=['PUT'])
+    @jwt_required
+    async def bulk_update_items():
+        try:
+            rows = bulk_payload(await request.get_json())
+        except ValueError as e:
+            return jsonify(message=str(e)), 400
+
+        with timed('validation'):
+            items, errors = validate_rows(BulkUpdateItem, rows)
+        if errors:
+            return jsonify(message="Invalid data", errors=errors), 400
+
+        found, error = await in_transaction(lambda cursor: bulk_update(cursor, items))
+        if error:
+            return error
+
+        for item_id in found:
+            await cache_call(item_cache, 'delete', str(item_id))
+        await publish_event(item_events, 'update', list(found))
+        return jsonify(results=row_results([item.id for item in items], found, "updated"),
+                       message=f"{len(found)} items updated successfully!"), 200
+
+    # Bulk delete items in one transaction
+    @app.route('/items/bulk', methods=['DELETE'])
+    @jwt_required
+    async def bulk_delete_items():
+        try:
+            ids = parse_ids(bulk_payload(await request.get_json(), key='ids'))
+        except ValueError as e:
+            return jsonify(message=str(e)), 400
+
+        found, error = await in_transaction(lambda cursor: bulk_delete(cursor, ids))
+        if error:
+            return error
+
+        for item_id in found:
+            await cache_call(item_cache, 'delete', str(item_id))
+        await publish_event(item_events, 'delete', list(found))
+        return jsonify(results=row_results(ids, found, "deleted"),
+                       message=f"{len(found)} items deleted successfully!"), 200
+
+    def pool_snapshot():
+        if pool is None:
+            return {}
+        return {
+            "pool_size": pool.maxsize,
+            "min_size": pool.minsize,
+            "in_use": pool.size - pool.freesize,
+            "idle": pool.freesize,
+            "total": pool.size,
+        }
+
+    metrics.add_gauges('mysql_pool', pool_snapshot, "Connection pool statistics.")
+
+    # Connection pool statistics
+    @app.route('/pool_stats', methods=['GET'])
+    @jwt_required
+    async def pool_stats():
+        return jsonify(pool_snapshot()), 200
+
+    # Item cache statistics
+    @app.route('/cache_stats', methods=['GET'])
+    @jwt_required
+    async def cache_stats():
+        return jsonify(item_cache.stats()), 200
+
+    # Stream rows from a server-side cursor in batches, then hand the connection back
+    async def stream_items(conn, sql, params, mode, serializer):
+        first = True
+        try:
+            if mode == 'json':
+                yield '{"items": ['
+            async with conn.cursor(aiomysql.SSCursor) as cursor:
+                await cursor.execute(sql, params)
+                while True:
+                    rows = await cursor.fetchmany(STREAM_BATCH_SIZE)
+                    if not rows:
+                        break
+                    if mode == 'ndjson':
+                        yield ''.join(dumps_str(serializer.item_dict(row)) + '\n' for row in rows)
+                    else:
+                        chunk = ','.join(dumps_str(serializer.item_dict(row)) for row in rows)
+                        yield ('' if first else ',') + chunk
+                        first = False
+            if mode == 'json':
+                yield ']}'
+        finally:
+            await conn.rollback()
+            pool.release(conn)
+
+    # Get all items, one keyset page at a time (?limit=&after=) or streamed (?stream=ndjson|json).
+    # Filters: name_prefix, min_price, max_price, created_after, created_before; sort: id|name|price|created_at (- for desc)
+    # ?fields=id,name,price returns (and reads) only those fields
+    @app.route('/all_items', methods=['GET'])
+    @jwt_required
+    async def get_all_items():
+        try:
+            limit, after_id, stream = parse_page_args(request.args)
+            fields = parse_fields(request.args.get('fields'), ItemResponse)
+            query = ItemQuery.from_args(request.args).select(fields)
+        except ValueError as e:
+            return jsonify(message=str(e)), 400
+        serializer = item_serializer.project(fields)
+
+        conn = await get_db_connection()
+        streaming = False
+
+        try:
+            async with conn.cursor() as cursor:
+                if query.residual_columns():
+                    table_rows = cached_table_estimate()
+                    if table_rows is None:
+                        await cursor.execute(TABLE_ESTIMATE_QUERY)
+                        table_rows = store_table_estimate(await cursor.fetchone())
+                    try:
+                        query.check_table_rows(table_rows)
+                    except ValueError as e:
+                        return jsonify(message=str(e)), 400
+
+                # One snapshot for the fingerprint and the rows, as in the sync app
+                await conn.begin()
+                await cursor.execute(COLLECTION_VERSION_QUERY)
+                changes, last_modified = await cursor.fetchone()
+                etag = collection_etag(changes, last_modified, request.query_string.decode())
+                if is_not_modified(request, etag, last_modified):
+                    return not_modified(etag, last_modified)
+
+                if stream:
+                    sql, params = query.stream_sql()
+                    streaming = True
+                    resp = Response(stream_items(conn, sql, params, stream, serializer),
+                                    mimetype=STREAM_CONTENT_TYPES[stream])
+                    return add_validators(resp, etag, last_modified)
+
+                sql, params = query.page_sql(limit)
+                await cursor.execute(sql, params)
+                items, next_cursor = query.split_page(await cursor.fetchall(), limit)
+
+            if items or after_id:
+                with timed('serialization'):
+                    body = serializer.dumps_page(items, next_cursor)
+                resp = add_validators(Response(body, mimetype='application/json'), etag, last_modified)
+                if next_cursor:
+                    resp.headers['Link'] = next_link(request, next_cursor)
+                return resp, 200
+            else:
+                return jsonify(message="No items found"), 404
+        # Logged here; the client gets the same generic 500 body as from the sync app
+        except Exception:
+            app.logger.exception("Listing items failed")
+            abort(500)
+        finally:
+            if not streaming:
+                await conn.rollback()
+                pool.release(conn)
+
+    return app
+
+
+if __name__ == '__main__':
+    # Local development convenience; production runs migrations as a deploy step
+    from common.migrations import main as migrate
+    migrate(['upgrade'])
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
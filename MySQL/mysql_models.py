@@ -0,0 +1,35 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+# Pydantic models for user and item data validation
+class RegisterUser(BaseModel):
+    username: str = Field(..., min_length=8, max_length=10)
+    password: str = Field(..., min_length=6)
+
+class LoginUser(BaseModel):
+    username: str
+    password: str
+
+class CreateItem(BaseModel):
+    name: str = Field(..., min_length=3, max_length=100)
+    description: str = Field(..., min_length=3)
+    price: float = Field(..., ge=0)
+
+class UpdateItem(BaseModel):
+    name: str = Field(..., min_length=3, max_length=100)
+    description: str = Field(..., min_length=3)
+    price: float = Field(..., ge=0)
+
+class BulkUpdateItem(UpdateItem):
+    id: int
+
+class ItemResponse(BaseModel):
+    id: int
+    name: str
+    description: str
+    price: float
+    created_at: str
+
+class GetAllItems(BaseModel):
+    items: List[ItemResponse]
+    next_cursor: Optional[str] = None
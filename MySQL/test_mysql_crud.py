@@ -1,15 +1,69 @@
+import asyncio
+import json
 import pytest
-from mysql_crud import app, initialize_db, get_db_connection
+import time
+from mysql_crud import create_app, initialize_db, get_db_connection, resources
+from mysql_crud_async import create_app as create_async_app
+from common.ratelimit import parse_rate_limit
 from flask import jsonify
 from flask_jwt_extended import create_access_token
 import mysql.connector
 
+app = create_app()
+
+# Synchronous facade over Quart's test client, so the same tests drive the async app
+class AsyncAppClient:
+    def __init__(self, async_app):
+        self.loop = asyncio.new_event_loop()
+        self.test_app = async_app.test_app()
+        self.loop.run_until_complete(self.test_app.__aenter__())
+        self.client = self.test_app.test_client()
+
+    def open(self, path, method, json=None, headers=None):
+        response = self.loop.run_until_complete(self.client.open(path, method=method, json=json, headers=headers))
+        body = self.loop.run_until_complete(response.get_data())
+        return AsyncAppResponse(response, body)
+
+    def get(self, path, **kwargs):
+        return self.open(path, 'GET', **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, 'POST', **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.open(path, 'PUT', **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.open(path, 'DELETE', **kwargs)
+
+    def close(self):
+        self.loop.run_until_complete(self.test_app.__aexit__(None, None, None))
+        self.loop.close()
+
+
+class AsyncAppResponse:
+    def __init__(self, response, body):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.mimetype = response.mimetype
+        self.body = body
+
+    @property
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+    def get_data(self, as_text=False):
+        return self.body.decode('utf-8') if as_text else self.body
+
+
 # --- Test Setup ---
-@pytest.fixture(scope="module")
-def client():
+# Every test runs against both the Flask app and its asyncio (Quart) twin
+@pytest.fixture(scope="module", params=['sync', 'async'])
+def client(request):
     # Initialize the Flask app test client
-    with app.test_client() as client:
-        # Set up the test database
+    with app.app_context(), app.test_client() as client:
+        # Set up the test database (schema is no longer created at import)
+        initialize_db()
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -20,7 +74,12 @@ def client():
         initialize_db()  # Creates the necessary tables in the 'test_db'
         
         # Yield the test client to the tests
-        yield client
+        if request.param == 'async':
+            async_client = AsyncAppClient(create_async_app())
+            yield async_client
+            async_client.close()
+        else:
+            yield client
         
         # Tear down 
         cursor.execute("DROP DATABASE IF EXISTS test_db")
@@ -137,3 +196,349 @@ def test_get_all_items(client):
     assert len(response.json['items']) >= 2  
     assert 'id' in response.json['items'][0] 
     assert 'name' in response.json['items'][0] 
+
+
+def test_get_all_items_paginated(client):
+    # Test keyset pagination with limit/after
+    client.post('/register', json={'username': 'testuser8', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuser8', 'password': 'password123'})
+    token = login_response.json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    for i in range(3):
+        client.post('/create_item', json={'name': f'Page Item {i}', 'description': 'Paged description', 'price': 1.5},
+                    headers=headers)
+
+    first = client.get('/all_items?limit=2', headers=headers)
+    assert first.status_code == 200
+    assert len(first.json['items']) == 2
+    assert first.json['next_cursor']
+    assert 'rel="next"' in first.headers['Link']
+
+    second = client.get(f"/all_items?limit=2&after={first.json['next_cursor']}", headers=headers)
+    assert second.status_code == 200
+    assert second.json['items'][0]['id'] > first.json['items'][-1]['id']
+
+
+def test_get_all_items_streamed(client):
+    # Test NDJSON streaming mode
+    client.post('/register', json={'username': 'testuser9', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuser9', 'password': 'password123'})
+    token = login_response.json['access_token']
+
+    response = client.get('/all_items?stream=ndjson', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) >= 2
+
+
+def test_get_item_after_update_is_not_stale(client):
+    # Test that updating an item invalidates the cached copy
+    client.post('/register', json={'username': 'testuse10', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse10', 'password': 'password123'})
+    token = login_response.json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    item_response = client.post('/create_item', json={'name': 'Cached Item', 'description': 'Cached description', 'price': 5.0},
+                                headers=headers)
+    item_id = item_response.json['id']
+
+    assert client.get(f'/get_item/{item_id}', headers=headers).json['name'] == 'Cached Item'
+    assert client.get(f'/get_item/{item_id}', headers=headers).json['name'] == 'Cached Item'
+    client.put(f'/update_item/{item_id}', json={'name': 'Fresh Item', 'description': 'Fresh description', 'price': 6.0},
+               headers=headers)
+
+    response = client.get(f'/get_item/{item_id}', headers=headers)
+    assert response.json['name'] == 'Fresh Item'
+    assert client.get('/cache_stats', headers=headers).json['local']['hits'] >= 1
+
+
+def test_bulk_items(client):
+    # Test bulk create, update and delete
+    client.post('/register', json={'username': 'testuse11', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse11', 'password': 'password123'})
+    token = login_response.json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.post('/items/bulk', json=[{'name': 'Bulk Item 1', 'description': 'Bulk description', 'price': 1.0},
+                                                 {'name': 'Bulk Item 2', 'description': 'Bulk description', 'price': 2.0}],
+                           headers=headers)
+    assert response.status_code == 201
+    ids = [result['id'] for result in response.json['results']]
+    assert ids[1] == ids[0] + 1
+
+    response = client.put('/items/bulk', json=[{'id': ids[0], 'name': 'Bulk Updated', 'description': 'Bulk description', 'price': 3.0}],
+                          headers=headers)
+    assert response.status_code == 200
+    assert response.json['results'][0]['status'] == 'updated'
+    assert client.get(f'/get_item/{ids[0]}', headers=headers).json['name'] == 'Bulk Updated'
+
+    response = client.delete('/items/bulk', json={'ids': ids}, headers=headers)
+    assert response.status_code == 200
+    assert all(result['status'] == 'deleted' for result in response.json['results'])
+
+
+def test_bulk_create_reports_indexed_errors(client):
+    # Test that one invalid row rejects the whole batch with its index
+    client.post('/register', json={'username': 'testuse12', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse12', 'password': 'password123'})
+    token = login_response.json['access_token']
+
+    response = client.post('/items/bulk', json=[{'name': 'Bulk Item', 'description': 'Bulk description', 'price': 1.0},
+                                                 {'name': 'x', 'description': 'Bulk description', 'price': 1.0}],
+                           headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 400
+    assert response.json['errors'][0]['index'] == 1
+
+
+def test_register_duplicate_username(client):
+    # Test that the unique index on users.username rejects duplicates
+    client.post('/register', json={'username': 'testuse13', 'password': 'password123'})
+    response = client.post('/register', json={'username': 'testuse13', 'password': 'password123'})
+    assert response.status_code == 400
+    assert response.json['message'] == 'User already exists'
+
+
+def test_conditional_get(client):
+    # Test that a matching If-None-Match returns 304 with no body
+    client.post('/register', json={'username': 'testuse14', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse14', 'password': 'password123'})
+    token = login_response.json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    item_response = client.post('/create_item', json={'name': 'ETag Item', 'description': 'ETag description', 'price': 1.0},
+                                headers=headers)
+    item_id = item_response.json['id']
+
+    response = client.get(f'/get_item/{item_id}', headers=headers)
+    etag = response.headers['ETag']
+    response = client.get(f'/get_item/{item_id}', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get('/all_items', headers=headers)
+    etag = response.headers['ETag']
+    assert client.get('/all_items', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    client.put(f'/update_item/{item_id}', json={'name': 'ETag Item 2', 'description': 'ETag description', 'price': 2.0},
+               headers=headers)
+    assert client.get('/all_items', headers={**headers, 'If-None-Match': etag}).status_code == 200
+
+
+def test_logout_revokes_token(client):
+    # Test that a token can no longer be used after logout
+    client.post('/register', json={'username': 'testuse15', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse15', 'password': 'password123'})
+    token = login_response.json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert client.get('/protected', headers=headers).status_code == 200
+    assert client.post('/logout', headers=headers).status_code == 200
+    assert client.get('/protected', headers=headers).status_code == 401
+
+
+def test_get_all_items_filtered_and_sorted(client):
+    # Test price range filtering with descending price order
+    client.post('/register', json={'username': 'testuse16', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse16', 'password': 'password123'})
+    token = login_response.json['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.post('/items/bulk', json=[{'name': f'Filter Item {i}', 'description': 'Filter description', 'price': 1000 + i}
+                                     for i in range(3)], headers=headers)
+
+    response = client.get('/all_items?min_price=1000&max_price=1001&sort=-price', headers=headers)
+    assert response.status_code == 200
+    assert [item['price'] for item in response.json['items']] == [1001.0, 1000.0]
+
+    response = client.get('/all_items?sort=description', headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('mode', ['async', 'strong'])
+def test_create_item_group_commit(client, monkeypatch, mode):
+    # Test the write-behind create modes: 202 + ticket, or 201 once the group commit lands
+    if isinstance(client, AsyncAppClient):
+        pytest.skip("group commit is only wired into the Flask app")
+    monkeypatch.setitem(app.config, 'CREATE_ITEM_MODE', mode)
+    client.post('/register', json={'username': 'testuse17', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse17', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {login_response.json['access_token']}"}
+
+    response = client.post('/create_item', json={'name': 'Queued Item', 'description': 'Queued description', 'price': 3.5},
+                           headers=headers)
+    if mode == 'strong':
+        assert response.status_code == 201
+        item_id = response.json['id']
+    else:
+        assert response.status_code == 202
+        ticket_url = response.headers['Location']
+        for _ in range(100):
+            ticket = client.get(ticket_url, headers=headers).json
+            if ticket['status'] != 'queued':
+                break
+            time.sleep(0.01)
+        assert ticket['status'] == 'committed'
+        item_id = ticket['id']
+
+    assert client.get(f'/get_item/{item_id}', headers=headers).json['name'] == 'Queued Item'
+    assert client.get('/group_commit_stats', headers=headers).json['committed'] >= 1
+
+
+def test_update_item_if_match(client):
+    # Test optimistic concurrency: updates carrying a stale ETag get 412, unknown ids 404
+    client.post('/register', json={'username': 'testuse18', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse18', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {login_response.json['access_token']}"}
+    body = {'name': 'Versioned Item', 'description': 'Versioned description', 'price': 4.0}
+
+    item_id = client.post('/create_item', json=body, headers=headers).json['id']
+    etag = client.get(f'/get_item/{item_id}', headers=headers).headers['ETag']
+
+    response = client.put(f'/update_item/{item_id}', json=body, headers={**headers, 'If-Match': etag})
+    assert response.status_code == 200
+    new_etag = response.headers['ETag']
+    assert new_etag != etag
+
+    response = client.put(f'/update_item/{item_id}', json=body, headers={**headers, 'If-Match': etag})
+    assert response.status_code == 412
+    assert client.get(f'/get_item/{item_id}', headers=headers).headers['ETag'] == new_etag
+
+    assert client.put('/update_item/999999', json=body, headers=headers).status_code == 404
+    assert client.put('/update_item/999999', json=body, headers={**headers, 'If-Match': '*'}).status_code == 412
+
+
+def test_login_rate_limited_per_username(client):
+    # Test that repeated logins for one username get 429 with Retry-After once its bucket is empty
+    attempts = app.config['LOGIN_RATE_LIMIT_USER'].burst
+    for _ in range(attempts):
+        response = client.post('/login', json={'username': 'testuse19', 'password': 'wrongpassword'})
+        assert response.status_code == 401
+
+    response = client.post('/login', json={'username': 'testuse19', 'password': 'wrongpassword'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    # other usernames are unaffected
+    assert client.post('/login', json={'username': 'testuse20', 'password': 'wrongpassword'}).status_code == 401
+
+
+def test_api_rate_limited_per_user(client, monkeypatch):
+    # Test that authenticated routes are limited per token identity once API_RATE_LIMIT_USER is set
+    if isinstance(client, AsyncAppClient):
+        pytest.skip("The async app reads its limits when it is created")
+    monkeypatch.setitem(app.config, 'API_RATE_LIMIT_USER', parse_rate_limit('2/minute'))
+    tokens = {}
+    for username in ('testuse24', 'testuse25'):
+        client.post('/register', json={'username': username, 'password': 'password123'})
+        login_response = client.post('/login', json={'username': username, 'password': 'password123'})
+        tokens[username] = {'Authorization': f"Bearer {login_response.json['access_token']}"}
+
+    assert [client.get('/protected', headers=tokens['testuse24']).status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get('/protected', headers=tokens['testuse25']).status_code == 200
+
+
+def test_get_items_with_fields(client):
+    # Test ?fields= projection on list and single-item reads
+    client.post('/register', json={'username': 'testuse21', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse21', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {login_response.json['access_token']}"}
+    item_id = client.post('/create_item', json={'name': 'Slim Item', 'description': 'Not wanted', 'price': 2.5},
+                          headers=headers).json['id']
+
+    response = client.get('/all_items?fields=id,name,price&limit=1000', headers=headers)
+    assert response.status_code == 200
+    assert all(set(item) == {'id', 'name', 'price'} for item in response.json['items'])
+
+    response = client.get('/all_items?fields=name&stream=ndjson', headers=headers)
+    assert all(set(json.loads(line)) == {'name'} for line in response.get_data(as_text=True).splitlines())
+
+    assert client.get(f'/get_item/{item_id}?fields=name', headers=headers).json == {'name': 'Slim Item'}
+    assert client.get('/all_items?fields=id,password', headers=headers).status_code == 400
+
+
+def test_item_stats(client):
+    # Test that /items/stats follows item writes without a rescan
+    if isinstance(client, AsyncAppClient):
+        pytest.skip("The async app has no /items/stats")
+    client.post('/register', json={'username': 'testuse22', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse22', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {login_response.json['access_token']}"}
+    response = client.get('/items/stats', headers=headers)
+    assert response.status_code == 200
+    before = response.json
+
+    response = client.post('/create_item', json={'name': 'Priciest Item', 'description': 'Top of the range',
+                                                 'price': 987654.0}, headers=headers)
+    after = client.get('/items/stats', headers=headers).json
+    assert after['count'] == before['count'] + 1
+    assert after['max'] == 987654.0
+    assert set(after['percentiles']) == {'p50', 'p90', 'p95', 'p99'}
+
+    client.delete(f"/delete_item/{response.json['id']}", headers=headers)
+    assert client.get('/items/stats', headers=headers).json['count'] == before['count']
+
+
+def test_item_change_events(client):
+    # Test that /items/events streams item writes as Server-Sent Events
+    if isinstance(client, AsyncAppClient):
+        pytest.skip("The async app has no /items/events")
+    client.post('/register', json={'username': 'testuse23', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse23', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {login_response.json['access_token']}"}
+    response = client.get('/items/events', headers=headers, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+
+    created = client.post('/create_item', json={'name': 'Streamed Item', 'description': 'Sent as an event',
+                                                'price': 5.0}, headers=headers)
+    event = next(chunks).decode()
+    assert 'event: create\n' in event
+    assert json.loads(event.split('data: ')[1]) == {"id": created.json['id'], "op": "create", "version": 1}
+    response.close()
+
+
+def test_items_csv_import_and_export(client):
+    # Test that a CSV import is loaded and reported line by line, and shows up in the export
+    if isinstance(client, AsyncAppClient):
+        pytest.skip("The async app has no CSV import/export")
+    client.post('/register', json={'username': 'testuse24', 'password': 'password123'})
+    login_response = client.post('/login', json={'username': 'testuse24', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {login_response.json['access_token']}"}
+
+    csv_body = 'name,description,price\r\nCSV Item One,"Imported, quoted",12.50\r\nno,bad row,-1\r\n'
+    response = client.post('/items/import', data=csv_body, headers={**headers, 'Content-Type': 'text/csv'})
+    assert response.status_code == 200
+    progress = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert progress[-1] == {"done": True, "imported": 1, "failed": 1}
+    assert progress[0]['errors'][0]['line'] == 3
+
+    response = client.post('/items/import', data='name,price\r\n', headers={**headers, 'Content-Type': 'text/csv'})
+    assert response.status_code == 400
+
+    response = client.get('/items/export.csv?fields=name,price&name_prefix=CSV%20Item', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    header, row = response.get_data(as_text=True).splitlines()
+    assert header == 'name,price'
+    assert row.split(',')[0] == 'CSV Item One' and float(row.split(',')[1]) == 12.5
+
+
+def test_create_app_builds_separate_resources():
+    # Test that every create_app call applies its config and gets its own repository, pools and queue
+    first = create_app({'ITEM_BACKEND': 'memory', 'CREATE_ITEM_MODE': 'async'})
+    second = create_app({'ITEM_BACKEND': 'memory'})
+    assert first.config['CREATE_ITEM_MODE'] == 'async'
+    assert second.config['CREATE_ITEM_MODE'] == app.config['CREATE_ITEM_MODE']
+    assert first.extensions['mysql_crud'].db_pool is not second.extensions['mysql_crud'].db_pool
+
+    with first.app_context():
+        item_id = resources().item_repository.create('Only in first', None, 1.0)
+        assert resources().item_repository.get(item_id) is not None
+    with second.app_context():
+        assert resources().item_repository.get(item_id) is None
+
+    for created in (first, second):
+        created.extensions['lifecycle'].shutdown()
@@ -0,0 +1,386 @@
+import argparse
+import http.client
+import importlib
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from werkzeug.serving import make_server
+
+from common.standins import MemoryCollection, sqlite_creator
+from common.write_behind import CREATE_MODES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_USER = 'benchuser'
+BENCH_PASSWORD = 'benchpassword'
+
+# app name -> (directory, module, operation -> route)
+APPS = {
+    'mysql': ('MySQL', 'mysql_crud', {
+        'create_item': ('POST', '/create_item'),
+        'get_item': ('GET', '/get_item/{id}'),
+        'all_items': ('GET', '/all_items?limit={limit}'),
+        'login': ('POST', '/login'),
+    }),
+    'e2e': ('EndToEndTesting', 'crud_mysql', {
+        'create_item': ('POST', '/create_item'),
+        'get_item': ('GET', '/get_item_by_id/{id}'),
+        'all_items': ('GET', '/get_items?limit={limit}'),
+        'login': ('POST', '/login'),
+    }),
+    'mongo': ('MongoDB', 'mongo_crud', {
+        'add': ('POST', '/add'),
+        'get_all': ('GET', '/get_all'),
+    }),
+}
+
+DEFAULT_MIXES = {
+    'mysql': 'get_item=6,all_items=2,create_item=2',
+    'e2e': 'get_item=6,all_items=2,create_item=2',
+    'mongo': 'get_all=5,add=5',
+}
+
+# Item storage behind the MySQL apps: the SQLite stand-in, or plain memory to time the HTTP layer alone
+BACKENDS = ('sqlite', 'memory')
+
+SeedItem = namedtuple('SeedItem', 'name description price')
+
+
+def parse_mix(mix, operations):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in operations:
+            raise ValueError(f"Unknown operation {name!r}; choose from {', '.join(operations)}")
+        weights[name] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("The mix needs at least one operation with a positive weight")
+    return weights
+
+
+# Nearest-rank percentile over an already sorted list
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput": round(len(values) / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1] if values else None),
+    }
+
+
+# Build an app with its databases swapped for local stand-ins; returns (module, app)
+def load_app(name, workdir, backend='sqlite', create_mode='direct'):
+    directory, module_name, _ = APPS[name]
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-secret-key-not-for-production')
+    # The login mix measures hashing, not the throttle; set these to benchmark a limited app
+    for setting in ('LOGIN_RATE_LIMIT_IP', 'LOGIN_RATE_LIMIT_USER', 'REGISTER_RATE_LIMIT_IP', 'REGISTER_RATE_LIMIT_USER'):
+        os.environ.setdefault(setting, 'off')
+    sys.path.insert(0, os.path.join(ROOT, directory))
+    module = importlib.import_module(module_name)
+
+    if name == 'mongo':
+        module.collection = MemoryCollection()
+        return module, module.app
+
+    # The MySQL item repository runs its SQL against SQLite through the pool
+    app = module.create_app({
+        'MYSQL_CONNECTION_CREATOR': sqlite_creator(os.path.join(workdir, f'{name}.sqlite3')),
+        'ITEM_BACKEND': 'memory' if backend == 'memory' else 'mysql',
+        'CREATE_ITEM_MODE': create_mode,
+        'REDIS_URL': None,
+    })
+    return module, app
+
+
+def seed(name, module, app, count):
+    if name == 'mongo':
+        for i in range(count):
+            module.collection.insert_one({"name": f"Seed {i}", "value": i})
+        return list(range(count))
+
+    with app.app_context():
+        return module.resources().item_repository.create_many(
+            [SeedItem(f"Seed item {i}", f"Seeded description {i}", i % 100 + 0.99) for i in range(count)])
+
+
+# One client connection: in-process WSGI calls, or HTTP/1.1 keep-alive to a server
+class Client:
+    def __init__(self, app=None, host=None, port=None):
+        self.test_client = app.test_client() if app is not None else None
+        self.host, self.port = host, port
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.test_client is not None:
+            response = self.test_client.open(path, method=method, json=body, headers=headers)
+            response.get_data()
+            return response.status_code, response.get_json(silent=True)
+
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        try:
+            parsed = json.loads(data) if data and response.getheader('Content-Type', '').startswith('application/json') else None
+        except ValueError:
+            parsed = None
+        return response.status, parsed
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+class Workload:
+    def __init__(self, name, operations, weights, ids, token=None, limit=100):
+        self.name = name
+        self.operations = operations
+        self.names = list(weights)
+        self.weights = [weights[n] for n in self.names]
+        self.ids = ids
+        self.headers = {'Authorization': f'Bearer {token}'} if token else {}
+        self.limit = limit
+        self.counter = 0
+        self._lock = threading.Lock()
+
+    def next_request(self, rng):
+        operation = rng.choices(self.names, self.weights)[0]
+        method, route = self.operations[operation]
+        with self._lock:
+            self.counter += 1
+            n = self.counter
+        path = route.format(id=rng.choice(self.ids) if self.ids else 1, limit=self.limit)
+        body = None
+        if operation == 'create_item':
+            body = {"name": f"Bench item {n}", "description": "Created by the benchmark", "price": 9.99}
+        elif operation == 'add':
+            body = {"name": f"Bench doc {n}", "value": n}
+        elif operation == 'login':
+            body = {"username": BENCH_USER, "password": BENCH_PASSWORD}
+        return operation, method, path, body
+
+
+def run_load(make_client, workload, concurrency, requests=None, duration=None, warmup=0, seed_value=0):
+    samples = {name: [] for name in workload.names}
+    errors = {name: 0 for name in workload.names}
+    lock = threading.Lock()
+    remaining = [requests]
+    deadline = [None]
+
+    def take():
+        with lock:
+            if remaining[0] is not None:
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+            return deadline[0] is None or time.perf_counter() < deadline[0]
+
+    def worker(index):
+        rng = random.Random(seed_value + index)
+        client = make_client()
+        local = {name: [] for name in workload.names}
+        local_errors = {name: 0 for name in workload.names}
+        try:
+            for _ in range(warmup):
+                operation, method, path, body = workload.next_request(rng)
+                client.request(method, path, body, workload.headers)
+            start_barrier.wait()
+            while take():
+                operation, method, path, body = workload.next_request(rng)
+                started = time.perf_counter()
+                try:
+                    status, _ = client.request(method, path, body, workload.headers)
+                except Exception:
+                    status = None
+                local[operation].append(time.perf_counter() - started)
+                if status is None or status >= 400:
+                    local_errors[operation] += 1
+        finally:
+            client.close()
+            with lock:
+                for name in workload.names:
+                    samples[name].extend(local[name])
+                    errors[name] += local_errors[name]
+
+    start_barrier = threading.Barrier(concurrency + 1)
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    if duration is not None:
+        deadline[0] = started + duration
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {name: summarize(samples[name], errors[name], elapsed) for name in workload.names}
+    all_samples = [v for name in workload.names for v in samples[name]]
+    results['total'] = summarize(all_samples, sum(errors.values()), elapsed)
+    return results, elapsed
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def benchmark(app_name='mysql', mix=None, concurrency=8, requests=2000, duration=None, warmup=5,
+              seed_items=1000, transport='http', limit=100, seed_value=0, backend='sqlite',
+              create_mode='direct'):
+    _, _, operations = APPS[app_name]
+    weights = parse_mix(mix or DEFAULT_MIXES[app_name], operations)
+
+    with tempfile.TemporaryDirectory(prefix='bench-') as workdir:
+        module, app = load_app(app_name, workdir, backend, create_mode)
+        ids = seed(app_name, module, app, seed_items)
+
+        server = None
+        if transport == 'http':
+            logging.getLogger('werkzeug').setLevel(logging.WARNING)
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            make_client = lambda: Client(host='127.0.0.1', port=server.server_port)
+        else:
+            make_client = lambda: Client(app=app)
+
+        try:
+            token = None
+            if app_name != 'mongo':
+                client = make_client()
+                client.request('POST', '/register', {"username": BENCH_USER, "password": BENCH_PASSWORD})
+                status, body = client.request('POST', '/login', {"username": BENCH_USER, "password": BENCH_PASSWORD})
+                client.close()
+                if status != 200:
+                    raise RuntimeError(f"Benchmark login failed with status {status}: {body}")
+                token = body['access_token']
+
+            workload = Workload(app_name, operations, weights, ids, token, limit)
+            results, elapsed = run_load(make_client, workload, concurrency, requests=requests, duration=duration,
+                                        warmup=warmup, seed_value=seed_value)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            # Writes out queued creates, then closes the pools
+            if app_name != 'mongo':
+                app.extensions['lifecycle'].shutdown()
+
+    return {
+        "app": app_name,
+        "backend": None if app_name == 'mongo' else backend,
+        "create_mode": None if app_name == 'mongo' else create_mode,
+        "transport": transport,
+        "mix": weights,
+        "concurrency": concurrency,
+        "requests": requests,
+        "duration": duration,
+        "seed_items": seed_items,
+        "elapsed_s": round(elapsed, 3),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def print_report(report, baseline=None):
+    backend = f" ({report['backend']} items)" if report.get('backend') else ''
+    print(f"{report['app']}{backend} via {report['transport']}, concurrency {report['concurrency']}, "
+          f"{report['elapsed_s']}s")
+    header = f"  {'operation':<14}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(header)
+    for name, row in report['results'].items():
+        line = (f"  {name:<14}{row['requests']:>9}{row['errors']:>8}{row['throughput'] or 0:>10.1f}"
+                f"{row['p50_ms'] or 0:>9.2f}{row['p95_ms'] or 0:>9.2f}{row['p99_ms'] or 0:>9.2f}")
+        old = (baseline or {}).get('results', {}).get(name)
+        if old and old.get('throughput') and old.get('p99_ms'):
+            line += (f"   req/s {(row['throughput'] / old['throughput'] - 1) * 100:+.1f}%"
+                     f"  p99 {(row['p99_ms'] / old['p99_ms'] - 1) * 100:+.1f}%")
+        print(line)
+
+
+# python -m common.bench_http --app mysql --concurrency 16 --requests 5000 --output results.json
+# python -m common.bench_http --app e2e --backend memory --transport wsgi
+# python -m common.bench_http --app mongo --mix get_all=1,add=1 --compare results.json
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test an app in-process against local stand-in databases")
+    parser.add_argument('--app', choices=sorted(APPS), default='mysql')
+    parser.add_argument('--backend', choices=BACKENDS, default='sqlite',
+                        help="item storage for the mysql/e2e apps; memory leaves only the HTTP layer")
+    parser.add_argument('--create-mode', choices=CREATE_MODES, default='direct',
+                        help="create_item write path for the mysql/e2e apps (async/strong use group commit)")
+    parser.add_argument('--mix', help="weighted operations, e.g. get_item=6,all_items=2,create_item=2,login=1")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000, help="total requests (ignored with --duration)")
+    parser.add_argument('--duration', type=float, default=None, help="run for this many seconds instead")
+    parser.add_argument('--warmup', type=int, default=5, help="untimed requests per client before starting")
+    parser.add_argument('--seed-items', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=100, help="page size for listing operations")
+    parser.add_argument('--transport', choices=['http', 'wsgi'], default='http',
+                        help="http: threaded server on 127.0.0.1; wsgi: call the app directly")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the request mix")
+    parser.add_argument('--output', help="write the JSON report here")
+    parser.add_argument('--compare', help="previous JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    try:
+        report = benchmark(args.app, args.mix, args.concurrency, None if args.duration else args.requests,
+                           args.duration, args.warmup, args.seed_items, args.transport, args.limit, args.seed,
+                           args.backend, args.create_mode)
+    except ValueError as e:
+        parser.error(str(e))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
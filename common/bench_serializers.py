@@ -0,0 +1,75 @@
+import argparse
+import json
+import timeit
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+
+from flask import Flask, jsonify
+from pydantic import BaseModel
+
+from common import serializers
+from common.serializers import ItemSerializer
+
+
+class ItemResponse(BaseModel):
+    id: int
+    name: str
+    description: str
+    price: float
+    created_at: Optional[str] = None
+
+
+class GetAllItems(BaseModel):
+    items: List[ItemResponse]
+
+
+def make_rows(count):
+    created_at = datetime(2025, 1, 1, 12, 0, 0)
+    return [(i, f"Item {i}", f"Description for item {i} " * 4, Decimal('19.99'), created_at, created_at)
+            for i in range(1, count + 1)]
+
+
+# The original endpoint code path: a model per row, a wrapper model, then jsonify
+def original(app, rows):
+    with app.app_context():
+        items = [ItemResponse(id=r[0], name=r[1], description=r[2], price=r[3], created_at=r[4].isoformat()) for r in rows]
+        return jsonify(GetAllItems(items=items).model_dump()).get_data()
+
+
+def raw_stdlib(rows):
+    return json.dumps({"items": [ItemSerializer.row_to_dict(r) for r in rows], "next_cursor": None}).encode('utf-8')
+
+
+def run(count, repeat, number):
+    rows = make_rows(count)
+    app = Flask(__name__)
+    cases = [
+        ("pydantic models + jsonify (original)", lambda: original(app, rows)),
+        ("ItemSerializer pydantic", lambda: ItemSerializer(ItemResponse, 'pydantic').dumps_page(rows)),
+        ("ItemSerializer adapter", lambda: ItemSerializer(ItemResponse, 'adapter').dumps_page(rows)),
+        ("raw tuples + stdlib json", lambda: raw_stdlib(rows)),
+    ]
+    if serializers.orjson is not None:
+        cases.append(("ItemSerializer raw (orjson)", lambda: ItemSerializer(ItemResponse, 'raw').dumps_page(rows)))
+
+    print(f"{count} rows, best of {repeat} x {number}")
+    baseline = None
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+        baseline = baseline or best
+        print(f"  {name:<40} {best * 1000:8.2f} ms  {count / best:12,.0f} rows/s  {baseline / best:5.1f}x")
+
+
+# python -m common.bench_serializers --rows 10000
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare item listing serialization paths")
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=3)
+    args = parser.parse_args(argv)
+    run(args.rows, args.repeat, args.number)
+
+
+if __name__ == '__main__':
+    main()
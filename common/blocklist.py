@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+
+STREAM_KEY = 'jwt:revocations'
+STREAM_MAXLEN = 100000
+SYNC_BATCH_SIZE = 1000
+
+
+# Revoked token ids (and per-user "revoke everything issued before" cutoffs),
+# kept in local dicts so the per-request check is a couple of O(1) lookups with
+# no I/O. Entries expire with the token they refer to. When a Redis client is
+# given, revocations are appended to a Redis stream and every worker tails that
+# stream on a background thread, so they reach all workers within `sync_interval`.
+class TokenBlocklist:
+    def __init__(self, redis_client=None, sync_interval=1.0, max_token_age=3600):
+        self.redis = redis_client
+        self.sync_interval = sync_interval
+        self.max_token_age = max_token_age
+        self._jtis = {}
+        self._users = {}
+        self._last_id = '0-0'
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.sync_errors = 0
+
+    def is_revoked(self, jti, username=None, issued_at=None):
+        self.ensure_started()
+        now = time.time()
+        expires_at = self._jtis.get(jti)
+        if expires_at is not None and expires_at > now:
+            return True
+        if username is not None and issued_at is not None:
+            cutoff = self._users.get(username)
+            if cutoff is not None and issued_at <= cutoff[0] and cutoff[1] > now:
+                return True
+        return False
+
+    # Revoke one token until it would have expired anyway
+    def revoke(self, jti, expires_at):
+        self._jtis[jti] = expires_at
+        self._publish({'jti': jti, 'exp': expires_at})
+
+    # Revoke every token issued to `username` up to now
+    def revoke_user(self, username):
+        cutoff = time.time()
+        expires_at = cutoff + self.max_token_age
+        self._users[username] = (cutoff, expires_at)
+        self._publish({'user': username, 'cutoff': cutoff, 'exp': expires_at})
+
+    def _publish(self, entry):
+        if self.redis is None:
+            return
+        try:
+            self.redis.xadd(STREAM_KEY, {k: str(v) for k, v in entry.items()}, maxlen=STREAM_MAXLEN, approximate=True)
+        except Exception:
+            self.sync_errors += 1
+
+    def _apply(self, fields):
+        fields = {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                  for k, v in fields.items()}
+        expires_at = float(fields['exp'])
+        if 'jti' in fields:
+            self._jtis[fields['jti']] = expires_at
+        elif 'user' in fields:
+            cutoff = float(fields['cutoff'])
+            current = self._users.get(fields['user'])
+            if current is None or current[0] < cutoff:
+                self._users[fields['user']] = (cutoff, expires_at)
+
+    # Read everything appended since the last sync, a batch at a time until a
+    # short batch shows the stream is drained (a new worker catches up on the
+    # whole stream before it answers its first check)
+    def sync(self):
+        if self.redis is None:
+            return
+        while True:
+            try:
+                response = self.redis.xread({STREAM_KEY: self._last_id}, count=SYNC_BATCH_SIZE)
+            except Exception:
+                self.sync_errors += 1
+                break
+            read = 0
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    self._apply(fields)
+                    self._last_id = entry_id
+                    read += 1
+            if read < SYNC_BATCH_SIZE:
+                break
+        self.purge()
+
+    def purge(self):
+        now = time.time()
+        for jti, expires_at in list(self._jtis.items()):
+            if expires_at <= now:
+                self._jtis.pop(jti, None)
+        for username, (_, expires_at) in list(self._users.items()):
+            if expires_at <= now:
+                self._users.pop(username, None)
+
+    # One sync thread per process, started on first use (and again after a fork).
+    # The pid is recorded only after the initial sync, so concurrent first
+    # checks wait for it instead of answering from an empty blocklist.
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._last_id = '0-0'
+            self._stop.clear()
+            if self.redis is not None:
+                self.sync()
+                threading.Thread(target=self._run, name='token-blocklist-sync', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "revoked_tokens": len(self._jtis),
+            "revoked_users": len(self._users),
+            "sync_interval": self.sync_interval,
+            "sync_errors": self.sync_errors,
+        }
+
+
+def make_blocklist(redis_url=None, sync_interval=1.0, max_token_age=3600):
+    client = None
+    if redis_url:
+        import redis
+        client = redis.Redis.from_url(redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+    return TokenBlocklist(client, sync_interval=sync_interval, max_token_age=max_token_age)
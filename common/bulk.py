@@ -0,0 +1,97 @@
+from pydantic import ValidationError
+
+from common.etag import collection_bump
+
+MAX_BULK_ITEMS = 10000
+# Rows per multi-row INSERT; keeps each statement well under max_allowed_packet
+INSERT_CHUNK_SIZE = 1000
+ID_CHUNK_SIZE = 1000
+
+
+def chunked(seq, size):
+    for start in range(0, len(seq), size):
+        yield seq[start:start + size]
+
+
+# Accept either a bare JSON array or {"items": [...]}; raises ValueError on anything else
+def bulk_payload(data, key='items'):
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list) or not data:
+        raise ValueError(f"Expected a non-empty JSON array (or {{\"{key}\": [...]}})")
+    if len(data) > MAX_BULK_ITEMS:
+        raise ValueError(f"At most {MAX_BULK_ITEMS} entries per request")
+    return data
+
+
+# Validate every entry, collecting errors by index instead of stopping at the first one
+def validate_rows(model, rows):
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            valid.append(model.model_validate(row))
+        except ValidationError as e:
+            errors.append({"index": index, "errors": e.errors()})
+    return valid, errors
+
+
+def parse_ids(rows):
+    ids = []
+    for index, value in enumerate(rows):
+        if isinstance(value, dict):
+            value = value.get('id')
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"Entry {index} is not an integer id")
+        ids.append(value)
+    return ids
+
+
+# Multi-row INSERTs; a multi-row "simple insert" gets a consecutive block of
+# AUTO_INCREMENT values starting at lastrowid, so no follow-up SELECT is needed
+def bulk_insert(cursor, items):
+    ids = []
+    for chunk in chunked(items, INSERT_CHUNK_SIZE):
+        cursor.executemany("INSERT INTO items (name, description, price) VALUES (%s, %s, %s)",
+                           [(item.name, item.description, item.price) for item in chunk])
+        first_id = cursor.lastrowid
+        ids.extend(range(first_id, first_id + len(chunk)))
+    if ids:
+        cursor.execute(*collection_bump())
+    return ids
+
+
+# The ids among `ids` that exist, mapped to their current price. FOR UPDATE
+# locks those rows until the caller's transaction ends, so the prices are
+# exactly the ones the following UPDATE or DELETE replaces.
+def existing_prices(cursor, ids):
+    found = {}
+    for chunk in chunked(list(set(ids)), ID_CHUNK_SIZE):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"SELECT id, price FROM items WHERE id IN ({placeholders}) FOR UPDATE", tuple(chunk))
+        found.update(cursor.fetchall())
+    return found
+
+
+def bulk_update(cursor, items):
+    found = existing_prices(cursor, [item.id for item in items])
+    params = [(item.name, item.description, item.price, item.id) for item in items if item.id in found]
+    if params:
+        cursor.executemany("UPDATE items SET name = %s, description = %s, price = %s, version = version + 1 "
+                           "WHERE id = %s", params)
+        cursor.execute(*collection_bump())
+    return found
+
+
+def bulk_delete(cursor, ids):
+    found = existing_prices(cursor, ids)
+    for chunk in chunked(list(found), ID_CHUNK_SIZE):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"DELETE FROM items WHERE id IN ({placeholders})", tuple(chunk))
+    if found:
+        cursor.execute(*collection_bump())
+    return found
+
+
+def row_results(ids, found, status):
+    return [{"index": index, "id": item_id, "status": status if item_id in found else "not_found"}
+            for index, item_id in enumerate(ids)]
@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+# Per-process LRU with a TTL per entry and a hard size bound
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Shared tier in Redis; values are stored as JSON. Redis being down only costs
+# a miss, it never fails the request.
+class RedisCache:
+    def __init__(self, client, prefix='cache:', ttl=300):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self.prefix + key)
+        except Exception:
+            self.errors += 1
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+        except Exception:
+            self.errors += 1
+
+    def delete(self, key):
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception:
+            self.errors += 1
+
+    def stats(self):
+        return {
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+# Read-through lookup: local LRU first, then Redis (promoting hits into the LRU)
+class TwoTierCache:
+    def __init__(self, local, remote=None):
+        self.local = local
+        self.remote = remote
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None or self.remote is None:
+            return value
+        value = self.remote.get(key)
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.remote is not None:
+            self.remote.set(key, value)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.remote is not None:
+            self.remote.delete(key)
+
+    def stats(self):
+        return {
+            "local": self.local.stats(),
+            "redis": self.remote.stats() if self.remote is not None else None,
+        }
+
+
+def make_item_cache(redis_url=None, maxsize=1024, ttl=60.0, redis_ttl=300):
+    remote = None
+    if redis_url:
+        import redis
+        client = redis.Redis.from_url(redis_url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        remote = RedisCache(client, prefix='item:', ttl=redis_ttl)
+    return TwoTierCache(LRUCache(maxsize=maxsize, ttl=ttl), remote)
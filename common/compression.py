@@ -0,0 +1,256 @@
+import zlib
+
+from flask import Response, g, request
+
+from common.cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Server preference when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+COMPRESSIBLE_TYPES = {'application/json', 'application/x-ndjson', 'text/plain', 'text/csv'}
+# Headers a cached body is replayed with (validators are added by the view)
+REPLAYED_HEADERS = ('Content-Type', 'Link')
+
+
+# {coding: q} from an Accept-Encoding header
+def parse_accept_encoding(header):
+    codings = {}
+    for part in (header or '').split(','):
+        coding, *params = [piece.strip() for piece in part.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding.lower()] = q
+    return codings
+
+
+# The coding to answer with, or None for identity
+def negotiate(header, available=ENCODINGS):
+    codings = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = codings.get(coding, codings.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        # wbits 31: zlib stream with a gzip header and trailer
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, quality):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+    def finish(self):
+        return self._obj.finish()
+
+
+def _encoded(chunk):
+    return chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+# Compress an iterable of str/bytes chunks as they come. The compressor is
+# flushed every `flush_size` input bytes so clients see data while a long
+# listing is still being read; `source` is closed when the output is.
+def compress_chunks(chunks, compressor, flush_size=65536, source=None):
+    pending = 0
+    try:
+        for chunk in chunks:
+            chunk = _encoded(chunk)
+            data = compressor.compress(chunk)
+            pending += len(chunk)
+            if pending >= flush_size:
+                data += compressor.flush()
+                pending = 0
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(source, 'close', None)
+        if close is not None:
+            close()
+
+
+# Content-negotiated gzip/brotli for JSON and NDJSON responses, including
+# streamed ones, which are compressed chunk by chunk instead of buffered.
+# Bodies under `min_size` bytes go out as they are; for a stream that means
+# reading up to `min_size` bytes before the headers are sent. Responses with a
+# strong ETag are left alone so the tag keeps naming the exact bytes, and so
+# are those marked Cache-Control: no-transform (e.g. progress streams that must
+# reach the client line by line).
+#
+# Views serving a collection snapshot can call cached_response() with its
+# ETag: an unchanged snapshot is answered from the compressed body stored on
+# the previous request. The view still takes a connection and runs the
+# fingerprint query to get that ETag; only the page read, serialization and
+# compression are skipped.
+class Compression:
+    def __init__(self, min_size=1024, level=6, brotli_quality=4, flush_size=65536, cache_size=32,
+                 cache_ttl=60.0, cache_max_bytes=1024 * 1024):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.flush_size = flush_size
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl) if cache_size else None
+        self.cache_max_bytes = cache_max_bytes
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+        return self
+
+    def compressor(self, encoding):
+        if encoding == 'br':
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.level)
+
+    # A response for the current request from the body cache, or None. On a
+    # miss the compressed body of this request's response is stored under `etag`.
+    def cached_response(self, etag):
+        if self.cache is None or etag is None:
+            return None
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return None
+        key = f"{request.path}:{etag}:{encoding}"
+        entry = self.cache.get(key)
+        if entry is None:
+            g.compression_cache_key = key
+            return None
+        body, headers = entry
+        response = Response(body, headers=headers)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def compress_response(self, response):
+        if (response.mimetype not in COMPRESSIBLE_TYPES or response.status_code != 200
+                or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.cache_control.no_transform):
+            return response
+        response.vary.add('Accept-Encoding')
+        etag, weak = response.get_etag()
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None or request.method == 'HEAD' or (etag and not weak):
+            self.skipped += 1
+            return response
+
+        if not response.is_streamed:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                self.skipped += 1
+                return response
+            compressor = self.compressor(encoding)
+            compressed = compressor.compress(body) + compressor.finish()
+            response.set_data(compressed)
+            response.headers['Content-Encoding'] = encoding
+            self._count(len(body), len(compressed))
+            self._remember(response, compressed)
+            return response
+
+        # Read just enough of the stream to know whether it clears the threshold
+        source = response.response
+        chunks = iter(source)
+        head, size = [], 0
+        for chunk in chunks:
+            chunk = _encoded(chunk)
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.min_size:
+                break
+        else:
+            response.set_data(b''.join(head))
+            self.skipped += 1
+            return response
+
+        def rest():
+            nonlocal size
+            yield from head
+            for chunk in chunks:
+                chunk = _encoded(chunk)
+                size += len(chunk)
+                yield chunk
+
+        # The generator runs after the request context is gone; take what it needs now
+        key = g.pop('compression_cache_key', None)
+        stream = compress_chunks(rest(), self.compressor(encoding), self.flush_size, source)
+        response.response = self._counted(stream, lambda: size, key, self._replayed(response))
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        return response
+
+    # Pass a compressed stream through, tallying sizes and keeping a copy for
+    # the body cache (under `key`) while it stays under cache_max_bytes
+    def _counted(self, stream, size_in, key, headers):
+        kept, size_out = [], 0
+        try:
+            for data in stream:
+                size_out += len(data)
+                if key is not None and size_out <= self.cache_max_bytes:
+                    kept.append(data)
+                yield data
+        finally:
+            stream.close()
+        self._count(size_in(), size_out)
+        if key is not None and size_out <= self.cache_max_bytes:
+            self.cache.set(key, (b''.join(kept), headers))
+
+    def _count(self, size_in, size_out):
+        self.compressed += 1
+        self.bytes_in += size_in
+        self.bytes_out += size_out
+
+    def _remember(self, response, body):
+        key = g.pop('compression_cache_key', None)
+        if key is not None and len(body) <= self.cache_max_bytes:
+            self.cache.set(key, (body, self._replayed(response)))
+
+    @staticmethod
+    def _replayed(response):
+        return [(name, response.headers[name]) for name in REPLAYED_HEADERS if name in response.headers]
+
+    def stats(self):
+        stats = {
+            "encodings": ','.join(ENCODINGS),
+            "compressed": self.compressed,
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+        if self.cache is not None:
+            cache = self.cache.stats()
+            stats.update(cache_size=cache['size'], cache_hits=cache['hits'], cache_misses=cache['misses'])
+        return stats
@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from common.bulk import INSERT_CHUNK_SIZE, validate_rows
+from common.repository import RepositoryError
+from common.serializers import ITEM_FIELDS
+
+CSV_BATCH_SIZE = 500
+# Per-line errors listed in an import's progress; past this they are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+# CSV text for `rows` (`SELECT * FROM items` tuples, e.g. a listing's stream)
+# with a header of `fields`, yielded every `batch_size` rows so memory stays
+# flat however long the export. Prices are written exactly, not as floats.
+def csv_chunks(rows, fields, batch_size=CSV_BATCH_SIZE):
+    positions = [ITEM_FIELDS[name][0] for name in fields]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    count = 0
+    try:
+        for row in rows:
+            writer.writerow([_cell(row[position]) for position in positions])
+            count += 1
+            if count % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        close = getattr(rows, 'close', None)
+        if close is not None:
+            close()
+
+
+# Stream-parse CSV from a binary `stream` whose header names at least the
+# required fields of `model` (columns that aren't model fields, e.g. an
+# export's id, are ignored). Returns a generator of (items, errors, line) per
+# `chunk_size` rows, where errors are {"line": ..., "errors": [...]} and line
+# is the last line read. The header is checked up front: ValueError if a
+# required column is missing.
+def read_csv_items(stream, model, chunk_size=INSERT_CHUNK_SIZE):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    header = reader.fieldnames or ()
+    missing = [name for name, field in model.model_fields.items() if field.is_required() and name not in header]
+    if missing:
+        raise ValueError(f"CSV header is missing: {', '.join(missing)}")
+
+    columns = [name for name in model.model_fields if name in header]
+
+    def chunks():
+        rows, lines = [], []
+        for row in reader:
+            rows.append({name: row[name] for name in columns})
+            lines.append(reader.line_num)
+            if len(rows) == chunk_size:
+                yield _validated(model, rows, lines)
+                rows, lines = [], []
+        if rows:
+            yield _validated(model, rows, lines)
+    return chunks()
+
+
+def _validated(model, rows, lines):
+    items, errors = validate_rows(model, rows)
+    errors = [{"line": lines[error['index']], "errors": error['errors']} for error in errors]
+    return items, errors, lines[-1]
+
+
+def _line(value, dumps):
+    return dumps(value) + '\n'
+
+
+# Load the chunks from read_csv_items with `create_many` (one batched insert per
+# chunk, committed as it goes), yielding an NDJSON progress line per chunk and
+# a final summary. Invalid rows are skipped and reported; a database or
+# decoding error stops the import, reporting how far it got.
+def import_progress(chunks, create_many, dumps=json.dumps):
+    imported = failed = reported = 0
+    line = 1
+    try:
+        for items, errors, line in chunks:
+            if items:
+                imported += len(create_many(items))
+            failed += len(errors)
+            shown = errors[:max(0, MAX_REPORTED_ERRORS - reported)]
+            reported += len(shown)
+            yield _line({"line": line, "imported": imported, "failed": failed, "errors": shown}, dumps)
+    except (RepositoryError, csv.Error, UnicodeDecodeError) as e:
+        yield _line({"done": False, "line": line, "imported": imported, "failed": failed, "error": str(e)}, dumps)
+        return
+    yield _line({"done": True, "imported": imported, "failed": failed}, dumps)
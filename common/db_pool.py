@@ -0,0 +1,220 @@
+import functools
+import os
+import threading
+import time
+import weakref
+
+import mysql.connector
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _reset_in_child(pool_ref):
+    pool = pool_ref()
+    if pool is not None:
+        pool._after_fork()
+
+
+class PooledConnection:
+    # Proxy around a raw connection; close() hands it back to the pool instead
+    # of tearing down the socket, so existing `conn.close()` call sites keep working.
+    def __init__(self, pool, conn, created_at, generation):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        self._generation = generation
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not self._returned:
+            self._returned = True
+            self._pool._release(self._conn, self._created_at, self._generation)
+
+
+class ConnectionPool:
+    def __init__(self, pool_size=5, max_overflow=10, timeout=30.0, recycle=3600.0,
+                 ping_interval=5.0, creator=None, **connect_kwargs):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.connect_kwargs = connect_kwargs
+        self._creator = creator or (lambda: mysql.connector.connect(**self.connect_kwargs))
+
+        self._cond = threading.Condition()
+        self._idle = []  # (conn, created_at, last_used), used as a LIFO stack
+        self._total = 0
+        self._in_use = 0
+        self._inherited = []
+        # Bumped by dispose(); connections checked out before that are closed on return
+        self._generation = 0
+
+        # A forked worker starts with an empty pool of its own (no fork on Windows)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=functools.partial(_reset_in_child, weakref.ref(self)))
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._ping_failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # Runs in the child right after a fork, while it has a single thread. The
+    # parent's connections share its sockets, so they are set aside unclosed
+    # (closing one would hang up the parent's session too), and the condition
+    # is replaced because another thread may have held its lock at fork time.
+    def _after_fork(self):
+        self._inherited.extend(conn for conn, _, _ in self._idle)
+        self._cond = threading.Condition()
+        self._idle = []
+        self._total = 0
+        self._in_use = 0
+
+    # Check out a connection, waiting up to `timeout` seconds when the pool and
+    # its overflow are exhausted
+    def get_connection(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        entry = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._total < self.pool_size + self.max_overflow:
+                    self._total += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No connection available within {self.timeout}s "
+                                      f"(in use: {self._in_use}, max: {self.pool_size + self.max_overflow})")
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._checkouts += 1
+            generation = self._generation
+            waited = time.monotonic() - start
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            conn, created_at = self._prepare(entry)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, conn, created_at, generation)
+
+    # Recycle connections that are too old and ping ones that sat idle for a while
+    def _prepare(self, entry):
+        if entry is None:
+            return self._connect()
+
+        conn, created_at, last_used = entry
+        now = time.monotonic()
+        if self.recycle is not None and now - created_at > self.recycle:
+            with self._cond:
+                self._recycled += 1
+            self._close_quietly(conn)
+            return self._connect()
+
+        if self.ping_interval is not None and now - last_used >= self.ping_interval:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._ping_failures += 1
+                self._close_quietly(conn)
+                return self._connect()
+
+        return conn, created_at
+
+    def _connect(self):
+        conn = self._creator()
+        with self._cond:
+            self._created += 1
+        return conn, time.monotonic()
+
+    def _release(self, conn, created_at, generation):
+        # Roll back anything left open so the next borrower doesn't inherit
+        # locks or a stale REPEATABLE READ snapshot
+        healthy = True
+        try:
+            if getattr(conn, 'in_transaction', False):
+                conn.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and generation == self._generation and len(self._idle) < self.pool_size:
+                self._idle.append((conn, created_at, time.monotonic()))
+                conn = None
+            else:
+                self._total -= 1
+            self._cond.notify()
+
+        if conn is not None:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # Close every idle connection (e.g. on shutdown); checked-out ones are closed on return
+    def dispose(self):
+        with self._cond:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    # Checked-out connections; a lock-free read, good enough for load balancing
+    @property
+    def in_use(self):
+        return self._in_use
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "total": self._total,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "recycled": self._recycled,
+                "ping_failures": self._ping_failures,
+                "wait_time_total": round(self._wait_total, 6),
+                "wait_time_max": round(self._wait_max, 6),
+                "wait_time_avg": round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+            }
@@ -0,0 +1,121 @@
+import hashlib
+import random
+import re
+from datetime import datetime, timezone
+
+from flask import Response, jsonify
+
+# Collection fingerprint in O(1): every item write bumps a change counter in
+# its own transaction, so the sum moves with any committed insert, update or
+# delete, whatever order they commit in; MAX(updated_at) is read off
+# idx_items_updated_at for Last-Modified. The counter is spread over a few
+# rows (item_changes, migration 7) so concurrent writers rarely wait on the
+# same row lock.
+COLLECTION_VERSION_SLOTS = 16
+COLLECTION_VERSION_QUERY = "SELECT (SELECT SUM(changes) FROM item_changes), MAX(updated_at) FROM items"
+BUMP_COLLECTION_VERSION = "UPDATE item_changes SET changes = changes + 1 WHERE slot = %s"
+
+
+# (sql, params) to run as the last statement of a transaction that changed items
+def collection_bump():
+    return BUMP_COLLECTION_VERSION, (random.randrange(COLLECTION_VERSION_SLOTS),)
+
+
+def _digest(*parts):
+    raw = ':'.join(str(part) for part in parts).encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def _version(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+# Strong, and just the row's version counter, so that If-Match turns straight
+# back into the `AND version = %s` of an optimistic UPDATE
+def item_etag(item_id, version):
+    return f"{item_id}-{version}"
+
+
+# The version an If-Match precondition requires of item `item_id`:
+#   (False, None) no If-Match, update unconditionally
+#   (True, None)  If-Match: *, any current version
+#   (True, n)     that version; 0 (never a real version) when no listed tag is
+#                 a strong ETag of this item, so the precondition simply fails
+def if_match_version(request, item_id):
+    if not request.headers.get('If-Match'):
+        return False, None
+    if request.if_match.star_tag:
+        return True, None
+    pattern = re.compile(rf"{item_id}-(\d+)")
+    for tag in request.if_match.as_set():
+        match = pattern.fullmatch(tag)
+        if match:
+            return True, int(match.group(1))
+    return True, 0
+
+
+# `variant` distinguishes representations of the same snapshot (page, limit, stream mode, ...)
+# `changes` is the change counter (a row count for backends without one)
+def collection_etag(changes, max_version, variant=''):
+    return _digest('items', changes, _version(max_version), variant)
+
+
+# TIMESTAMP columns come back naive; the server is expected to run in UTC
+def http_datetime(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+# If-None-Match wins over If-Modified-Since when both are sent (RFC 9110 13.2.2)
+def is_not_modified(request, etag, last_modified=None):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return http_datetime(last_modified) <= request.if_modified_since
+    return False
+
+
+def add_validators(response, etag, last_modified=None, weak=True):
+    response.set_etag(etag, weak=weak)
+    if last_modified is not None:
+        response.last_modified = http_datetime(last_modified)
+    return response
+
+
+def not_modified(etag, last_modified=None, weak=True):
+    return add_validators(Response(status=304), etag, last_modified, weak)
+
+
+# Run the fingerprint query on `conn`. With autocommit off this also opens the
+# REPEATABLE READ snapshot, so the page read next on the same connection
+# matches the ETag exactly.
+def collection_validators(conn, variant=''):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(COLLECTION_VERSION_QUERY)
+        changes, max_version = cursor.fetchone()
+    finally:
+        cursor.close()
+    return collection_etag(changes, max_version, variant), max_version
+
+
+# Single items are cached together with their validators, so a matching
+# conditional GET is answered from the cache without touching MySQL
+def item_cache_entry(item_data, item_id, updated_at, version):
+    return {
+        "item": item_data,
+        "etag": item_etag(item_id, version),
+        "last_modified": updated_at.isoformat() if updated_at is not None else None,
+    }
+
+
+# `fields` limits the body to those keys (a ?fields= projection)
+def item_entry_response(request, entry, fields=None):
+    last_modified = datetime.fromisoformat(entry['last_modified']) if entry['last_modified'] else None
+    if is_not_modified(request, entry['etag'], last_modified):
+        return not_modified(entry['etag'], last_modified, weak=False)
+    item = entry['item'] if fields is None else {name: entry['item'][name] for name in fields}
+    return add_validators(jsonify(item), entry['etag'], last_modified, weak=False)
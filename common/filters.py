@@ -0,0 +1,206 @@
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from common.pagination import decode_cursor_state, encode_cursor
+
+# Item rows are tuples in `SELECT * FROM items` order, whatever the backend:
+ITEM_COLUMNS = ('id', 'name', 'description', 'price', 'created_at', 'updated_at', 'version')
+
+# Sortable columns -> position in `SELECT * FROM items`. Every one is backed by
+# an index whose InnoDB key is (column, id), which is exactly the keyset order:
+# PRIMARY, idx_items_name, idx_items_created_at and idx_items_price_id.
+SORT_COLUMNS = {'id': 0, 'name': 1, 'price': 3, 'created_at': 4}
+
+# query parameter -> (column, operator)
+FILTERS = {
+    'name_prefix': ('name', 'LIKE'),
+    'min_price': ('price', '>='),
+    'max_price': ('price', '<='),
+    'created_after': ('created_at', '>='),
+    'created_before': ('created_at', '<'),
+}
+
+# Above this many rows a filter that can't ride the sort index is refused
+LARGE_TABLE_ROWS = 50000
+TABLE_ESTIMATE_TTL = 60.0
+_table_estimate = {'rows': None, 'at': 0.0}
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _parse_value(column, raw):
+    try:
+        if column == 'price':
+            value = Decimal(raw)
+            if not value.is_finite():
+                raise InvalidOperation
+            return value
+        if column == 'created_at':
+            return datetime.fromisoformat(raw)
+        if column == 'id':
+            return int(raw)
+        return str(raw)
+    except (InvalidOperation, ValueError, TypeError):
+        raise ValueError(f"Invalid value for {column}: {raw!r}")
+
+
+def _cursor_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+# Filtered, sorted keyset query over items. Sorting is always (column, id) so
+# that pages are stable even when the sort column has duplicates.
+class ItemQuery:
+    def __init__(self, sort='id', descending=False, filters=None, after=None):
+        self.sort = sort
+        self.descending = descending
+        self.filters = filters or []
+        self.after = after
+        self.columns = None
+
+    @classmethod
+    def from_args(cls, args):
+        filters = []
+        for param, (column, op) in FILTERS.items():
+            raw = args.get(param)
+            if raw is None or raw == '':
+                continue
+            if op == 'LIKE':
+                filters.append((column, op, _escape_like(raw) + '%'))
+            else:
+                filters.append((column, op, _parse_value(column, raw)))
+
+        sort = args.get('sort')
+        if sort:
+            descending = sort.startswith('-')
+            sort = sort.lstrip('-')
+            if sort not in SORT_COLUMNS:
+                raise ValueError(f"sort must be one of {', '.join(SORT_COLUMNS)} (prefix with - for descending)")
+        else:
+            # Default to the only filtered column so the filter can use its index
+            columns = {column for column, _, _ in filters}
+            sort = columns.pop() if len(columns) == 1 else 'id'
+            descending = False
+
+        query = cls(sort, descending, filters)
+        if args.get('after'):
+            last_id, key, cursor_sort = decode_cursor_state(args['after'])
+            if (cursor_sort or 'id') != query.sort_spec:
+                raise ValueError("Cursor does not match the requested sort")
+            query.after = (last_id, _parse_value(sort, key) if sort != 'id' else last_id)
+        return query
+
+    # Only read `fields` (plus id and the sort column, which cursors are made of).
+    # Rows keep their SELECT * shape with NULL in the other columns, so a TEXT
+    # column nobody asked for never leaves the server.
+    def select(self, fields):
+        self.columns = None if fields is None else set(fields) | {'id', self.sort}
+        return self
+
+    def _select_list(self):
+        if self.columns is None:
+            return '*'
+        return ', '.join(column if column in self.columns else f"NULL AS {column}" for column in ITEM_COLUMNS)
+
+    @property
+    def sort_spec(self):
+        return ('-' if self.descending else '') + self.sort
+
+    # Filters on a column other than the sort column can't be answered by the
+    # sort index; on a big table they may walk all of it to fill a page
+    def residual_columns(self):
+        return sorted({column for column, _, _ in self.filters if column != self.sort})
+
+    def ensure_indexed(self, conn, large_table_rows=None):
+        if self.residual_columns():
+            self.check_table_rows(estimate_table_rows(conn), large_table_rows)
+
+    def check_table_rows(self, table_rows, large_table_rows=None):
+        residual = self.residual_columns()
+        if residual and table_rows > (large_table_rows or LARGE_TABLE_ROWS):
+            raise ValueError(f"Filtering on {', '.join(residual)} while sorting by {self.sort} would scan the "
+                             f"whole table; sort by the filtered column instead")
+
+    def _where(self):
+        clauses, params = [], []
+        if self.sort != 'id':
+            clauses.append(f"{self.sort} IS NOT NULL")
+        for column, op, value in self.filters:
+            clauses.append(f"{column} {op} %s")
+            params.append(value)
+        if self.after is not None:
+            last_id, key = self.after
+            op = '<' if self.descending else '>'
+            if self.sort == 'id':
+                clauses.append(f"id {op} %s")
+                params.append(last_id)
+            else:
+                clauses.append(f"({self.sort} {op} %s OR ({self.sort} = %s AND id {op} %s))")
+                params.extend([key, key, last_id])
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return where, params
+
+    def _order_by(self):
+        direction = ' DESC' if self.descending else ''
+        if self.sort == 'id':
+            return f" ORDER BY id{direction}"
+        return f" ORDER BY {self.sort}{direction}, id{direction}"
+
+    # Fetches one extra row to know whether there is a next page
+    def page_sql(self, limit):
+        where, params = self._where()
+        sql = f"SELECT {self._select_list()} FROM items{where}{self._order_by()} LIMIT %s"
+        return sql, tuple(params) + (limit + 1,)
+
+    def stream_sql(self):
+        where, params = self._where()
+        return f"SELECT {self._select_list()} FROM items{where}{self._order_by()}", tuple(params)
+
+    def cursor_for(self, row):
+        if self.sort == 'id':
+            return encode_cursor(row[0])
+        return encode_cursor(row[0], _cursor_value(row[SORT_COLUMNS[self.sort]]), self.sort_spec)
+
+    # Split a limit+1 result into (page, next_cursor)
+    def split_page(self, rows, limit):
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, self.cursor_for(rows[-1])
+        return rows, None
+
+
+TABLE_ESTIMATE_QUERY = ("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'items'")
+
+
+# Cached estimate, or None when it is missing or older than TABLE_ESTIMATE_TTL
+def cached_table_estimate():
+    if _table_estimate['rows'] is None or time.monotonic() - _table_estimate['at'] > TABLE_ESTIMATE_TTL:
+        return None
+    return _table_estimate['rows']
+
+
+def store_table_estimate(row):
+    _table_estimate['rows'] = int(row[0] or 0) if row else 0
+    _table_estimate['at'] = time.monotonic()
+    return _table_estimate['rows']
+
+
+# information_schema's TABLE_ROWS is an estimate, but it's free; cached per process
+def estimate_table_rows(conn):
+    rows = cached_table_estimate()
+    if rows is None:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(TABLE_ESTIMATE_QUERY)
+            rows = store_table_estimate(cursor.fetchone())
+        finally:
+            cursor.close()
+    return rows
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import bcrypt
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_WERKZEUG_METHOD = 'scrypt:32768:8:1'
+DEFAULT_BCRYPT_ROUNDS = 12
+
+
+class HasherBusy(Exception):
+    pass
+
+
+# Worker-side functions; kept at module level so they can be pickled into the process pool
+def _werkzeug_hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _werkzeug_check(hashed, password):
+    return check_password_hash(hashed, password)
+
+
+def _bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _bcrypt_check(hashed, password):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+# A werkzeug method string with werkzeug's defaults filled in, so 'pbkdf2:sha256'
+# compares equal to the 'pbkdf2:sha256:<default iterations>' it writes into hashes
+def _werkzeug_params(method):
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        return (name, *(map(int, args) if args else (2**15, 8, 1)))
+    if name == 'pbkdf2':
+        return (name, args[0] if args else 'sha256', int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS)
+    return (name, *args)
+
+
+# Runs password hashing in a small process pool so CPU-heavy KDFs don't hold
+# request threads (or the GIL). Only `workers + max_pending` calls may be in
+# flight; beyond that HasherBusy is raised so the caller can answer 503.
+class PasswordHasher:
+    def __init__(self, scheme='werkzeug', method=DEFAULT_WERKZEUG_METHOD, rounds=DEFAULT_BCRYPT_ROUNDS,
+                 workers=2, max_pending=32, timeout=10.0):
+        if scheme not in ('werkzeug', 'bcrypt'):
+            raise ValueError(f"Unknown hashing scheme: {scheme}")
+        self.scheme = scheme
+        self.method = method
+        self._params = _werkzeug_params(method) if scheme == 'werkzeug' else None
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    # The pool is created on first use and again after a fork, never shared across processes
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    # Reserve a slot and start `fn`; the slot is freed when the work finishes,
+    # even if the caller stopped waiting for it
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Password hashing queue is full")
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            if self.workers == 0:
+                future = Future()
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        return self._submit(fn, *args).result(timeout=self.timeout)
+
+    async def _run_async(self, fn, *args):
+        return await asyncio.wait_for(asyncio.wrap_future(self._submit(fn, *args)), self.timeout)
+
+    def _job(self, password, hashed=None):
+        if self.scheme == 'bcrypt':
+            return (_bcrypt_hash, password, self.rounds) if hashed is None else (_bcrypt_check, hashed, password)
+        return (_werkzeug_hash, password, self.method) if hashed is None else (_werkzeug_check, hashed, password)
+
+    def hash(self, password):
+        return self._run(*self._job(password))
+
+    def verify(self, hashed, password):
+        return self._run(*self._job(password, hashed))
+
+    # Awaitable variants for asyncio apps; the event loop never blocks on the KDF
+    async def hash_async(self, password):
+        return await self._run_async(*self._job(password))
+
+    async def verify_async(self, hashed, password):
+        return await self._run_async(*self._job(password, hashed))
+
+    # True when a stored hash was made with a different cost than the one configured now
+    def needs_rehash(self, hashed):
+        if self.scheme == 'bcrypt':
+            try:
+                return int(hashed.split('$')[2]) != self.rounds
+            except (IndexError, ValueError):
+                return True
+        try:
+            return _werkzeug_params(hashed.split('$', 1)[0]) != self._params
+        except ValueError:
+            return True
+
+    # New hash for a just-verified password when the cost changed; best effort, so
+    # a saturated pool never turns a successful login into a 503
+    def rehash_if_needed(self, hashed, password):
+        if not self.needs_rehash(hashed):
+            return None
+        try:
+            return self.hash(password)
+        except HasherBusy:
+            return None
+
+    async def rehash_if_needed_async(self, hashed, password):
+        if not self.needs_rehash(hashed):
+            return None
+        try:
+            return await self.hash_async(password)
+        except HasherBusy:
+            return None
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "scheme": self.scheme,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
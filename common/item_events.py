@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from common.repository import ItemRepository
+
+CHANNEL = 'items:events'
+
+
+# Item change events over Redis pub/sub, so a write on one node evicts the
+# item from every other worker's local cache instead of waiting out its TTL.
+# Each write publishes {"node", "seq", "op", "id", "version"} on `channel`; a
+# background thread per worker subscribes and drops the item from `cache`
+# (the local tier; the writer already deleted the shared Redis copy).
+#
+# Pub/sub delivers at most once, so losses are detected rather than prevented:
+# every publishing process numbers its events, and a gap in a node's numbers
+# (including one left by a publish that failed) flushes the whole local cache.
+# So does every (re)subscription, since anything published while the
+# subscriber was away is gone.
+#
+# Listeners (add_listener) get every event, this worker's own included, as a
+# dict from the subscriber thread, and None whenever events may have been lost.
+# Without Redis they are called directly from publish().
+class ItemEvents:
+    def __init__(self, redis_client=None, cache=None, channel=CHANNEL, poll_interval=1.0, retry_interval=1.0,
+                 node_ttl=3600.0):
+        self.redis = redis_client
+        self.cache = cache
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.node_ttl = node_ttl
+        self.node = None
+        self._seq = 0
+        self._nodes = {}
+        self._listeners = []
+        self._pruned_at = time.monotonic()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self.published = 0
+        self.publish_errors = 0
+        self.received = 0
+        self.evicted = 0
+        self.missed = 0
+        self.flushes = 0
+        self.subscribe_errors = 0
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, event):
+        for callback in self._listeners:
+            callback(event)
+
+    # Announce writes to `ids` (one event each, one round trip). `version` is
+    # the items' new version where the caller knows it.
+    def publish(self, op, ids, version=None):
+        self.ensure_started()
+        if not ids:
+            return
+        if self.redis is None:
+            for item_id in ids:
+                self._notify({"node": self.node, "op": op, "id": item_id, "version": version})
+            return
+        with self._lock:
+            first = self._seq + 1
+            self._seq += len(ids)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for seq, item_id in enumerate(ids, first):
+                pipe.publish(self.channel, json.dumps(
+                    {"node": self.node, "seq": seq, "op": op, "id": item_id, "version": version},
+                    separators=(',', ':')))
+            pipe.execute()
+            self.published += len(ids)
+        except Exception:
+            # The numbers stay used: subscribers see the gap and flush
+            self.publish_errors += 1
+            self._notify(None)
+
+    # Apply one event payload; returns False if it was malformed
+    def apply(self, data):
+        try:
+            event = json.loads(data)
+            node, seq, item_id = event['node'], int(event['seq']), event['id']
+        except (ValueError, TypeError, KeyError):
+            return False
+        self.received += 1
+        if node != self.node:
+            now = time.monotonic()
+            last = self._nodes.get(node)
+            self._nodes[node] = (max(seq, last[0]) if last else seq, now)
+            if last is not None and seq > last[0] + 1:
+                self.missed += seq - last[0] - 1
+                self.flush()
+            elif self.cache is not None and event.get('op') != 'create':
+                self.cache.delete(str(item_id))
+                self.evicted += 1
+            self._prune(now)
+        self._notify(event)
+        return True
+
+    # Forget nodes that have gone quiet (restarted workers never come back)
+    def _prune(self, now):
+        if now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        for node, (_, seen_at) in list(self._nodes.items()):
+            if now - seen_at > self.node_ttl:
+                del self._nodes[node]
+
+    def flush(self):
+        if self.cache is not None:
+            self.cache.clear()
+        self.flushes += 1
+        self._notify(None)
+
+    def _receive(self, message):
+        if message['type'] == 'subscribe':
+            self.flush()
+        elif message['type'] == 'message':
+            self.apply(message['data'])
+
+    def _run(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub()
+                pubsub.subscribe(self.channel)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=self.poll_interval)
+                    if message is not None:
+                        self._receive(message)
+            except Exception:
+                self.subscribe_errors += 1
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            self._stop.wait(self.retry_interval)
+
+    # One subscriber thread per process, started on first use (and again after
+    # a fork, with a fresh node id so the parent's numbering isn't continued)
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.node = uuid.uuid4().hex[:12]
+            self._seq = 0
+            self._nodes = {}
+            self._stop.clear()
+            if self.redis is not None and (self.cache is not None or self._listeners):
+                threading.Thread(target=self._run, name='item-events', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "publish_errors": self.publish_errors,
+            "received": self.received,
+            "evicted": self.evicted,
+            "missed": self.missed,
+            "flushes": self.flushes,
+            "subscribe_errors": self.subscribe_errors,
+            "nodes": len(self._nodes),
+        }
+
+
+# ItemRepository that publishes an event for every successful write through it
+class EventsRepository(ItemRepository):
+    def __init__(self, repository, events):
+        self.repository = repository
+        self.events = events
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+    def create(self, name, description, price):
+        item_id = self.repository.create(name, description, price)
+        self.events.publish('create', [item_id], version=1)
+        return item_id
+
+    def get(self, item_id, primary=False):
+        return self.repository.get(item_id, primary=primary)
+
+    def update(self, item_id, name, description, price, version=None):
+        updated = self.repository.update(item_id, name, description, price, version=version)
+        if updated:
+            self.events.publish('update', [item_id], version=version + 1 if version is not None else None)
+        return updated
+
+    def delete(self, item_id):
+        deleted = self.repository.delete(item_id)
+        if deleted:
+            self.events.publish('delete', [item_id])
+        return deleted
+
+    def create_many(self, items):
+        ids = self.repository.create_many(items)
+        self.events.publish('create', ids, version=1)
+        return ids
+
+    def update_many(self, items):
+        found = self.repository.update_many(items)
+        self.events.publish('update', list(found))
+        return found
+
+    def delete_many(self, ids):
+        found = self.repository.delete_many(ids)
+        self.events.publish('delete', list(found))
+        return found
+
+    def listing(self, query, variant=''):
+        return self.repository.listing(query, variant)
+
+
+def make_item_events(redis_url=None, cache=None):
+    client = None
+    if redis_url:
+        import redis
+        client = redis.Redis.from_url(redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+    return ItemEvents(client, cache)
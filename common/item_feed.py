@@ -0,0 +1,184 @@
+import json
+import os
+import queue
+import threading
+import uuid
+from collections import deque
+
+
+# Server-Sent Events feed of item changes. ItemEvents calls notify() with each
+# change event its one Redis subscription receives; the feed numbers them,
+# keeps the last `buffer_size` for replay and copies each into every connected
+# client's queue, so a thousand dashboards cost one subscription, not a
+# thousand polls.
+#
+# Event ids are "<stream>-<n>", where the stream id is fresh in every worker
+# process. A client reconnecting with Last-Event-ID gets what it missed from
+# the buffer; if the id is from another worker or has scrolled out of the
+# buffer (or events were lost upstream since), it gets a `reset` event instead
+# and should reload the collection before applying deltas.
+#
+# A client that falls `queue_size` events behind is disconnected once its
+# queue drains; EventSource reconnects and resumes from the buffer.
+class ItemFeed:
+    def __init__(self, buffer_size=1000, queue_size=256, max_clients=1000, heartbeat=15.0, retry_ms=3000):
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self._lock = threading.Lock()
+        self._pid = None
+        self._clients = set()
+        self.closed = False
+        self.delivered = 0
+        self.overflows = 0
+        self.rejected = 0
+        self.resets = 0
+        self._check_fork()
+
+    # Numbering and buffer belong to one process; a forked worker starts over
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.stream = uuid.uuid4().hex[:8]
+        self._buffer = deque(maxlen=self.buffer_size)
+        self._next = 1
+        self._reset_at = 1
+        self._clients = set()
+
+    # ItemEvents listener: an event dict, or None when events may have been lost
+    def notify(self, event):
+        with self._lock:
+            self._check_fork()
+            if event is None:
+                # Entries are (n, event); a None event tells clients to reload
+                self._reset_at = self._next
+                self.resets += 1
+                entry = (self._next - 1, None)
+            else:
+                entry = (self._next, {"id": event['id'], "op": event['op'], "version": event.get('version')})
+                self._next += 1
+                self._buffer.append(entry)
+            for client in list(self._clients):
+                client.put(entry)
+
+    def _parse_id(self, last_event_id):
+        stream, _, n = (last_event_id or '').partition('-')
+        if stream != self.stream or not n.isdigit():
+            return None
+        return int(n)
+
+    # A subscription for a new connection, or None if max_clients are connected
+    # (or the feed is closed)
+    def subscribe(self, last_event_id=None):
+        with self._lock:
+            self._check_fork()
+            if self.closed or len(self._clients) >= self.max_clients:
+                self.rejected += 1
+                return None
+            backlog, reset = [], False
+            if last_event_id:
+                n = self._parse_id(last_event_id)
+                oldest = self._buffer[0][0] if self._buffer else self._next
+                if n is None or n < oldest - 1 or n < self._reset_at or n >= self._next:
+                    reset = True
+                else:
+                    backlog = [entry for entry in self._buffer if entry[0] > n]
+            client = FeedSubscription(self, backlog, reset)
+            self._clients.add(client)
+            return client
+
+    # End every stream after what is already queued (a worker shutting down);
+    # clients reconnect to another worker
+    def close_all(self):
+        with self._lock:
+            self.closed = True
+            clients, self._clients = self._clients, set()
+        for client in clients:
+            client.end()
+
+    def _unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def format(self, entry):
+        n, event = entry
+        if event is None:
+            return f"id: {self.stream}-{n}\nevent: reset\ndata: {{}}\n\n"
+        return f"id: {self.stream}-{n}\nevent: {event['op']}\ndata: {json.dumps(event)}\n\n"
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "buffered": len(self._buffer),
+                "backlog": max((client.backlog() for client in self._clients), default=0),
+                "delivered": self.delivered,
+                "overflows": self.overflows,
+                "rejected": self.rejected,
+                "resets": self.resets,
+            }
+
+
+# One connected client: replayed backlog first, then live events as SSE text
+class FeedSubscription:
+    def __init__(self, feed, backlog, reset):
+        self.feed = feed
+        self.ended = False
+        self._queue = queue.Queue(maxsize=feed.queue_size)
+        self._pending = deque([f"retry: {feed.retry_ms}\n\n"])
+        if reset:
+            self._pending.append(feed.format((feed._next - 1, None)))
+        self._pending.extend(feed.format(entry) for entry in backlog)
+
+    def put(self, entry):
+        if self.ended:
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.ended = True
+            self.feed.overflows += 1
+            self.feed._clients.discard(self)
+
+    # Stop after the queued events; the None wakes a reader waiting on an empty queue
+    def end(self):
+        self.ended = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def backlog(self):
+        return self._queue.qsize()
+
+    # The next chunk to send: an event, a keepalive comment after `heartbeat`
+    # quiet seconds, or None once an ended stream has drained its queue
+    def next_chunk(self):
+        if self._pending:
+            return self._pending.popleft()
+        try:
+            entry = self._queue.get(block=not self.ended, timeout=self.feed.heartbeat)
+        except queue.Empty:
+            entry = None
+            if not self.ended:
+                return ": keepalive\n\n"
+        if entry is None:
+            return None
+        self.feed.delivered += 1
+        return self.feed.format(entry)
+
+    def chunks(self):
+        try:
+            while True:
+                chunk = self.next_chunk()
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        self.feed._unsubscribe(self)
@@ -0,0 +1,322 @@
+import atexit
+import math
+import os
+import threading
+import time
+from decimal import Decimal
+
+from common.filters import ItemQuery
+from common.repository import ItemRepository
+
+DEFAULT_PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+# Log-bucketed histogram (DDSketch style): every value lands in the bucket
+# whose bounds are within `relative_accuracy` of it, so any quantile read back
+# is that close to the true one. Unlike most sketches, counts can be taken back
+# out, which is what updates and deletes need. Prices are >= 0; zero has its
+# own bucket.
+class PriceSketch:
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _key(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        value = float(value)
+        self.count += count
+        if value <= 0:
+            self.zeros += count
+            return
+        key = self._key(value)
+        self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def remove(self, value):
+        value = float(value)
+        if value <= 0:
+            if self.zeros:
+                self.zeros -= 1
+                self.count -= 1
+            return
+        key = self._key(value)
+        remaining = self.buckets.get(key, 0) - 1
+        if remaining < 0:
+            return
+        self.count -= 1
+        if remaining:
+            self.buckets[key] = remaining
+        else:
+            del self.buckets[key]
+
+    # Nearest-rank quantile: the smallest value with at least q of all values at or below it
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = max(0, math.ceil(q * self.count) - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.buckets))
+
+    def lowest(self):
+        if self.zeros:
+            return 0.0
+        return self._value(min(self.buckets)) if self.buckets else None
+
+    def highest(self):
+        if self.buckets:
+            return self._value(max(self.buckets))
+        return 0.0 if self.zeros else None
+
+
+# Price statistics kept up to date in process: item writes call add/remove/
+# replace (see StatsRepository), reads are answered from the running totals.
+# Count and sum are exact; min and max are exact until the current extreme is
+# removed, and then come from the sketch until the next reconciliation;
+# percentiles come from the sketch.
+#
+# Each worker only sees its own writes, and a write racing a reconciliation
+# can be counted twice or not at all, so a background thread rebuilds
+# everything from the table every `reconcile_interval` seconds.
+class ItemStats:
+    def __init__(self, repository=None, reconcile_interval=300.0, relative_accuracy=0.01,
+                 percentiles=DEFAULT_PERCENTILES):
+        self.repository = repository
+        self.reconcile_interval = reconcile_interval
+        self.relative_accuracy = relative_accuracy
+        self.percentiles = percentiles
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._snapshot = None
+        self._reset()
+
+        self.reconciliations = 0
+        self.reconcile_errors = 0
+        self.reconciled_at = None
+        self.last_drift = None
+
+    def _reset(self):
+        self.count = 0
+        self.sum = Decimal('0')
+        self.min = None
+        self.max = None
+        self.min_exact = True
+        self.max_exact = True
+        self.sketch = PriceSketch(self.relative_accuracy)
+
+    def add(self, price):
+        price = _decimal(price)
+        with self._lock:
+            self.count += 1
+            self.sum += price
+            # Past a removed extreme the true one can only be further in, so a
+            # new value beyond it is exact again
+            if self.min is None or price <= self.min:
+                self.min, self.min_exact = price, True
+            if self.max is None or price >= self.max:
+                self.max, self.max_exact = price, True
+            self.sketch.add(price)
+            self._snapshot = None
+
+    def remove(self, price):
+        price = _decimal(price)
+        with self._lock:
+            if not self.count:
+                return
+            self.count -= 1
+            self.sum -= price
+            self.sketch.remove(price)
+            if not self.count:
+                self._reset()
+            else:
+                if price == self.min:
+                    self.min_exact = False
+                if price == self.max:
+                    self.max_exact = False
+            self._snapshot = None
+
+    def replace(self, old_price, new_price):
+        self.remove(old_price)
+        self.add(new_price)
+
+    def _rebuild(self):
+        count, total, low, high = 0, Decimal('0'), None, None
+        sketch = PriceSketch(self.relative_accuracy)
+        with self.repository.listing(ItemQuery().select(('price',))) as listing:
+            for row in listing.stream():
+                price = row[3]
+                if price is None:
+                    continue
+                price = _decimal(price)
+                count += 1
+                total += price
+                low = price if low is None or price < low else low
+                high = price if high is None or price > high else high
+                sketch.add(price)
+        return count, total, low, high, sketch
+
+    # Recompute everything from the table; returns False if that failed
+    def reconcile(self):
+        try:
+            count, total, low, high, sketch = self._rebuild()
+        except Exception:
+            self.reconcile_errors += 1
+            return False
+        with self._lock:
+            self.last_drift = self.count - count if self._loaded.is_set() else 0
+            self.count, self.sum, self.min, self.max, self.sketch = count, total, low, high, sketch
+            self.min_exact = self.max_exact = True
+            self._snapshot = None
+            self.reconciliations += 1
+            self.reconciled_at = time.time()
+        self._loaded.set()
+        return True
+
+    def _run(self):
+        while not self._closed:
+            self.reconcile()
+            self._wakeup.wait(self.reconcile_interval)
+            self._wakeup.clear()
+
+    # The reconciler starts on first use and again after a fork
+    def _ensure_thread(self):
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is not None and self._pid == os.getpid():
+                    return
+                if self._pid is not None and self._pid != os.getpid():
+                    self._loaded.clear()
+                if self._thread is None:
+                    atexit.register(self.close)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='item-stats', daemon=True)
+                self._thread.start()
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+
+    # Percentiles are clamped to [min, max]: a bucket's representative value can
+    # lie past the exact extreme in the same bucket
+    def _compute(self):
+        average = self.sum / self.count if self.count else None
+        low = float(self.min) if self.min_exact and self.min is not None else self.sketch.lowest()
+        high = float(self.max) if self.max_exact and self.max is not None else self.sketch.highest()
+        percentiles = {}
+        for q in self.percentiles:
+            value = self.sketch.quantile(q)
+            percentiles[f"p{q * 100:g}"] = min(max(value, low), high) if value is not None else None
+        return {
+            "count": self.count,
+            "sum": float(self.sum),
+            "min": low,
+            "max": high,
+            "avg": round(float(average), 4) if average is not None else None,
+            "percentiles": percentiles,
+            "relative_accuracy": self.relative_accuracy,
+        }
+
+    # The current statistics, or None if the first load hasn't finished within
+    # `timeout` seconds. Percentiles are recomputed only after a write.
+    def snapshot(self, timeout=5.0):
+        self._ensure_thread()
+        if not self._loaded.wait(timeout):
+            return None
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._compute()
+            return dict(self._snapshot, reconciled_at=self.reconciled_at)
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "reconciliations": self.reconciliations,
+            "reconcile_errors": self.reconcile_errors,
+            "last_drift": self.last_drift or 0,
+        }
+
+
+# ItemRepository that keeps an ItemStats current as writes go through it. The
+# old prices come from the writes themselves (each write reports the prices it
+# replaced), so every change is applied as an exact delta.
+class StatsRepository(ItemRepository):
+    def __init__(self, repository, stats):
+        self.repository = repository
+        self.stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+    def _replace(self, old_price, new_price):
+        if old_price is None:
+            self.stats.add(new_price)
+        else:
+            self.stats.replace(old_price, new_price)
+
+    def create(self, name, description, price):
+        item_id = self.repository.create(name, description, price)
+        self.stats.add(price)
+        return item_id
+
+    def get(self, item_id, primary=False):
+        return self.repository.get(item_id, primary=primary)
+
+    def update(self, item_id, name, description, price, version=None):
+        found = self.repository.update(item_id, name, description, price, version=version)
+        for old_price in found.values():
+            self._replace(old_price, price)
+        return found
+
+    def delete(self, item_id):
+        found = self.repository.delete(item_id)
+        for price in found.values():
+            if price is not None:
+                self.stats.remove(price)
+        return found
+
+    def create_many(self, items):
+        ids = self.repository.create_many(items)
+        for item in items:
+            self.stats.add(item.price)
+        return ids
+
+    # An id listed twice is updated twice: the second update replaces the first's price
+    def update_many(self, items):
+        found = self.repository.update_many(items)
+        current = dict(found)
+        for item in items:
+            if item.id in current:
+                self._replace(current[item.id], item.price)
+                current[item.id] = item.price
+        return found
+
+    def delete_many(self, ids):
+        found = self.repository.delete_many(ids)
+        for price in found.values():
+            if price is not None:
+                self.stats.remove(price)
+        return found
+
+    def listing(self, query, variant=''):
+        return self.repository.listing(query, variant)
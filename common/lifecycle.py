@@ -0,0 +1,65 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# Process lifecycle hooks for running an app under a pre-forking server (see
+# gunicorn.conf.py), registered by the app and found at app.extensions['lifecycle']:
+#   startup  - once, in the master before workers are forked (e.g. migrations);
+#              anything it opens must be closed again before it returns
+#   worker_start - in each worker right after the fork, before it serves:
+#              start per-process background threads (subscribers, syncs)
+#   drain    - in a worker as soon as it is told to stop: end long-lived
+#              responses so in-flight requests finish within the graceful timeout
+#   shutdown - in a worker once it has stopped serving: flush queued writes,
+#              stop background threads, close pools
+# A failing hook is logged and the rest still run. Shutdown runs at most once.
+class Lifecycle:
+    def __init__(self):
+        self._hooks = {'startup': [], 'worker_start': [], 'drain': [], 'shutdown': []}
+        self._lock = threading.Lock()
+        self._shut_down = False
+
+    def init_app(self, app):
+        app.extensions['lifecycle'] = self
+        return self
+
+    def on_startup(self, fn):
+        self._hooks['startup'].append(fn)
+        return fn
+
+    def on_worker_start(self, fn):
+        self._hooks['worker_start'].append(fn)
+        return fn
+
+    def on_drain(self, fn):
+        self._hooks['drain'].append(fn)
+        return fn
+
+    def on_shutdown(self, fn):
+        self._hooks['shutdown'].append(fn)
+        return fn
+
+    def _run(self, stage):
+        for fn in self._hooks[stage]:
+            try:
+                fn()
+            except Exception:
+                logger.exception("%s hook %s failed", stage, getattr(fn, '__name__', fn))
+
+    def startup(self):
+        self._run('startup')
+
+    def worker_start(self):
+        self._run('worker_start')
+
+    def drain(self):
+        self._run('drain')
+
+    def shutdown(self):
+        with self._lock:
+            if self._shut_down:
+                return
+            self._shut_down = True
+        self._run('shutdown')
@@ -0,0 +1,196 @@
+import contextvars
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# Prometheus' default buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Per-request phase totals; None outside a request, so timed() is a no-op there
+_phases = contextvars.ContextVar('request_phases', default=None)
+_started = contextvars.ContextVar('request_started', default=None)
+
+
+@contextmanager
+def timed(phase):
+    phases = _phases.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - start
+
+
+def timed_call(phase, fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with timed(phase):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels.items())
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+# Cursor proxy that charges execute/fetch time to the "db" phase
+class TimedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in ('execute', 'executemany', 'fetchone', 'fetchmany', 'fetchall'):
+            return timed_call('db', attr)
+        return attr
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+# Connection proxy handing out TimedCursors; commit/rollback count as db time too.
+# Everything else (close() back to the pool included) goes to the wrapped connection.
+class TimedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+        if name in ('commit', 'rollback'):
+            return timed_call('db', attr)
+        return attr
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs))
+
+
+# Per-process request metrics, rendered in the Prometheus text format:
+#   http_request_duration_seconds{method,endpoint,status}  histogram
+#   http_request_phase_seconds{endpoint,phase}             histogram, time per request in each phase
+# Recording is a few dict lookups and a bisect under one lock. Each worker
+# process keeps its own numbers; Prometheus sums them across scrape targets.
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._requests = {}
+        self._phases = {}
+        self._gauges = []
+        self._lock = threading.Lock()
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(self.buckets)
+        return histogram
+
+    def observe_request(self, method, endpoint, status, duration, phases=None):
+        with self._lock:
+            self._histogram(self._requests, (method, endpoint, status)).observe(duration)
+            for phase, seconds in (phases or {}).items():
+                self._histogram(self._phases, (endpoint, phase)).observe(seconds)
+
+    # Expose a stats() style dict of numbers as gauges named `<prefix>_<key>`
+    def add_gauges(self, prefix, stats_fn, help_text=''):
+        self._gauges.append((prefix, stats_fn, help_text))
+
+    def _render_histograms(self, lines, name, help_text, table, label_names):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, histogram in sorted(table.items()):
+            labels = _labels(**dict(zip(label_names, key)))
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum!r}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+    def render(self):
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, 'http_request_duration_seconds', "Request latency by route.",
+                                    self._requests, ('method', 'endpoint', 'status'))
+            self._render_histograms(lines, 'http_request_phase_seconds',
+                                    "Time per request spent waiting for a connection, in the database, "
+                                    "validating and serializing.",
+                                    self._phases, ('endpoint', 'phase'))
+        for prefix, stats_fn, help_text in self._gauges:
+            for key, value in stats_fn().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    name = f"{prefix}_{key}"
+                    lines.append(f"# HELP {name} {help_text or key}")
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f"{name} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    # Time every request, charge jsonify() to "serialization" and serve GET /metrics.
+    # Works for Flask and Quart apps. Streamed bodies are timed until the response
+    # starts; rows fetched while streaming aren't charged to the request.
+    def init_app(self, app):
+        is_async = inspect.iscoroutinefunction(app.dispatch_request)
+        if is_async:
+            from quart import Response, request
+        else:
+            from flask import Response, request
+
+        app.json.dumps = timed_call('serialization', app.json.dumps)
+
+        def begin():
+            _phases.set({})
+            _started.set(time.perf_counter())
+
+        def finish(response):
+            started = _started.get()
+            if started is not None:
+                endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                if endpoint != '/metrics':
+                    self.observe_request(request.method, endpoint, response.status_code,
+                                         time.perf_counter() - started, _phases.get())
+                _started.set(None)
+                _phases.set(None)
+            return response
+
+        def metrics_view():
+            return Response(self.render(), content_type=CONTENT_TYPE)
+
+        if is_async:
+            async def before_request():
+                begin()
+
+            async def after_request(response):
+                return finish(response)
+
+            async def metrics_endpoint():
+                return metrics_view()
+        else:
+            before_request, after_request, metrics_endpoint = begin, finish, metrics_view
+
+        app.before_request(before_request)
+        app.after_request(after_request)
+        app.add_url_rule('/metrics', 'metrics', metrics_endpoint, methods=['GET'])
+        return self
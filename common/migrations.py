@@ -0,0 +1,205 @@
+import argparse
+import os
+
+import mysql.connector
+
+from common.etag import COLLECTION_VERSION_SLOTS
+
+
+# MySQL DDL auto-commits statement by statement, so a migration that fails
+# halfway leaves its first changes in place without a schema_version row. Steps
+# that can't say IF NOT EXISTS are (check, statement) pairs: the statement is
+# skipped when the information_schema check finds it already applied, so the
+# rerun picks up where the failed one stopped.
+def add_index(table, name, columns, unique=False):
+    check = ("SELECT 1 FROM information_schema.statistics "
+             "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1", (table, name))
+    return check, f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({columns})"
+
+
+def add_column(table, name, definition):
+    check = ("SELECT 1 FROM information_schema.columns "
+             "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s LIMIT 1", (table, name))
+    return check, f"ALTER TABLE {table} ADD COLUMN {name} {definition}"
+
+
+# Ordered, append-only list of (version, description, steps). Never edit an
+# applied migration; add a new one instead.
+MIGRATIONS = [
+    (1, "create items and users tables", [
+        """
+        CREATE TABLE IF NOT EXISTS items (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            price DECIMAL(10, 2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(100) NOT NULL,
+            password VARCHAR(255) NOT NULL
+        )
+        """,
+    ]),
+    # /login looks users up by name; fails if duplicate usernames already exist
+    (2, "unique index on users.username", [
+        add_index('users', 'idx_users_username', 'username', unique=True),
+    ]),
+    (3, "indexes on items.created_at and items.name", [
+        add_index('items', 'idx_items_created_at', 'created_at'),
+        add_index('items', 'idx_items_name', 'name'),
+    ]),
+    # Row version for ETag / Last-Modified; indexed so MAX(updated_at) is O(1)
+    (4, "add items.updated_at", [
+        add_column('items', 'updated_at', "TIMESTAMP(6) NOT NULL "
+                   "DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)"),
+        add_index('items', 'idx_items_updated_at', 'updated_at'),
+    ]),
+    # Keyset listings sorted/filtered by price walk (price, id); name and
+    # created_at are already covered since InnoDB appends the primary key
+    (5, "index on items (price, id)", [
+        add_index('items', 'idx_items_price_id', 'price, id'),
+    ]),
+    # Optimistic concurrency: every UPDATE bumps it, If-Match updates require it
+    (6, "add items.version", [
+        add_column('items', 'version', "INT UNSIGNED NOT NULL DEFAULT 1"),
+    ]),
+    # Change counter behind the collection ETag (see common/etag.py)
+    (7, "create item_changes", [
+        """
+        CREATE TABLE IF NOT EXISTS item_changes (
+            slot TINYINT UNSIGNED PRIMARY KEY,
+            changes BIGINT UNSIGNED NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT IGNORE INTO item_changes (slot) VALUES "
+        + ', '.join(f"({slot})" for slot in range(COLLECTION_VERSION_SLOTS)),
+    ]),
+]
+
+LOCK_NAME = 'schema_migrations'
+LOCK_TIMEOUT = 60
+
+
+def create_database(host, user, password, database):
+    conn = mysql.connector.connect(host=host, user=user, password=password)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+    cursor.close()
+    conn.close()
+
+
+def ensure_version_table(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def current_version(cursor):
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    row = cursor.fetchone()
+    return row[0] or 0
+
+
+def pending_migrations(version, target=None):
+    return [m for m in MIGRATIONS if m[0] > version and (target is None or m[0] <= target)]
+
+
+def apply_step(cursor, step):
+    if isinstance(step, tuple):
+        (check, params), step = step
+        cursor.execute(check, params)
+        if cursor.fetchone():
+            return
+    cursor.execute(step)
+
+
+# Apply every pending migration in order and return the versions applied. When
+# the schema is current this is two cheap queries and no DDL. A named lock keeps
+# concurrent deploys from racing; each migration records its version right
+# after its steps run, and its steps are safe to rerun (see add_index).
+def migrate(conn, target=None):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+        if not cursor.fetchone()[0]:
+            raise RuntimeError("Timed out waiting for the schema migration lock")
+        try:
+            ensure_version_table(cursor)
+            applied = []
+            for version, description, steps in pending_migrations(current_version(cursor), target):
+                for step in steps:
+                    apply_step(cursor, step)
+                cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                               (version, description))
+                conn.commit()
+                applied.append(version)
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def status(conn):
+    cursor = conn.cursor()
+    try:
+        ensure_version_table(cursor)
+        version = current_version(cursor)
+    finally:
+        cursor.close()
+    return version, pending_migrations(version)
+
+
+# CLI entry point so deploys migrate once, outside of worker startup:
+#   python -m common.migrations upgrade
+#   python -m common.migrations status
+def main(argv=None):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    parser = argparse.ArgumentParser(description="Apply MySQL schema migrations")
+    parser.add_argument('command', choices=['upgrade', 'status'], nargs='?', default='upgrade')
+    parser.add_argument('--host', default=os.getenv('MYSQL_HOST', 'localhost'))
+    parser.add_argument('--user', default=os.getenv('MYSQL_USER', 'root'))
+    parser.add_argument('--password', default=os.getenv('MYSQL_PASSWORD', ''))
+    parser.add_argument('--database', default=os.getenv('MYSQL_DB'))
+    parser.add_argument('--target', type=int, default=None, help="stop after this version")
+    args = parser.parse_args(argv)
+
+    if not args.database:
+        parser.error("--database (or MYSQL_DB) is required")
+
+    if args.command == 'upgrade':
+        create_database(args.host, args.user, args.password, args.database)
+
+    conn = mysql.connector.connect(host=args.host, user=args.user, password=args.password, database=args.database)
+    try:
+        if args.command == 'status':
+            version, pending = status(conn)
+            print(f"Schema version: {version}")
+            for number, description, _ in pending:
+                print(f"  pending {number}: {description}")
+        else:
+            applied = migrate(conn, target=args.target)
+            if applied:
+                print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+            else:
+                print("Schema is up to date")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import base64
+import json
+from urllib.parse import urlencode
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+STREAM_MODES = ('ndjson', 'json')
+
+
+# Cursors are opaque to clients: urlsafe base64 of {"id": <last id>}, plus the
+# last sort key and sort spec ("k", "s") when the listing isn't sorted by id
+def encode_cursor(last_id, key=None, sort=None):
+    state = {"id": last_id}
+    if sort is not None:
+        state["k"] = key
+        state["s"] = sort
+    raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor_state(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        last_id = int(value['id'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if last_id < 0:
+        raise ValueError("Invalid cursor")
+    return last_id, value.get('k'), value.get('s')
+
+
+def decode_cursor(cursor):
+    return decode_cursor_state(cursor)[0]
+
+
+# Read limit / after / stream from the query string; raises ValueError on bad input
+def parse_page_args(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    after = args.get('after')
+    after_id = decode_cursor(after) if after else 0
+
+    stream = args.get('stream')
+    if stream is not None and stream not in STREAM_MODES:
+        raise ValueError(f"stream must be one of {', '.join(STREAM_MODES)}")
+
+    return limit, after_id, stream
+
+
+def next_link(request, next_cursor):
+    args = request.args.to_dict()
+    args['after'] = next_cursor
+    return f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+
+
+# Iterate rows from an unbuffered (server-side) cursor in batches; owns the
+# connection and hands it back when the generator finishes or is closed
+def stream_rows(conn, sql, params, batch_size=STREAM_BATCH_SIZE):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        try:
+            cursor.close()
+        finally:
+            conn.close()
+
+
+def ndjson_lines(rows, to_dict, dumps=json.dumps):
+    for row in rows:
+        yield dumps(to_dict(row)) + '\n'
+
+
+# Emit {"items": [...]} incrementally as chunks of a single JSON document
+def json_array_chunks(rows, to_dict, key='items', dumps=json.dumps):
+    yield '{"%s": [' % key
+    first = True
+    for row in rows:
+        yield ('' if first else ',') + dumps(to_dict(row))
+        first = False
+    yield ']}'
+
+
+STREAM_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def stream_body(mode, rows, to_dict, dumps=json.dumps):
+    if mode == 'ndjson':
+        return ndjson_lines(rows, to_dict, dumps)
+    return json_array_chunks(rows, to_dict, dumps=dumps)
@@ -0,0 +1,153 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+# "10/minute" -> `count` requests per period, refilled continuously; the whole
+# allowance can be spent in one burst
+class RateLimit:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+
+    @classmethod
+    def parse(cls, spec):
+        try:
+            count, _, period = spec.partition('/')
+            count = int(count)
+            seconds = PERIODS[period.strip() or 'second']
+        except (KeyError, ValueError):
+            raise ValueError(f"Invalid rate limit {spec!r}; expected e.g. '10/minute'")
+        if count <= 0:
+            raise ValueError(f"Invalid rate limit {spec!r}; the count must be positive")
+        return cls(count / seconds, count)
+
+    def __repr__(self):
+        return f"RateLimit(rate={self.rate}, burst={self.burst})"
+
+
+# Config helper: '' or 'off' disables a limit
+def parse_rate_limit(spec):
+    if not spec or spec.strip().lower() == 'off':
+        return None
+    return RateLimit.parse(spec)
+
+
+# Token buckets in a per-process dict, LRU-bounded to `max_keys` buckets. Right
+# for a single worker; with several, each one enforces the limit on its own.
+class LocalRateLimiter:
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    # Take `cost` tokens from `key`'s bucket. Returns 0 when allowed, else the
+    # seconds until enough tokens will have refilled.
+    def hit(self, key, limit, cost=1):
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0.0
+                self.allowed += 1
+            else:
+                retry_after = (cost - tokens) / limit.rate
+                self.limited += 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "local", "buckets": len(self._buckets), "allowed": self.allowed,
+                    "limited": self.limited}
+
+
+# The same bucket update as LocalRateLimiter, done atomically inside Redis.
+# Time comes from the Redis server so app nodes' clocks don't matter. Returns
+# the retry delay as a string since Lua numbers are truncated to integers.
+TOKEN_BUCKET_LUA = """
+if redis.replicate_commands then redis.replicate_commands() end
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+
+# Token buckets shared by every worker and node through Redis. If Redis can't
+# be reached the check falls back to a local bucket, so limits loosen to
+# per-process rather than disappearing.
+class RedisRateLimiter:
+    def __init__(self, client, prefix='ratelimit:', fallback=None):
+        self.client = client
+        self.prefix = prefix
+        self.fallback = fallback or LocalRateLimiter()
+        self._script = client.register_script(TOKEN_BUCKET_LUA)
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+
+    def hit(self, key, limit, cost=1):
+        try:
+            raw = self._script(keys=[self.prefix + key], args=[limit.rate, limit.burst, cost])
+        except Exception:
+            self.errors += 1
+            return self.fallback.hit(key, limit, cost)
+        retry_after = float(raw.decode() if isinstance(raw, bytes) else raw)
+        if retry_after > 0:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def stats(self):
+        return {"backend": "redis", "allowed": self.allowed, "limited": self.limited, "errors": self.errors}
+
+
+# The client address to key per-IP limits on. Behind `trusted_proxies` proxies
+# that each append to X-Forwarded-For, the client is that many entries from the
+# right. With 0 the header is ignored: any client can send one.
+def client_address(request, trusted_proxies=0):
+    if trusted_proxies:
+        forwarded = [hop.strip() for value in request.headers.getlist('X-Forwarded-For')
+                     for hop in value.split(',') if hop.strip()]
+        if len(forwarded) >= trusted_proxies:
+            return forwarded[-trusted_proxies]
+    return request.remote_addr
+
+
+# Seconds for a Retry-After header; never 0 for a limited request
+def retry_after_header(retry_after):
+    return {'Retry-After': str(max(1, math.ceil(retry_after)))}
+
+
+def make_rate_limiter(redis_url=None):
+    if redis_url:
+        import redis
+        client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return RedisRateLimiter(client)
+    return LocalRateLimiter()
@@ -0,0 +1,196 @@
+import itertools
+import os
+import threading
+import time
+
+import mysql.connector
+
+from common.db_pool import ConnectionPool, PoolTimeout
+
+STRATEGIES = ('least_busy', 'round_robin')
+
+
+# Seconds the replica's SQL thread is behind its source, or None when it isn't
+# replicating. SHOW REPLICA STATUS is MySQL 8.0.22+; older servers only know
+# the SLAVE spelling.
+def replica_lag_seconds(conn):
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except mysql.connector.Error:
+            cursor.execute("SHOW SLAVE STATUS")
+        channels = cursor.fetchall()
+    finally:
+        cursor.close()
+    lags = [row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master')) for row in channels]
+    if not lags or any(lag is None for lag in lags):
+        return None
+    return max(lags)
+
+
+# "host" or "host:port" list from MYSQL_REPLICA_HOSTS
+def parse_hosts(value):
+    hosts = []
+    for entry in filter(None, (part.strip() for part in (value or '').split(','))):
+        host, _, port = entry.partition(':')
+        hosts.append((host, int(port)) if port else (host, None))
+    return hosts
+
+
+class Replica:
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag = None
+        self.healthy = False
+        self.checked_at = None
+        self.reads = 0
+        self.errors = 0
+
+
+# Picks the pool for read-only queries. Replicas are used only while their lag
+# is known and at most `max_lag` seconds; lag is re-checked every `check_interval`
+# seconds on a background thread, so no request waits on SHOW REPLICA STATUS
+# (until the first check lands, reads go to the primary). A client that wrote within the
+# last `sticky_seconds` reads from the primary so it sees its own writes (per
+# process: another worker may still send it to a replica). With no replicas
+# configured every read goes to the primary.
+class ReplicaRouter:
+    def __init__(self, primary, replicas=None, strategy='least_busy', max_lag=5.0, check_interval=5.0,
+                 sticky_seconds=5.0, lag_fn=replica_lag_seconds):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.primary = primary
+        self.replicas = [Replica(name, pool) for name, pool in (replicas or {}).items()]
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.lag_fn = lag_fn
+
+        self._writers = {}
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.fallback_reads = 0
+
+    @classmethod
+    def from_hosts(cls, primary, hosts, pool_size=5, max_overflow=10, timeout=30.0, recycle=3600.0,
+                   strategy='least_busy', max_lag=5.0, check_interval=5.0, sticky_seconds=5.0, **connect_kwargs):
+        replicas = {}
+        for host, port in hosts:
+            kwargs = dict(connect_kwargs, host=host)
+            if port:
+                kwargs['port'] = port
+            name = f"{host}:{port}" if port else host
+            replicas[name] = ConnectionPool(pool_size=pool_size, max_overflow=max_overflow, timeout=timeout,
+                                            recycle=recycle, **kwargs)
+        return cls(primary, replicas, strategy=strategy, max_lag=max_lag, check_interval=check_interval,
+                   sticky_seconds=sticky_seconds)
+
+    # Pin `client` to the primary for the next `sticky_seconds`
+    def note_write(self, client):
+        if client is None or not self.replicas or self.sticky_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._writers[client] = now + self.sticky_seconds
+            if len(self._writers) > 10000:
+                self._writers = {key: until for key, until in self._writers.items() if until > now}
+
+    def _pinned(self, client):
+        until = self._writers.get(client)
+        return until is not None and until > time.monotonic()
+
+    def check_lag(self):
+        for replica in self.replicas:
+            try:
+                conn = replica.pool.get_connection()
+                try:
+                    replica.lag = self.lag_fn(conn)
+                finally:
+                    conn.close()
+            # A failed check, whatever the cause, just takes the replica out of rotation
+            except Exception:
+                replica.lag = None
+                replica.errors += 1
+            replica.healthy = replica.lag is not None and replica.lag <= self.max_lag
+            replica.checked_at = time.monotonic()
+
+    # One lag-checking thread per process, started on first use (and again after a fork)
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            threading.Thread(target=self._run, name='replica-lag-check', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.check_lag()
+            if self._stop.wait(self.check_interval):
+                return
+
+    def _choose(self):
+        candidates = [replica for replica in self.replicas if replica.healthy]
+        if not candidates:
+            return None
+        if self.strategy == 'round_robin':
+            return candidates[next(self._round_robin) % len(candidates)]
+        return min(candidates, key=lambda replica: replica.pool.in_use)
+
+    # A connection for read-only queries on behalf of `client` (close() returns it).
+    # Falls back to the primary when no replica is fit or the chosen one fails.
+    def get_connection(self, client=None):
+        if not self.replicas:
+            self.primary_reads += 1
+            return self.primary.get_connection()
+        if client is not None and self._pinned(client):
+            self.pinned_reads += 1
+            return self.primary.get_connection()
+
+        self._ensure_started()
+        replica = self._choose()
+        if replica is not None:
+            try:
+                conn = replica.pool.get_connection()
+                replica.reads += 1
+                return conn
+            except (mysql.connector.Error, PoolTimeout):
+                replica.errors += 1
+                replica.healthy = False
+        self.fallback_reads += 1
+        return self.primary.get_connection()
+
+    def stats(self):
+        stats = {
+            "replicas": len(self.replicas),
+            "healthy_replicas": sum(replica.healthy for replica in self.replicas),
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+            "fallback_reads": self.fallback_reads,
+            "replica_reads": sum(replica.reads for replica in self.replicas),
+            "replica_errors": sum(replica.errors for replica in self.replicas),
+        }
+        lags = [replica.lag for replica in self.replicas if replica.lag is not None]
+        if lags:
+            stats["max_lag_seconds"] = max(lags)
+        return stats
+
+    def replica_stats(self):
+        return {replica.name: {"healthy": replica.healthy, "lag_seconds": replica.lag, "reads": replica.reads,
+                               "errors": replica.errors, "pool": replica.pool.stats()}
+                for replica in self.replicas}
+
+    def dispose(self):
+        self._stop.set()
+        for replica in self.replicas:
+            replica.pool.dispose()
@@ -0,0 +1,533 @@
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import mysql.connector
+
+from common.bulk import bulk_delete, bulk_insert, bulk_update, chunked, ID_CHUNK_SIZE
+from common.db_pool import ConnectionPool, PoolTimeout
+from common.etag import collection_bump, collection_etag, collection_validators
+from common.filters import SORT_COLUMNS
+from common.metrics import timed
+from common.pagination import STREAM_BATCH_SIZE, stream_rows
+
+ITEM_BACKENDS = ('mysql', 'sqlite', 'memory', 'mongo')
+
+
+class RepositoryError(Exception):
+    pass
+
+
+# One place for item data access. Routes talk to this interface; backends
+# differ only in how they store rows. Bulk methods take objects with
+# name/description/price (and id for updates) attributes, e.g. the request models.
+class ItemRepository:
+    def create(self, name, description, price):
+        raise NotImplementedError
+
+    # `primary` reads from the primary even when replicas serve reads, e.g. for
+    # a value that will be cached and shared
+    def get(self, item_id, primary=False):
+        raise NotImplementedError
+
+    # Bumps the item's version. With `version`, only updates the item if it is
+    # still at that version. Like update_many: {item_id: price before the
+    # update}, empty when nothing was updated.
+    def update(self, item_id, name, description, price, version=None):
+        raise NotImplementedError
+
+    # {item_id: price before the delete}, empty when there was no such item
+    def delete(self, item_id):
+        raise NotImplementedError
+
+    def create_many(self, items):
+        raise NotImplementedError
+
+    # The ids that existed, mapped to their price before the change
+    def update_many(self, items):
+        raise NotImplementedError
+
+    def delete_many(self, ids):
+        raise NotImplementedError
+
+    # Open a consistent read of the collection for `query` (an ItemQuery). The
+    # returned Listing carries the collection validators and serves one page or
+    # a stream. Raises ValueError when the query can't use an index.
+    def listing(self, query, variant=''):
+        raise NotImplementedError
+
+
+class Listing:
+    def __init__(self, query, etag, last_modified):
+        self.query = query
+        self.etag = etag
+        self.last_modified = last_modified
+
+    # (rows, next_cursor)
+    def page(self, limit):
+        raise NotImplementedError
+
+    # Rows one at a time; the listing's resources are released when it is exhausted
+    def stream(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -- MySQL (and anything speaking the mysql.connector API) --------------------
+
+class MySQLListing(Listing):
+    def __init__(self, conn, query, etag, last_modified):
+        super().__init__(query, etag, last_modified)
+        self._conn = conn
+
+    def page(self, limit):
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(*self.query.page_sql(limit))
+            return self.query.split_page(cursor.fetchall(), limit)
+        except mysql.connector.Error as e:
+            raise RepositoryError(f"Database error: {e}") from e
+        finally:
+            cursor.close()
+
+    # stream_rows takes over the connection and returns it when done
+    def stream(self):
+        conn, self._conn = self._conn, None
+        return stream_rows(conn, *self.query.stream_sql())
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class MySQLItemRepository(ItemRepository):
+    # `get_connection` returns a pooled connection (close() hands it back);
+    # `get_read_connection`, when given, serves get() and listing(), e.g. from a replica
+    def __init__(self, get_connection, get_read_connection=None):
+        self.get_connection = get_connection
+        self.get_read_connection = get_read_connection or get_connection
+
+    def _connect(self, read=False):
+        try:
+            conn = self.get_read_connection() if read else self.get_connection()
+        except (mysql.connector.Error, PoolTimeout) as e:
+            raise RepositoryError(f"Failed to connect to the database: {e}") from e
+        if not conn:
+            raise RepositoryError("Failed to connect to the database!")
+        return conn
+
+    @contextmanager
+    def _cursor(self, commit=False, read=False):
+        conn = self._connect(read)
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            if commit:
+                conn.commit()
+        except mysql.connector.Error as e:
+            if commit:
+                conn.rollback()
+            raise RepositoryError(f"Database error: {e}") from e
+        finally:
+            cursor.close()
+            conn.close()
+
+    def create(self, name, description, price):
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("INSERT INTO items (name, description, price) VALUES (%s, %s, %s)",
+                           (name, description, price))
+            item_id = cursor.lastrowid
+            cursor.execute(*collection_bump())
+            return item_id
+
+    def get(self, item_id, primary=False):
+        with self._cursor(read=not primary) as cursor:
+            cursor.execute("SELECT * FROM items WHERE id = %s", (item_id,))
+            return cursor.fetchone()
+
+    # The statement leaves the price it replaced in @old_price, read back on the
+    # same connection once the write has matched
+    @staticmethod
+    def _old_price(cursor):
+        cursor.execute("SELECT @old_price")
+        return cursor.fetchone()[0]
+
+    # One statement either way; the version check rides in the WHERE clause. Bumping
+    # version means a matched row always changes, so rowcount is 1 exactly when it matched.
+    # The old price is copied out by the UPDATE itself, from the row it locks and replaces.
+    def update(self, item_id, name, description, price, version=None):
+        sql = ("UPDATE items SET name = %s, description = %s, price = IF((@old_price := price) IS NULL, %s, %s), "
+               "version = version + 1 WHERE id = %s")
+        params = (name, description, price, price, item_id)
+        if version is not None:
+            sql += " AND version = %s"
+            params += (version,)
+        with self._cursor(commit=True) as cursor:
+            cursor.execute(sql, params)
+            if cursor.rowcount <= 0:
+                return {}
+            old_price = self._old_price(cursor)
+            cursor.execute(*collection_bump())
+            return {item_id: old_price}
+
+    # No existence check: rowcount says whether the item was there
+    def delete(self, item_id):
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("DELETE FROM items WHERE id = %s AND (@old_price := price) <=> price", (item_id,))
+            if cursor.rowcount <= 0:
+                return {}
+            old_price = self._old_price(cursor)
+            cursor.execute(*collection_bump())
+            return {item_id: old_price}
+
+    def create_many(self, items):
+        with self._cursor(commit=True) as cursor:
+            return bulk_insert(cursor, items)
+
+    def update_many(self, items):
+        with self._cursor(commit=True) as cursor:
+            return bulk_update(cursor, items)
+
+    def delete_many(self, ids):
+        with self._cursor(commit=True) as cursor:
+            return bulk_delete(cursor, ids)
+
+    # The fingerprint query opens the REPEATABLE READ snapshot the page is then read from
+    def listing(self, query, variant=''):
+        conn = self._connect(read=True)
+        try:
+            query.ensure_indexed(conn)
+            etag, last_modified = collection_validators(conn, variant)
+        except mysql.connector.Error as e:
+            conn.close()
+            raise RepositoryError(f"Database error: {e}") from e
+        except Exception:
+            conn.close()
+            raise
+        return MySQLListing(conn, query, etag, last_modified)
+
+
+# MySQL repository over the local SQLite stand-in (see common/standins.py)
+class SQLiteItemRepository(MySQLItemRepository):
+    def __init__(self, path, pool_size=5, max_overflow=10):
+        from common.standins import sqlite_creator
+        self.pool = ConnectionPool(pool_size=pool_size, max_overflow=max_overflow, creator=sqlite_creator(path))
+        super().__init__(self.pool.get_connection)
+
+
+# -- In memory ----------------------------------------------------------------
+
+def _now(precision_us=True):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now if precision_us else now.replace(microsecond=0)
+
+
+def _price(value):
+    return Decimal(str(value)).quantize(Decimal('0.01')) if value is not None else None
+
+
+def _unescape_like(pattern):
+    return re.sub(r'\\(.)', r'\1', pattern[:-1])
+
+
+def _compare(value, op, operand):
+    if value is None:
+        return False
+    if op == 'LIKE':
+        return value.casefold().startswith(_unescape_like(operand).casefold())
+    if op == '>=':
+        return value >= operand
+    if op == '<=':
+        return value <= operand
+    if op == '<':
+        return value < operand
+    if op == '>':
+        return value > operand
+    raise ValueError(f"Unsupported operator {op}")
+
+
+# Filter, order and keyset-slice `rows` the way ItemQuery's SQL would
+def select_rows(rows, query):
+    sort = SORT_COLUMNS[query.sort]
+    rows = [row for row in rows
+            if all(_compare(row[SORT_COLUMNS[column]], op, value) for column, op, value in query.filters)
+            and row[sort] is not None]
+    rows.sort(key=lambda row: (row[sort], row[0]), reverse=query.descending)
+    if query.after is not None:
+        last_id, key = query.after
+        after = (key, last_id)
+        if query.descending:
+            rows = [row for row in rows if (row[sort], row[0]) < after]
+        else:
+            rows = [row for row in rows if (row[sort], row[0]) > after]
+    return rows
+
+
+class MemoryListing(Listing):
+    def __init__(self, rows, query, etag, last_modified):
+        super().__init__(query, etag, last_modified)
+        self._rows = rows
+
+    def page(self, limit):
+        return self.query.split_page(select_rows(self._rows, self.query)[:limit + 1], limit)
+
+    def stream(self):
+        return iter(select_rows(self._rows, self.query))
+
+
+# Rows kept in a dict; for tests and for benchmarking the HTTP layer without a database
+class MemoryItemRepository(ItemRepository):
+    def __init__(self):
+        self._rows = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def _insert(self, name, description, price):
+        item_id = self._next_id
+        self._next_id += 1
+        self._rows[item_id] = (item_id, name, description, _price(price), _now(False), _now(), 1)
+        return item_id
+
+    def create(self, name, description, price):
+        with self._lock:
+            return self._insert(name, description, price)
+
+    def get(self, item_id, primary=False):
+        return self._rows.get(item_id)
+
+    def update(self, item_id, name, description, price, version=None):
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None or (version is not None and row[6] != version):
+                return {}
+            self._rows[item_id] = (item_id, name, description, _price(price), row[4], _now(), row[6] + 1)
+            return {item_id: row[3]}
+
+    def delete(self, item_id):
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+        return {item_id: row[3]} if row is not None else {}
+
+    def create_many(self, items):
+        with self._lock:
+            return [self._insert(item.name, item.description, item.price) for item in items]
+
+    def update_many(self, items):
+        found = {}
+        with self._lock:
+            for item in items:
+                row = self._rows.get(item.id)
+                if row is not None:
+                    self._rows[item.id] = (item.id, item.name, item.description, _price(item.price), row[4],
+                                           _now(), row[6] + 1)
+                    found.setdefault(item.id, row[3])
+        return found
+
+    def delete_many(self, ids):
+        found = {}
+        with self._lock:
+            for item_id in set(ids):
+                row = self._rows.pop(item_id, None)
+                if row is not None:
+                    found[item_id] = row[3]
+        return found
+
+    def listing(self, query, variant=''):
+        with self._lock:
+            rows = list(self._rows.values())
+        query.check_table_rows(len(rows))
+        max_version = max((row[5] for row in rows), default=None)
+        return MemoryListing(rows, query, collection_etag(len(rows), max_version, variant), max_version)
+
+
+# -- MongoDB ------------------------------------------------------------------
+
+_MONGO_OPS = {'>=': '$gte', '<=': '$lte', '<': '$lt', '>': '$gt'}
+
+
+def _mongo_value(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def _mongo_row(doc):
+    return (doc['_id'], doc.get('name'), doc.get('description'), _price(doc.get('price')),
+            doc.get('created_at'), doc.get('updated_at'), doc.get('version', 1))
+
+
+class MongoListing(Listing):
+    def __init__(self, repository, query, etag, last_modified):
+        super().__init__(query, etag, last_modified)
+        self.repository = repository
+
+    def _find(self, limit=None):
+        query = self.query
+        direction = -1 if query.descending else 1
+        column = '_id' if query.sort == 'id' else query.sort
+        sort = [(column, direction)] if column == '_id' else [(column, direction), ('_id', direction)]
+        kwargs = {'sort': sort, 'batch_size': STREAM_BATCH_SIZE}
+        if query.columns is not None:
+            kwargs['projection'] = [column for column in query.columns if column != 'id']
+        if limit is not None:
+            kwargs['limit'] = limit
+        return self.repository.collection.find(mongo_filter(query), **kwargs)
+
+    def page(self, limit):
+        with timed('db'):
+            rows = [_mongo_row(doc) for doc in self._find(limit + 1)]
+        return self.query.split_page(rows, limit)
+
+    def stream(self):
+        return (_mongo_row(doc) for doc in self._find())
+
+
+# ItemQuery -> Mongo filter document
+def mongo_filter(query):
+    clauses = []
+    column = '_id' if query.sort == 'id' else query.sort
+    if column != '_id':
+        clauses.append({column: {'$ne': None}})
+    for name, op, value in query.filters:
+        if op == 'LIKE':
+            clauses.append({name: {'$regex': '^' + re.escape(_unescape_like(value)), '$options': 'i'}})
+        else:
+            clauses.append({name: {_MONGO_OPS[op]: _mongo_value(value)}})
+    if query.after is not None:
+        last_id, key = query.after
+        op = '$lt' if query.descending else '$gt'
+        if column == '_id':
+            clauses.append({'_id': {op: last_id}})
+        else:
+            key = _mongo_value(key)
+            clauses.append({'$or': [{column: {op: key}}, {column: key, '_id': {op: last_id}}]})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+# Items as documents with integer _ids from a counter document, so ids, cursors
+# and URLs look the same as with MySQL. Indexes mirror the MySQL migrations.
+class MongoItemRepository(ItemRepository):
+    def __init__(self, collection, counters):
+        self.collection = collection
+        self.counters = counters
+        self._indexed = False
+
+    def _ensure_indexes(self):
+        if not self._indexed:
+            for column in ('name', 'price', 'created_at', 'updated_at'):
+                self.collection.create_index([(column, 1), ('_id', 1)])
+            self._indexed = True
+
+    def _reserve_ids(self, count):
+        doc = self.counters.find_one_and_update({'_id': 'items'}, {'$inc': {'seq': count}},
+                                                upsert=True, return_document=True)
+        return doc['seq'] - count + 1
+
+    def _document(self, item_id, name, description, price):
+        now = _now()
+        return {'_id': item_id, 'name': name, 'description': description, 'price': _mongo_value(price),
+                'created_at': now.replace(microsecond=0), 'updated_at': now, 'version': 1}
+
+    @contextmanager
+    def _call(self):
+        from pymongo.errors import PyMongoError
+        try:
+            with timed('db'):
+                self._ensure_indexes()
+                yield
+        except PyMongoError as e:
+            raise RepositoryError(f"Database error: {e}") from e
+
+    def create(self, name, description, price):
+        with self._call():
+            item_id = self._reserve_ids(1)
+            self.collection.insert_one(self._document(item_id, name, description, price))
+        return item_id
+
+    def get(self, item_id, primary=False):
+        with self._call():
+            doc = self.collection.find_one({'_id': item_id})
+        return _mongo_row(doc) if doc else None
+
+    def update(self, item_id, name, description, price, version=None):
+        filter = {'_id': item_id} if version is None else {'_id': item_id, 'version': version}
+        with self._call():
+            doc = self.collection.find_one_and_update(filter, {'$set': {
+                'name': name, 'description': description, 'price': _mongo_value(price), 'updated_at': _now()},
+                '$inc': {'version': 1}})
+        return {item_id: _price(doc.get('price'))} if doc else {}
+
+    def delete(self, item_id):
+        with self._call():
+            doc = self.collection.find_one_and_delete({'_id': item_id})
+        return {item_id: _price(doc.get('price'))} if doc else {}
+
+    def create_many(self, items):
+        if not items:
+            return []
+        with self._call():
+            first_id = self._reserve_ids(len(items))
+            docs = [self._document(first_id + i, item.name, item.description, item.price)
+                    for i, item in enumerate(items)]
+            self.collection.insert_many(docs)
+        return [doc['_id'] for doc in docs]
+
+    def _existing_prices(self, ids):
+        found = {}
+        for chunk in chunked(list(set(ids)), ID_CHUNK_SIZE):
+            for doc in self.collection.find({'_id': {'$in': chunk}}, projection=['price']):
+                found[doc['_id']] = _price(doc.get('price'))
+        return found
+
+    def update_many(self, items):
+        with self._call():
+            found = self._existing_prices([item.id for item in items])
+            for item in items:
+                if item.id in found:
+                    self.collection.update_one({'_id': item.id}, {'$set': {
+                        'name': item.name, 'description': item.description,
+                        'price': _mongo_value(item.price), 'updated_at': _now()}, '$inc': {'version': 1}})
+        return found
+
+    def delete_many(self, ids):
+        with self._call():
+            found = self._existing_prices(ids)
+            for chunk in chunked(list(found), ID_CHUNK_SIZE):
+                self.collection.delete_many({'_id': {'$in': chunk}})
+        return found
+
+    def listing(self, query, variant=''):
+        with self._call():
+            if query.residual_columns():
+                query.check_table_rows(self.collection.estimated_document_count())
+            count = self.collection.count_documents({})
+            latest = list(self.collection.find({}, sort=[('updated_at', -1)], limit=1, projection=['updated_at']))
+        max_version = latest[0]['updated_at'] if latest else None
+        return MongoListing(self, query, collection_etag(count, max_version, variant), max_version)
+
+
+def make_item_repository(backend='mysql', get_connection=None, sqlite_path=None, mongo_uri=None,
+                         mongo_database='mydatabase', get_read_connection=None):
+    if backend == 'mysql':
+        return MySQLItemRepository(get_connection, get_read_connection)
+    if backend == 'sqlite':
+        return SQLiteItemRepository(sqlite_path or 'items.sqlite3')
+    if backend == 'memory':
+        return MemoryItemRepository()
+    if backend == 'mongo':
+        from pymongo import MongoClient
+        # connect=False: no monitor threads until first use, so a pre-forking server doesn't copy them
+        db = MongoClient(mongo_uri or 'mongodb://localhost:27017', connect=False)[mongo_database]
+        return MongoItemRepository(db.items, db.counters)
+    raise ValueError(f"Unknown item backend: {backend} (choose from {', '.join(ITEM_BACKENDS)})")
@@ -0,0 +1,369 @@
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+import mysql.connector
+from bson import ObjectId
+
+from common.etag import COLLECTION_VERSION_SLOTS
+
+# Local stand-ins for MySQL and MongoDB, so the apps can be driven end to end
+# (benchmarks, demos) on a laptop with no database server. They implement only
+# what the apps call; they are not a general MySQL or Mongo emulation.
+
+# Schema at the latest migration (see common/migrations.py), in SQLite terms
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(100) NOT NULL,
+        description TEXT,
+        price REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+        version INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username VARCHAR(100) NOT NULL,
+        password VARCHAR(255) NOT NULL
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)",
+    "CREATE INDEX IF NOT EXISTS idx_items_created_at ON items (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_items_name ON items (name)",
+    "CREATE INDEX IF NOT EXISTS idx_items_updated_at ON items (updated_at)",
+    "CREATE INDEX IF NOT EXISTS idx_items_price_id ON items (price, id)",
+    """
+    CREATE TABLE IF NOT EXISTS item_changes (
+        slot INTEGER PRIMARY KEY,
+        changes INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO item_changes (slot) VALUES " + ', '.join(f"({slot})" for slot in range(COLLECTION_VERSION_SLOTS)),
+    # ON UPDATE CURRENT_TIMESTAMP(6)
+    """
+    CREATE TRIGGER IF NOT EXISTS items_updated_at AFTER UPDATE OF name, description, price ON items
+    BEGIN
+        UPDATE items SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id;
+    END
+    """,
+]
+
+# MySQL spellings used by the apps -> SQLite
+_REWRITES = [
+    (re.compile(r"SELECT LAST_INSERT_ID\(\)"), "SELECT last_insert_rowid()"),
+    (re.compile(r"SELECT TABLE_ROWS FROM information_schema\.TABLES .*", re.S), "SELECT COUNT(*) FROM items"),
+    # aggregates lose the column's declared type; name it so PARSE_COLNAMES converts it
+    (re.compile(r"MAX\((\w+_at)\)"), r'MAX(\1) AS "\1 [TIMESTAMP]"'),
+    (re.compile(r"LIKE %s"), "LIKE %s ESCAPE '\\\\'"),
+    # SQLite locks the whole database for a write transaction anyway
+    (re.compile(r" FOR UPDATE$"), ""),
+    # user variables, kept per connection (see SQLiteConnection)
+    (re.compile(r"\(@(\w+) := (\w+)\)"), r"set_variable('\1', \2)"),
+    (re.compile(r"@(\w+)"), r"get_variable('\1')"),
+    (re.compile(r"\bIF\("), "IIF("),
+    (re.compile(r"<=>"), "IS"),
+    (re.compile(r"%s"), "?"),
+]
+
+sqlite3.register_converter('TIMESTAMP', lambda raw: datetime.fromisoformat(raw.decode('utf-8')))
+
+
+def _translate(sql):
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _param(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return value
+
+
+def _raise_mysql_error(e):
+    if isinstance(e, sqlite3.IntegrityError):
+        raise mysql.connector.IntegrityError(msg=str(e)) from e
+    raise mysql.connector.DatabaseError(msg=str(e)) from e
+
+
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        try:
+            self._cursor.execute(_translate(sql), tuple(_param(p) for p in params or ()))
+        except sqlite3.Error as e:
+            _raise_mysql_error(e)
+        self.lastrowid = self._cursor.lastrowid
+        self.rowcount = self._cursor.rowcount
+
+    # Like a multi-row INSERT in MySQL, lastrowid is the first generated id
+    def executemany(self, sql, seq_params):
+        sql = _translate(sql)
+        first_id, rowcount = None, 0
+        try:
+            for params in seq_params:
+                self._cursor.execute(sql, tuple(_param(p) for p in params))
+                rowcount += self._cursor.rowcount
+                if first_id is None:
+                    first_id = self._cursor.lastrowid
+        except sqlite3.Error as e:
+            _raise_mysql_error(e)
+        self.lastrowid = first_id
+        self.rowcount = rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+# The slice of mysql.connector's connection API that ConnectionPool and the apps use
+class SQLiteConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                     detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        self._variables = {}
+        self._conn.create_function('set_variable', 2, self._set_variable)
+        self._conn.create_function('get_variable', 1, self._variables.get)
+
+    def _set_variable(self, name, value):
+        self._variables[name] = value
+        return value
+
+    def cursor(self, **kwargs):
+        return SQLiteCursor(self._conn.cursor())
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def start_transaction(self, **kwargs):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._conn.execute("SELECT 1")
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._conn.close()
+
+
+def create_sqlite_schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SQLITE_SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# `creator` for ConnectionPool: ConnectionPool(creator=sqlite_creator(path))
+def sqlite_creator(path):
+    create_sqlite_schema(path)
+    return lambda: SQLiteConnection(path)
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class UpdateResult:
+    def __init__(self, matched_count, modified_count):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+def _compare(value, op, operand):
+    if op == '$ne':
+        return value != operand
+    if op == '$in':
+        return value in operand
+    if op == '$regex':
+        return isinstance(value, str) and re.search(operand, value) is not None
+    if value is None:
+        return False
+    if op == '$gte':
+        return value >= operand
+    if op == '$gt':
+        return value > operand
+    if op == '$lte':
+        return value <= operand
+    if op == '$lt':
+        return value < operand
+    raise ValueError(f"Unsupported operator {op}")
+
+
+def _matches(doc, filter):
+    for key, condition in (filter or {}).items():
+        if key == '$and':
+            if not all(_matches(doc, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(_matches(doc, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(op.startswith('$') for op in condition):
+            condition = dict(condition)
+            if condition.get('$options') == 'i':
+                condition['$regex'] = '(?i)' + condition['$regex']
+            condition.pop('$options', None)
+            if not all(_compare(doc.get(key), op, operand) for op, operand in condition.items()):
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+def _sort_key(doc, key):
+    value = doc.get(key)
+    return (value is not None, value)
+
+
+# In-memory pymongo Collection for the calls the apps make: insert_one/many,
+# find (sort, limit, projection), find_one, find_one_and_update ($set, $inc),
+# find_one_and_delete, update_one ($set, $inc), delete_one/many and the counts. Filters support equality,
+# $and/$or and the comparison, $in, $ne and $regex operators.
+class MemoryCollection:
+    def __init__(self):
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def _find_id(self, filter):
+        if set(filter or {}) == {'_id'} and not isinstance(filter['_id'], dict):
+            return filter['_id'] if filter['_id'] in self._docs else None
+        for doc_id, doc in self._docs.items():
+            if _matches(doc, filter):
+                return doc_id
+        return None
+
+    def create_index(self, keys, **kwargs):
+        return '_'.join(f"{key}_{direction}" for key, direction in keys)
+
+    def insert_one(self, document):
+        document.setdefault('_id', ObjectId())
+        with self._lock:
+            self._docs[document['_id']] = dict(document)
+        return InsertOneResult(document['_id'])
+
+    def insert_many(self, documents):
+        return InsertManyResult([self.insert_one(document).inserted_id for document in documents])
+
+    def find(self, filter=None, projection=None, sort=None, limit=0, **kwargs):
+        with self._lock:
+            docs = [dict(doc) for doc in self._docs.values() if _matches(doc, filter)]
+        for key, direction in reversed(sort or []):
+            docs.sort(key=lambda doc: _sort_key(doc, key), reverse=direction < 0)
+        if limit:
+            docs = docs[:limit]
+        if projection is not None:
+            docs = [{key: doc[key] for key in ['_id', *projection] if key in doc} for doc in docs]
+        return docs
+
+    def find_one(self, filter=None):
+        with self._lock:
+            doc_id = self._find_id(filter)
+            return dict(self._docs[doc_id]) if doc_id is not None else None
+
+    # return_document: False (ReturnDocument.BEFORE) or True (AFTER)
+    def find_one_and_update(self, filter, update, upsert=False, return_document=False):
+        with self._lock:
+            doc_id = self._find_id(filter)
+            if doc_id is None:
+                if not upsert:
+                    return None
+                doc = dict(filter)
+                doc.setdefault('_id', ObjectId())
+                doc_id = doc['_id']
+                self._docs[doc_id] = doc
+                before = None
+            else:
+                before = dict(self._docs[doc_id])
+            doc = self._docs[doc_id]
+            doc.update(update.get('$set', {}))
+            for key, amount in update.get('$inc', {}).items():
+                doc[key] = doc.get(key, 0) + amount
+            return dict(doc) if return_document else before
+
+    def find_one_and_delete(self, filter):
+        with self._lock:
+            doc_id = self._find_id(filter)
+            return self._docs.pop(doc_id) if doc_id is not None else None
+
+    def update_one(self, filter, update):
+        with self._lock:
+            doc_id = self._find_id(filter)
+            if doc_id is None:
+                return UpdateResult(0, 0)
+            doc = self._docs[doc_id]
+            doc.update(update.get('$set', {}))
+            for key, amount in update.get('$inc', {}).items():
+                doc[key] = doc.get(key, 0) + amount
+        return UpdateResult(1, 1)
+
+    def delete_one(self, filter):
+        with self._lock:
+            doc_id = self._find_id(filter)
+            if doc_id is None:
+                return DeleteResult(0)
+            del self._docs[doc_id]
+        return DeleteResult(1)
+
+    def delete_many(self, filter):
+        with self._lock:
+            doc_ids = [doc_id for doc_id, doc in self._docs.items() if _matches(doc, filter)]
+            for doc_id in doc_ids:
+                del self._docs[doc_id]
+        return DeleteResult(len(doc_ids))
+
+    def count_documents(self, filter=None):
+        return len(self.find(filter))
+
+    def estimated_document_count(self):
+        return len(self._docs)
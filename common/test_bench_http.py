@@ -0,0 +1,56 @@
+import pytest
+
+from common.bench_http import APPS, benchmark, parse_mix, percentile
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([7], 95) == 7
+    assert percentile([], 50) is None
+
+
+def test_parse_mix_rejects_unknown_operations():
+    operations = APPS['mongo'][2]
+    assert parse_mix('get_all=3,add', operations) == {'get_all': 3.0, 'add': 1.0}
+    with pytest.raises(ValueError):
+        parse_mix('get_item=1', operations)
+
+
+@pytest.mark.parametrize('transport', ['wsgi', 'http'])
+def test_mongo_benchmark_runs_against_standin(transport):
+    report = benchmark('mongo', concurrency=2, requests=40, warmup=1, seed_items=5, transport=transport)
+
+    total = report['results']['total']
+    assert total['requests'] == 40
+    assert total['errors'] == 0
+    assert total['p50_ms'] <= total['p99_ms']
+    assert set(report['results']) == {'get_all', 'add', 'total'}
+
+
+def test_mysql_benchmark_runs_against_standin():
+    report = benchmark('mysql', mix='get_item=2,all_items=1,create_item=1', concurrency=2, requests=40,
+                       warmup=1, seed_items=20, transport='wsgi')
+
+    assert report['results']['total']['requests'] == 40
+    assert report['results']['total']['errors'] == 0
+
+
+def test_e2e_benchmark_runs_against_memory_backend():
+    report = benchmark('e2e', mix='get_item=2,all_items=1,create_item=1', concurrency=2, requests=40,
+                       warmup=1, seed_items=20, transport='wsgi', backend='memory')
+
+    assert report['backend'] == 'memory'
+    assert report['results']['total']['requests'] == 40
+    assert report['results']['total']['errors'] == 0
+
+
+@pytest.mark.parametrize('create_mode', ['async', 'strong'])
+def test_mysql_benchmark_with_group_commit(create_mode):
+    report = benchmark('mysql', mix='create_item=3,get_item=1', concurrency=4, requests=40, warmup=1,
+                       seed_items=5, transport='wsgi', create_mode=create_mode)
+
+    assert report['create_mode'] == create_mode
+    assert report['results']['total']['errors'] == 0
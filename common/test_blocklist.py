@@ -0,0 +1,71 @@
+import time
+
+from common.blocklist import SYNC_BATCH_SIZE, TokenBlocklist
+
+
+class FakeRedisStream:
+    def __init__(self):
+        self.entries = []
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        entry_id = f"{len(self.entries) + 1}-0"
+        self.entries.append((entry_id, {k.encode(): v.encode() for k, v in fields.items()}))
+        return entry_id
+
+    def xread(self, streams, count=None):
+        (key, last_id), = streams.items()
+        last = int(last_id.split('-')[0])
+        new = [entry for entry in self.entries if int(entry[0].split('-')[0]) > last][:count]
+        return [(key.encode(), new)] if new else []
+
+
+def test_revoked_token_is_blocked_until_it_expires():
+    blocklist = TokenBlocklist()
+    blocklist.revoke('abc', time.time() + 60)
+    blocklist.revoke('old', time.time() - 1)
+
+    assert blocklist.is_revoked('abc')
+    assert not blocklist.is_revoked('old')
+    assert not blocklist.is_revoked('other')
+
+    blocklist.purge()
+    assert blocklist.stats()['revoked_tokens'] == 1
+
+
+def test_revoke_user_blocks_tokens_issued_before_cutoff():
+    blocklist = TokenBlocklist()
+    issued_at = time.time() - 10
+    blocklist.revoke_user('alice')
+
+    assert blocklist.is_revoked('any', 'alice', issued_at)
+    assert not blocklist.is_revoked('any', 'alice', time.time() + 10)
+    assert not blocklist.is_revoked('any', 'bob', issued_at)
+
+
+def test_revocations_reach_other_workers_through_redis():
+    redis_client = FakeRedisStream()
+    worker_a = TokenBlocklist(redis_client, sync_interval=60)
+    worker_b = TokenBlocklist(redis_client, sync_interval=60)
+    assert not worker_b.is_revoked('abc')
+
+    worker_a.revoke('abc', time.time() + 60)
+    worker_a.revoke_user('alice')
+    assert not worker_b.is_revoked('abc')
+
+    worker_b.sync()
+    assert worker_b.is_revoked('abc')
+    assert worker_b.is_revoked('any', 'alice', time.time() - 10)
+    worker_a.stop()
+    worker_b.stop()
+
+
+def test_new_worker_catches_up_on_the_whole_stream():
+    redis_client = FakeRedisStream()
+    writer = TokenBlocklist(redis_client)
+    for n in range(SYNC_BATCH_SIZE * 2 + 10):
+        writer._publish({'jti': f'jti-{n}', 'exp': time.time() + 60})
+
+    worker = TokenBlocklist(redis_client, sync_interval=60)
+    assert worker.is_revoked(f'jti-{SYNC_BATCH_SIZE * 2 + 9}')
+    assert worker.stats()['revoked_tokens'] == SYNC_BATCH_SIZE * 2 + 10
+    worker.stop()
@@ -0,0 +1,41 @@
+import pytest
+from pydantic import BaseModel, Field
+
+from common.bulk import MAX_BULK_ITEMS, bulk_payload, chunked, parse_ids, row_results, validate_rows
+
+
+class Item(BaseModel):
+    name: str = Field(..., min_length=3)
+    price: float = Field(..., ge=0)
+
+
+def test_bulk_payload_accepts_array_or_wrapped_object():
+    assert bulk_payload([{'a': 1}]) == [{'a': 1}]
+    assert bulk_payload({'items': [{'a': 1}]}) == [{'a': 1}]
+    assert bulk_payload({'ids': [1, 2]}, key='ids') == [1, 2]
+
+
+@pytest.mark.parametrize('data', [None, [], {}, {'items': 'x'}, [{}] * (MAX_BULK_ITEMS + 1)])
+def test_bulk_payload_rejects_bad_input(data):
+    with pytest.raises(ValueError):
+        bulk_payload(data)
+
+
+def test_validate_rows_reports_errors_by_index():
+    valid, errors = validate_rows(Item, [{'name': 'good', 'price': 1}, {'name': 'x', 'price': 1}, {'name': 'fine', 'price': -1}])
+    assert len(valid) == 1
+    assert [error['index'] for error in errors] == [1, 2]
+
+
+def test_parse_ids():
+    assert parse_ids([1, {'id': 2}]) == [1, 2]
+    with pytest.raises(ValueError):
+        parse_ids([1, 'two'])
+
+
+def test_chunked_and_row_results():
+    assert list(chunked([1, 2, 3], 2)) == [[1, 2], [3]]
+    assert row_results([5, 6], {5}, 'deleted') == [
+        {'index': 0, 'id': 5, 'status': 'deleted'},
+        {'index': 1, 'id': 6, 'status': 'not_found'},
+    ]
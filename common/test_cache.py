@@ -0,0 +1,80 @@
+import time
+
+from common.cache import LRUCache, RedisCache, TwoTierCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class BrokenRedis:
+    def get(self, key):
+        raise ConnectionError("redis down")
+
+    set = delete = get
+
+
+def test_lru_hit_and_miss_counters():
+    cache = LRUCache(maxsize=2, ttl=60)
+    assert cache.get('1') is None
+    cache.set('1', {'id': 1})
+    assert cache.get('1') == {'id': 1}
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set('1', 1)
+    cache.set('2', 2)
+    cache.get('1')
+    cache.set('3', 3)
+
+    assert cache.get('2') is None
+    assert cache.get('1') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_entries_expire():
+    cache = LRUCache(maxsize=2, ttl=0.01)
+    cache.set('1', 1)
+    time.sleep(0.02)
+
+    assert cache.get('1') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_two_tier_promotes_redis_hits_and_invalidates_both():
+    redis_client = FakeRedis()
+    shared = RedisCache(redis_client, prefix='item:')
+    cache = TwoTierCache(LRUCache(), shared)
+    other_worker = TwoTierCache(LRUCache(), shared)
+
+    cache.set('7', {'id': 7})
+    assert other_worker.get('7') == {'id': 7}
+    assert other_worker.local.get('7') == {'id': 7}
+
+    cache.delete('7')
+    assert 'item:7' not in redis_client.data
+    assert cache.get('7') is None
+
+
+def test_redis_errors_count_as_misses():
+    cache = TwoTierCache(LRUCache(), RedisCache(BrokenRedis()))
+    cache.set('1', 1)
+    cache.local.clear()
+
+    assert cache.get('1') is None
+    assert cache.stats()['redis']['errors'] == 2
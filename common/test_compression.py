@@ -0,0 +1,101 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response, jsonify
+
+from common.compression import Compression, negotiate
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    compression = Compression(min_size=100, flush_size=50).init_app(app)
+    app.extensions['compression'] = compression
+
+    @app.route('/small')
+    def small():
+        return jsonify(ok=True)
+
+    @app.route('/large')
+    def large():
+        return jsonify(items=list(range(500)))
+
+    @app.route('/strong')
+    def strong():
+        response = jsonify(items=list(range(500)))
+        response.set_etag('1-3')
+        return response
+
+    @app.route('/progress')
+    def progress():
+        response = jsonify(items=list(range(500)))
+        response.cache_control.no_transform = True
+        return response
+
+    @app.route('/stream/<int:count>')
+    def stream(count):
+        cached = compression.cached_response('snapshot-%d' % count)
+        if cached is not None:
+            return cached
+
+        def lines():
+            for i in range(count):
+                yield json.dumps({"id": i}) + '\n'
+        return Response(lines(), mimetype='application/x-ndjson')
+
+    return app
+
+
+GZIP = {'Accept-Encoding': 'gzip, deflate'}
+
+
+def test_negotiate():
+    assert negotiate('gzip, deflate') == 'gzip'
+    assert negotiate('gzip;q=0, *;q=0.5', available=('gzip',)) is None
+    assert negotiate('br;q=0.5, gzip', available=('br', 'gzip')) == 'gzip'
+    assert negotiate('br, gzip', available=('br', 'gzip')) == 'br'
+    assert negotiate('*', available=('gzip',)) == 'gzip'
+    assert negotiate('identity') is None
+    assert negotiate(None) is None
+
+
+def test_large_bodies_are_compressed(app):
+    client = app.test_client()
+    response = client.get('/large', headers=GZIP)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data))['items'][-1] == 499
+
+    assert 'Content-Encoding' not in client.get('/large').headers
+    assert 'Content-Encoding' not in client.get('/small', headers=GZIP).headers
+    # a strong ETag names exact bytes, so those bodies are left alone
+    assert 'Content-Encoding' not in client.get('/strong', headers=GZIP).headers
+    assert 'Content-Encoding' not in client.get('/progress', headers=GZIP).headers
+
+
+def test_streams_are_compressed_incrementally(app):
+    client = app.test_client()
+    response = client.get('/stream/200', headers=GZIP, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    chunks = list(response.response)
+    assert len(chunks) > 2
+    lines = gzip.decompress(b''.join(chunks)).decode().splitlines()
+    assert json.loads(lines[-1]) == {"id": 199}
+
+    # a stream that ends under the threshold goes out uncompressed
+    response = client.get('/stream/2', headers=GZIP)
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.decode().count('\n') == 2
+
+
+def test_unchanged_snapshot_is_served_from_the_body_cache(app):
+    client = app.test_client()
+    first = client.get('/stream/200', headers=GZIP).data
+    second = client.get('/stream/200', headers=GZIP)
+    assert second.data == first
+    assert second.headers['Content-Encoding'] == 'gzip'
+    assert second.mimetype == 'application/x-ndjson'
+    stats = app.extensions['compression'].stats()
+    assert stats['cache_hits'] == 1 and stats['compressed'] == 1
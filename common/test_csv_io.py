@@ -0,0 +1,71 @@
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel, Field
+
+from common import csv_io
+from common.csv_io import csv_chunks, import_progress, read_csv_items
+from common.repository import RepositoryError
+
+
+class Item(BaseModel):
+    name: str = Field(..., min_length=3)
+    description: str
+    price: float = Field(..., ge=0)
+    created_at: Optional[str] = None
+
+
+def rows(count):
+    for i in range(count):
+        yield (i + 1, f'Item, "{i}"', 'multi\nline', Decimal('1.10'), datetime(2024, 1, 2, 3, 4, 5), None, 1)
+
+
+def csv_stream(text):
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def test_export_is_chunked_and_round_trips():
+    source = rows(5)
+    chunks = list(csv_chunks(source, ('id', 'name', 'description', 'price', 'created_at'), batch_size=2))
+    assert len(chunks) == 3
+    # the row source is closed with the export
+    assert source.gi_frame is None
+
+    text = ''.join(chunks)
+    assert text.startswith('id,name,description,price,created_at\r\n1,"Item, ""0""","multi\nline",1.10,2024-01-02T03:04:05')
+    items = [item for chunk in read_csv_items(csv_stream(text), Item) for item in chunk[0]]
+    assert len(items) == 5
+    assert (items[0].name, items[0].description, items[0].price) == ('Item, "0"', 'multi\nline', 1.1)
+
+
+def test_import_reports_invalid_rows_by_line():
+    text = '\ufeffname,price,description\r\nfirst,1,a\r\nx,2,b\r\nthird,-1,c\r\nfourth,4,d\r\n'
+    chunks = list(read_csv_items(csv_stream(text), Item, chunk_size=2))
+    assert [(len(items), line) for items, _, line in chunks] == [(1, 3), (1, 5)]
+    assert [error['line'] for _, errors, _ in chunks for error in errors] == [3, 4]
+
+    with pytest.raises(ValueError, match='description'):
+        read_csv_items(csv_stream('name,price\r\nfirst,1\r\n'), Item)
+
+
+def test_import_progress_lines(monkeypatch):
+    monkeypatch.setattr(csv_io, 'MAX_REPORTED_ERRORS', 1)
+    text = 'name,description,price\r\n' + 'ok item,d,1\r\n' * 3 + 'x,d,1\r\n' * 2
+    progress = [json.loads(line) for line in import_progress(
+        read_csv_items(csv_stream(text), Item, chunk_size=2), lambda items: items)]
+    assert progress[-1] == {"done": True, "imported": 3, "failed": 2}
+    assert [line['line'] for line in progress[:-1]] == [3, 5, 6]
+    assert sum(len(line['errors']) for line in progress[:-1]) == 1
+
+
+def test_import_stops_at_a_database_error():
+    def create_many(items):
+        raise RepositoryError("Database error: gone away")
+
+    text = 'name,description,price\r\nfirst,d,1\r\n'
+    progress = [json.loads(line) for line in import_progress(read_csv_items(csv_stream(text), Item), create_many)]
+    assert progress == [{"done": False, "line": 2, "imported": 0, "failed": 0, "error": "Database error: gone away"}]
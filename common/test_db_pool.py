@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+
+import pytest
+
+from common.db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.pings = 0
+        self.alive = True
+        self.in_transaction = False
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.alive:
+            raise Exception("gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def created():
+    return []
+
+
+def make_pool(created, **kwargs):
+    def creator():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+    return ConnectionPool(creator=creator, **kwargs)
+
+
+def test_connection_is_reused(created):
+    pool = make_pool(created, pool_size=2, max_overflow=0)
+    conn = pool.get_connection()
+    conn.close()
+    conn = pool.get_connection()
+    conn.close()
+
+    assert len(created) == 1
+    assert pool.stats()['idle'] == 1
+    assert pool.stats()['checkouts'] == 2
+
+
+def test_overflow_connections_are_closed_on_return(created):
+    pool = make_pool(created, pool_size=1, max_overflow=1)
+    first = pool.get_connection()
+    second = pool.get_connection()
+    assert pool.stats()['in_use'] == 2
+
+    first.close()
+    second.close()
+
+    assert pool.stats()['idle'] == 1
+    assert pool.stats()['total'] == 1
+    assert sum(c.closed for c in created) == 1
+
+
+def test_connections_out_during_dispose_are_closed_on_return(created):
+    pool = make_pool(created, pool_size=2, max_overflow=0)
+    idle, held = pool.get_connection(), pool.get_connection()
+    idle.close()
+    pool.dispose()
+    held.close()
+
+    assert all(c.closed for c in created)
+    assert pool.stats()['idle'] == 0 and pool.stats()['total'] == 0
+
+
+def test_checkout_times_out_when_exhausted(created):
+    pool = make_pool(created, pool_size=1, max_overflow=0, timeout=0.05)
+    conn = pool.get_connection()
+
+    with pytest.raises(PoolTimeout):
+        pool.get_connection()
+
+    assert pool.stats()['timeouts'] == 1
+    conn.close()
+
+
+def test_waiter_gets_released_connection(created):
+    pool = make_pool(created, pool_size=1, max_overflow=0, timeout=2)
+    conn = pool.get_connection()
+    threading.Timer(0.05, conn.close).start()
+
+    other = pool.get_connection()
+    assert other._conn is created[0]
+    assert pool.stats()['wait_time_max'] > 0
+    other.close()
+
+
+def test_dead_connection_is_replaced_after_ping(created):
+    pool = make_pool(created, pool_size=1, max_overflow=0, ping_interval=0)
+    conn = pool.get_connection()
+    conn.close()
+    created[0].alive = False
+
+    conn = pool.get_connection()
+    assert conn._conn is created[1]
+    assert pool.stats()['ping_failures'] == 1
+    conn.close()
+
+
+def test_old_connection_is_recycled(created):
+    pool = make_pool(created, pool_size=1, max_overflow=0, recycle=0.01)
+    pool.get_connection().close()
+    time.sleep(0.02)
+
+    conn = pool.get_connection()
+    assert created[0].closed
+    assert conn._conn is created[1]
+    assert pool.stats()['recycled'] == 1
+    conn.close()
+
+
+def test_open_transaction_is_rolled_back_on_return(created):
+    pool = make_pool(created, pool_size=1, max_overflow=0)
+    conn = pool.get_connection()
+    conn._conn.in_transaction = True
+    conn.close()
+
+    assert created[0].rollbacks == 1
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs os.fork")
+def test_forked_child_starts_with_an_empty_pool(created):
+    pool = make_pool(created, pool_size=2)
+    pool.get_connection().close()
+    assert pool.stats()['idle'] == 1
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # child: nothing inherited is handed out, a fresh connection is made
+        try:
+            conn = pool.get_connection()
+            ok = conn._conn is not created[0] and pool.stats()['total'] == 1
+            os.write(write_fd, b'1' if ok else b'0')
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    assert os.read(read_fd, 1) == b'1'
+    os.waitpid(pid, 0)
+    os.close(read_fd)
+    # the parent's pool is untouched
+    assert pool.stats()['idle'] == 1 and not created[0].closed
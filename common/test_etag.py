@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from flask import Flask, request
+
+from common.etag import collection_etag, if_match_version, item_cache_entry, item_entry_response, item_etag
+
+app = Flask(__name__)
+UPDATED_AT = datetime(2025, 1, 2, 3, 4, 5, 600000)
+
+
+def test_etags_change_with_version():
+    assert item_etag(1, 3) == item_etag(1, 3)
+    assert item_etag(1, 3) != item_etag(1, 4)
+    assert collection_etag(10, UPDATED_AT) != collection_etag(11, UPDATED_AT)
+    assert collection_etag(10, UPDATED_AT, 'limit=2') != collection_etag(10, UPDATED_AT, 'limit=3')
+
+
+def test_cached_entry_answers_if_none_match():
+    entry = item_cache_entry({'id': 1}, 1, UPDATED_AT, 1)
+
+    with app.test_request_context(headers={'If-None-Match': f'"{entry["etag"]}"'}):
+        response = item_entry_response(request, entry)
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+    with app.test_request_context(headers={'If-None-Match': 'W/"stale"'}):
+        response = item_entry_response(request, entry)
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{entry["etag"]}"'
+
+
+def test_cached_entry_answers_if_modified_since():
+    entry = item_cache_entry({'id': 1}, 1, UPDATED_AT, 1)
+
+    with app.test_request_context(headers={'If-Modified-Since': 'Thu, 02 Jan 2025 03:04:05 GMT'}):
+        assert item_entry_response(request, entry).status_code == 304
+
+    with app.test_request_context(headers={'If-Modified-Since': 'Thu, 02 Jan 2025 03:04:04 GMT'}):
+        assert item_entry_response(request, entry).status_code == 200
+
+
+def test_if_match_maps_to_a_row_version():
+    with app.test_request_context():
+        assert if_match_version(request, 7) == (False, None)
+    with app.test_request_context(headers={'If-Match': '*'}):
+        assert if_match_version(request, 7) == (True, None)
+    with app.test_request_context(headers={'If-Match': f'"{item_etag(7, 3)}"'}):
+        assert if_match_version(request, 7) == (True, 3)
+    # other items' tags and weak tags never match
+    with app.test_request_context(headers={'If-Match': f'"{item_etag(8, 3)}", W/"{item_etag(7, 3)}"'}):
+        assert if_match_version(request, 7) == (True, 0)
@@ -0,0 +1,98 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from common import filters
+from common.filters import ItemQuery
+from common.pagination import decode_cursor_state
+
+ROW = (7, 'Widget', 'A widget', Decimal('19.99'), datetime(2025, 1, 1, 12, 0), datetime(2025, 1, 1, 12, 0))
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=()):
+        pass
+
+    def fetchone(self):
+        return (self.rows,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+
+def test_default_query_is_plain_keyset_on_id():
+    sql, params = ItemQuery.from_args({}).page_sql(10)
+    assert sql == "SELECT * FROM items ORDER BY id LIMIT %s"
+    assert params == (11,)
+
+
+def test_select_narrows_the_column_list():
+    query = ItemQuery.from_args({'sort': 'price'}).select(('id', 'name'))
+    sql, _ = query.stream_sql()
+    assert sql.startswith("SELECT id, name, NULL AS description, price, NULL AS created_at, NULL AS updated_at, "
+                          "NULL AS version FROM items")
+    assert ItemQuery().select(None).page_sql(1)[0].startswith("SELECT * FROM")
+
+
+def test_filters_are_parameterized():
+    query = ItemQuery.from_args({'name_prefix': '50%_off', 'sort': 'name'})
+    sql, params = query.page_sql(10)
+    assert "name LIKE %s" in sql
+    assert params[0] == '50\\%\\_off%'
+
+
+def test_single_filter_picks_its_column_as_sort():
+    query = ItemQuery.from_args({'min_price': '5', 'max_price': '10'})
+    assert query.sort == 'price'
+    assert query.residual_columns() == []
+    sql, params = query.page_sql(10)
+    assert sql.endswith("ORDER BY price, id LIMIT %s")
+    assert params == (Decimal('5'), Decimal('10'), 11)
+
+
+def test_descending_keyset_round_trip():
+    query = ItemQuery.from_args({'sort': '-price'})
+    page, cursor = query.split_page([ROW, ROW], 1)
+    assert decode_cursor_state(cursor) == (7, '19.99', '-price')
+
+    next_query = ItemQuery.from_args({'sort': '-price', 'after': cursor})
+    sql, params = next_query.page_sql(10)
+    assert "(price < %s OR (price = %s AND id < %s))" in sql
+    assert sql.endswith("ORDER BY price DESC, id DESC LIMIT %s")
+    assert params == (Decimal('19.99'), Decimal('19.99'), 7, 11)
+
+
+@pytest.mark.parametrize('args', [{'sort': 'description'}, {'min_price': 'cheap'}, {'created_after': 'yesterday'}])
+def test_invalid_arguments_are_rejected(args):
+    with pytest.raises(ValueError):
+        ItemQuery.from_args(args)
+
+
+def test_cursor_must_match_sort():
+    _, cursor = ItemQuery.from_args({'sort': 'price'}).split_page([ROW, ROW], 1)
+    with pytest.raises(ValueError):
+        ItemQuery.from_args({'sort': 'name', 'after': cursor})
+
+
+def test_residual_filter_is_refused_on_large_tables(monkeypatch):
+    query = ItemQuery.from_args({'name_prefix': 'Wid', 'sort': 'price'})
+    assert query.residual_columns() == ['name']
+
+    monkeypatch.setattr(filters, '_table_estimate', {'rows': None, 'at': 0.0})
+    query.ensure_indexed(FakeConnection(10), large_table_rows=100)
+
+    monkeypatch.setattr(filters, '_table_estimate', {'rows': None, 'at': 0.0})
+    with pytest.raises(ValueError):
+        query.ensure_indexed(FakeConnection(1000), large_table_rows=100)
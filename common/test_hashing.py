@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import pytest
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+
+from common.hashing import HasherBusy, PasswordHasher
+
+
+def test_werkzeug_hash_and_verify_in_process_pool():
+    hasher = PasswordHasher(scheme='werkzeug', method='pbkdf2:sha256:1000', workers=1)
+    try:
+        hashed = hasher.hash('password123')
+        assert hasher.verify(hashed, 'password123')
+        assert not hasher.verify(hashed, 'wrong')
+    finally:
+        hasher.shutdown()
+
+
+def test_bcrypt_rehash_when_rounds_change():
+    old = PasswordHasher(scheme='bcrypt', rounds=4, workers=0)
+    new = PasswordHasher(scheme='bcrypt', rounds=5, workers=0)
+    hashed = old.hash('password123')
+
+    assert not old.needs_rehash(hashed)
+    assert old.rehash_if_needed(hashed, 'password123') is None
+
+    rehashed = new.rehash_if_needed(hashed, 'password123')
+    assert rehashed and not new.needs_rehash(rehashed)
+    assert new.verify(rehashed, 'password123')
+
+
+def test_werkzeug_rehash_when_method_changes():
+    old = PasswordHasher(method='pbkdf2:sha256:1000', workers=0)
+    new = PasswordHasher(method='pbkdf2:sha256:2000', workers=0)
+    hashed = old.hash('password123')
+
+    assert not old.needs_rehash(hashed)
+    assert new.needs_rehash(hashed)
+
+
+def test_werkzeug_method_defaults_do_not_force_a_rehash():
+    hasher = PasswordHasher(method='pbkdf2:sha256', workers=0)
+    assert not hasher.needs_rehash(f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}$salt$hash')
+    assert hasher.needs_rehash('pbkdf2:sha256:1000$salt$hash')
+    assert not PasswordHasher(method='scrypt', workers=0).needs_rehash('scrypt:32768:8:1$salt$hash')
+
+
+def test_saturated_hasher_fails_fast():
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=0, max_pending=0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow(*args):
+        started.set()
+        release.wait(2)
+
+    thread = threading.Thread(target=hasher._run, args=(slow,))
+    thread.start()
+    started.wait(2)
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.hash('password123')
+        assert hasher.stats()['rejected'] == 1
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_async_hash_and_verify():
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=0)
+
+    async def round_trip():
+        hashed = await hasher.hash_async('password123')
+        return await hasher.verify_async(hashed, 'password123'), await hasher.verify_async(hashed, 'wrong')
+
+    assert asyncio.run(round_trip()) == (True, False)
+    assert hasher.stats()['in_flight'] == 0
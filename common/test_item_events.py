@@ -0,0 +1,153 @@
+import json
+import queue
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from common.cache import LRUCache
+from common.item_events import EventsRepository, ItemEvents
+from common.repository import MemoryItemRepository
+
+
+# One Redis server's pub/sub: publishes fan out to every subscribed connection
+class FakeRedis:
+    def __init__(self):
+        self.subscribers = []
+        self.down = False
+
+    def publish(self, channel, message):
+        if self.down:
+            raise ConnectionError("redis is down")
+        for pubsub in list(self.subscribers):
+            if channel in pubsub.channels:
+                pubsub.messages.put({'type': 'message', 'channel': channel, 'data': message.encode()})
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def publish(self, channel, message):
+        self.commands.append((channel, message))
+
+    def execute(self):
+        for channel, message in self.commands:
+            self.redis.publish(channel, message)
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.channels = set()
+        self.messages = queue.Queue()
+
+    def subscribe(self, channel):
+        self.channels.add(channel)
+        self.redis.subscribers.append(self)
+        self.messages.put({'type': 'subscribe', 'channel': channel, 'data': 1})
+
+    def get_message(self, timeout=0.0):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if self in self.redis.subscribers:
+            self.redis.subscribers.remove(self)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def item(price, id=None):
+    return SimpleNamespace(id=id, name='item', description='', price=Decimal(price))
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def workers(redis):
+    started = []
+
+    def worker():
+        events = ItemEvents(redis, LRUCache(), poll_interval=0.01, retry_interval=0.01)
+        events.ensure_started()
+        started.append(events)
+        wait_until(lambda: events.flushes == 1)
+        return events
+    yield worker
+    for events in started:
+        events.stop()
+
+
+def test_writes_evict_the_item_on_other_workers(redis, workers):
+    a, b = workers(), workers()
+    repository = EventsRepository(MemoryItemRepository(), a)
+    ids = repository.create_many([item('1.00'), item('2.00')])
+    for events in (a, b):
+        events.cache.set(str(ids[0]), 'cached')
+
+    assert repository.update(ids[0], 'renamed', '', Decimal('3.00'))
+    wait_until(lambda: b.stats()['evicted'] == 1)
+    assert b.cache.get(str(ids[0])) is None
+    # the writer's own events are skipped (its route already evicted)
+    assert a.cache.get(str(ids[0])) == 'cached'
+    assert a.stats()['published'] == 3 and b.stats()['received'] == 3
+
+    # failed writes publish nothing
+    assert not repository.update(ids[0], 'x', '', Decimal('1'), version=42)
+    assert not repository.delete(999)
+    assert a.stats()['published'] == 3
+
+
+def test_missed_events_flush_the_local_cache(redis, workers):
+    a, b = workers(), workers()
+    a.publish('update', [1])
+    wait_until(lambda: b.received == 1)
+    b.cache.set('2', 'cached')
+
+    # an event lost on the way leaves a gap in a's numbering
+    redis.down = True
+    a.publish('update', [2])
+    redis.down = False
+    a.publish('update', [3])
+    wait_until(lambda: b.received == 2)
+    assert b.cache.get('2') is None
+    assert (b.missed, b.flushes, a.publish_errors) == (1, 2, 1)
+
+
+def test_subscriber_resubscribes_after_a_failure(redis, workers):
+    b = workers()
+    b.cache.set('1', 'cached')
+    pubsub = redis.subscribers[0]
+    pubsub.get_message = lambda timeout=0.0: (_ for _ in ()).throw(ConnectionError("connection lost"))
+
+    wait_until(lambda: b.flushes == 2)
+    assert b.subscribe_errors == 1
+    assert b.cache.get('1') is None
+    assert len(redis.subscribers) == 1
+
+
+def test_apply_ignores_malformed_payloads():
+    events = ItemEvents(cache=LRUCache())
+    assert not events.apply(b'not json')
+    assert not events.apply(json.dumps({"op": "update"}))
+    assert events.apply(json.dumps({"node": "n1", "seq": 1, "op": "delete", "id": 5, "version": None}))
+    assert events.stats()['received'] == 1
@@ -0,0 +1,96 @@
+import json
+
+from common.item_events import ItemEvents
+from common.item_feed import ItemFeed
+
+
+def change(item_id, op='update', version=None):
+    return {"node": "n1", "seq": item_id, "op": op, "id": item_id, "version": version}
+
+
+def parse(chunk):
+    fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+    return fields['id'], fields['event'], json.loads(fields['data'])
+
+
+def drain(subscription):
+    chunks = []
+    while subscription.backlog() or subscription._pending:
+        chunks.append(subscription.next_chunk())
+    return chunks
+
+
+def test_events_fan_out_to_every_client():
+    feed = ItemFeed(heartbeat=0.01)
+    a, b = feed.subscribe(), feed.subscribe()
+    feed.notify(change(1, 'create', 1))
+    feed.notify(change(1, 'delete'))
+
+    for subscription in (a, b):
+        chunks = drain(subscription)
+        assert chunks[0] == 'retry: 3000\n\n'
+        assert [parse(chunk)[1:] for chunk in chunks[1:]] == [
+            ('create', {"id": 1, "op": "create", "version": 1}), ('delete', {"id": 1, "op": "delete", "version": None})]
+    assert a.next_chunk() == ': keepalive\n\n'
+    assert feed.stats()['clients'] == 2 and feed.stats()['delivered'] == 4
+
+
+def test_last_event_id_resumes_from_the_buffer():
+    feed = ItemFeed(buffer_size=3)
+    first = feed.subscribe()
+    for item_id in range(1, 4):
+        feed.notify(change(item_id))
+    chunks = drain(first)
+    last_id = parse(chunks[2])[0]
+    first.close()
+
+    feed.notify(change(4))
+    resumed = feed.subscribe(last_id)
+    assert [parse(chunk)[2]['id'] for chunk in drain(resumed)[1:]] == [3, 4]
+
+    # scrolled out of the buffer, or from another worker: reload
+    for item_id in (5, 6, 7):
+        feed.notify(change(item_id))
+    assert parse(drain(feed.subscribe(last_id))[1])[1] == 'reset'
+    assert parse(drain(feed.subscribe('otherstream-4'))[1])[1] == 'reset'
+
+
+def test_lost_upstream_events_reset_clients():
+    feed = ItemFeed()
+    events = ItemEvents()
+    events.add_listener(feed.notify)
+    subscription = feed.subscribe()
+    # without Redis, publishes reach listeners directly
+    events.publish('update', [7], version=2)
+    events.flush()
+    chunks = drain(subscription)
+    assert parse(chunks[1])[2] == {"id": 7, "op": "update", "version": 2}
+    assert parse(chunks[2])[1] == 'reset'
+    # resuming from before the loss can't be replayed
+    assert parse(drain(feed.subscribe(parse(chunks[1])[0]))[1])[1] == 'reset'
+    assert feed.stats()['resets'] == 1
+
+
+def test_slow_clients_are_disconnected_and_limited():
+    feed = ItemFeed(queue_size=2, max_clients=1)
+    slow = feed.subscribe()
+    assert feed.subscribe() is None
+    for item_id in range(1, 5):
+        feed.notify(change(item_id))
+    stats = feed.stats()
+    assert (stats['clients'], stats['overflows'], stats['rejected']) == (0, 1, 1)
+
+    # it still gets what was queued, then the stream ends
+    chunks = list(slow.chunks())
+    assert len(chunks) == 3
+    assert feed.subscribe() is not None
+
+
+def test_close_all_ends_streams_after_queued_events():
+    feed = ItemFeed(heartbeat=60)
+    subscription = feed.subscribe()
+    feed.notify(change(1))
+    feed.close_all()
+    chunks = list(subscription.chunks())
+    assert [chunk.split('\n')[1] for chunk in chunks[1:]] == ['event: update']
+    assert feed.subscribe() is None
@@ -0,0 +1,103 @@
+import math
+import random
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from common.item_stats import ItemStats, PriceSketch, StatsRepository
+from common.repository import MemoryItemRepository
+
+
+def item(price, id=None):
+    return SimpleNamespace(id=id, name='item', description='', price=Decimal(price))
+
+
+@pytest.fixture
+def stats():
+    stats = ItemStats(MemoryItemRepository(), reconcile_interval=3600)
+    yield stats
+    stats.close()
+
+
+def test_sketch_quantiles_are_within_relative_accuracy():
+    rng = random.Random(7)
+    values = sorted(round(rng.lognormvariate(3, 1.5), 2) for _ in range(5000))
+    sketch = PriceSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.5, 0.9, 0.99):
+        exact = values[math.ceil(q * len(values)) - 1]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.011)
+
+    # values can be taken back out
+    for value in values[len(values) // 2:]:
+        sketch.remove(value)
+    assert sketch.count == len(values) // 2
+    assert sketch.highest() == pytest.approx(values[len(values) // 2 - 1], rel=0.011)
+
+
+def test_writes_update_the_aggregate(stats):
+    repository = StatsRepository(stats.repository, stats)
+    assert stats.snapshot()['count'] == 0
+
+    ids = repository.create_many([item('1.00'), item('2.00'), item('3.00')])
+    repository.create('big', '', Decimal('10.00'))
+    snapshot = stats.snapshot()
+    assert (snapshot['count'], snapshot['sum'], snapshot['min'], snapshot['max']) == (4, 16.0, 1.0, 10.0)
+    assert snapshot['avg'] == 4.0
+
+    assert repository.update(ids[0], 'cheap', '', Decimal('0.50'))
+    assert repository.delete(ids[2])
+    snapshot = stats.snapshot()
+    assert (snapshot['count'], snapshot['sum'], snapshot['min']) == (3, 12.5, 0.5)
+    assert snapshot['percentiles']['p50'] == pytest.approx(2.0, rel=0.011)
+
+    # a failed conditional update changes nothing
+    assert not repository.update(ids[1], 'x', '', Decimal('99'), version=42)
+    assert stats.snapshot()['max'] == 10.0
+
+
+def test_bulk_writes_apply_deltas_without_a_rescan(stats):
+    repository = StatsRepository(stats.repository, stats)
+    stats.snapshot()
+    reconciliations = stats.stats()['reconciliations']
+    ids = repository.create_many([item('1.00'), item('2.00'), item('3.00')])
+
+    # the same id twice: the second update replaces the first one's price
+    repository.update_many([item('5.00', id=ids[0]), item('7.00', id=ids[0]), item('9.00', id=ids[1])])
+    repository.delete_many([ids[2], ids[2] + 100])
+    snapshot = stats.snapshot()
+    assert (snapshot['count'], snapshot['sum'], snapshot['max']) == (2, 16.0, 9.0)
+    assert stats.stats()['reconciliations'] == reconciliations
+
+
+def test_percentiles_stay_within_min_and_max(stats):
+    repository = StatsRepository(stats.repository, stats)
+    stats.snapshot()
+    repository.create_many([item('29.99')] * 100)
+    snapshot = stats.snapshot()
+    assert all(value == 29.99 for value in snapshot['percentiles'].values())
+
+
+def test_removed_extreme_falls_back_to_the_sketch_until_reconciled(stats):
+    repository = StatsRepository(stats.repository, stats)
+    stats.snapshot()
+    ids = repository.create_many([item('1.00'), item('5.00'), item('20.00')])
+    repository.delete(ids[2])
+    assert stats.snapshot()['max'] == pytest.approx(5.0, rel=0.011)
+
+    assert stats.reconcile()
+    assert stats.snapshot()['max'] == 5.0
+
+
+def test_reconcile_corrects_drift(stats):
+    stats.snapshot()
+    # writes made by another worker, which this one never saw
+    stats.repository.create_many([item('4.00'), item('6.00')])
+    assert stats.snapshot()['count'] == 0
+
+    assert stats.reconcile()
+    snapshot = stats.snapshot()
+    assert (snapshot['count'], snapshot['avg']) == (2, 5.0)
+    assert stats.stats()['last_drift'] == -2
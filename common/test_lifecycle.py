@@ -0,0 +1,30 @@
+from flask import Flask
+
+from common.lifecycle import Lifecycle
+
+
+def test_hooks_run_by_stage_and_survive_failures():
+    calls = []
+    lifecycle = Lifecycle().init_app(Flask(__name__))
+
+    @lifecycle.on_shutdown
+    def broken():
+        raise RuntimeError("pool already closed")
+
+    lifecycle.on_startup(lambda: calls.append('startup'))
+    lifecycle.on_worker_start(lambda: calls.append('worker_start'))
+    lifecycle.on_drain(lambda: calls.append('drain'))
+    lifecycle.on_shutdown(lambda: calls.append('shutdown'))
+
+    lifecycle.startup()
+    lifecycle.worker_start()
+    lifecycle.drain()
+    lifecycle.shutdown()
+    lifecycle.shutdown()
+    assert calls == ['startup', 'worker_start', 'drain', 'shutdown']
+
+
+def test_registered_on_the_app():
+    app = Flask(__name__)
+    lifecycle = Lifecycle().init_app(app)
+    assert app.extensions['lifecycle'] is lifecycle
@@ -0,0 +1,120 @@
+import asyncio
+
+from flask import Flask, jsonify
+
+from common.metrics import Metrics, TimedConnection, timed
+
+
+class FakeCursor:
+    def execute(self, sql, params=None):
+        self.sql = sql
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def make_app():
+    app = Flask(__name__)
+    metrics = Metrics().init_app(app)
+
+    @app.route('/items/<int:id>')
+    def get_item(id):
+        with timed('validation'):
+            pass
+        conn = TimedConnection(FakeConnection())
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        rows = cursor.fetchall()
+        conn.close()
+        return jsonify(id=id, rows=rows)
+
+    return app, metrics
+
+
+def test_timed_is_a_no_op_outside_requests():
+    with timed('db'):
+        pass
+
+
+def test_requests_are_recorded_per_route_template():
+    app, metrics = make_app()
+    client = app.test_client()
+    client.get('/items/1')
+    client.get('/items/2')
+    client.get('/missing')
+
+    text = metrics.render()
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="/items/<int:id>",status="200"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="unmatched",status="404"} 1' in text
+    for phase in ('db', 'validation', 'serialization'):
+        assert f'http_request_phase_seconds_count{{endpoint="/items/<int:id>",phase="{phase}"}} 2' in text
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    app, metrics = make_app()
+    metrics.add_gauges('pool', lambda: {"in_use": 1, "wait_time_avg": 0.5, "name": "x"})
+    client = app.test_client()
+    client.get('/items/1')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    text = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'le="+Inf"} 1' in text
+    assert 'pool_in_use 1' in text
+    assert 'pool_wait_time_avg 0.5' in text
+    assert 'pool_name' not in text
+    # scrapes themselves aren't recorded
+    assert 'endpoint="/metrics"' not in text
+
+
+def test_buckets_are_cumulative():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    for duration in (0.05, 0.5, 5.0):
+        metrics.observe_request('GET', '/x', 200, duration)
+
+    text = metrics.render()
+    assert 'le="0.1"} 1' in text
+    assert 'le="1.0"} 2' in text
+    assert 'le="+Inf"} 3' in text
+
+
+def test_quart_apps_are_instrumented():
+    from quart import Quart
+
+    app = Quart(__name__)
+    metrics = Metrics().init_app(app)
+
+    @app.route('/ping')
+    async def ping():
+        with timed('db'):
+            await asyncio.sleep(0)
+        return {"ok": True}
+
+    async def run():
+        client = app.test_client()
+        await client.get('/ping')
+        response = await client.get('/metrics')
+        return await response.get_data(as_text=True)
+
+    text = asyncio.run(run())
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="/ping",status="200"} 1' in text
+    assert 'http_request_phase_seconds_count{endpoint="/ping",phase="db"} 1' in text
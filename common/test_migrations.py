@@ -0,0 +1,84 @@
+import re
+
+from common.migrations import MIGRATIONS, migrate, pending_migrations
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = None
+
+    def execute(self, sql, params=()):
+        self.db.statements.append(sql)
+        if sql.startswith("SELECT GET_LOCK"):
+            self.result = (1,)
+        elif sql.startswith("SELECT MAX(version)"):
+            self.result = (max(self.db.versions, default=None),)
+        elif sql.startswith("INSERT INTO schema_version"):
+            self.db.versions.append(params[0])
+        elif "information_schema" in sql:
+            self.result = (1,) if params in self.db.schema else None
+        elif self.db.fail_on and self.db.fail_on in sql:
+            raise RuntimeError("lost connection")
+        else:
+            match = (re.match(r"CREATE (?:UNIQUE )?INDEX (\w+) ON (\w+)", sql)
+                     or re.match(r"ALTER TABLE (\w+) ADD COLUMN (\w+)", sql))
+            if match:
+                name, table = match.groups() if sql.startswith("CREATE") else match.groups()[::-1]
+                self.db.schema.add((table, name))
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.versions = []
+        self.schema = set()
+        self.fail_on = None
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+
+def test_versions_are_unique_and_ascending():
+    versions = [m[0] for m in MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+
+def test_pending_migrations_respects_target():
+    assert [m[0] for m in pending_migrations(0, target=2)] == [1, 2]
+    assert pending_migrations(MIGRATIONS[-1][0]) == []
+
+
+def test_migrate_is_a_noop_when_up_to_date():
+    conn = FakeConnection()
+    assert migrate(conn) == [m[0] for m in MIGRATIONS]
+
+    conn.statements.clear()
+    assert migrate(conn) == []
+    assert not any(sql.strip().startswith(('CREATE INDEX', 'CREATE UNIQUE')) for sql in conn.statements)
+
+
+def test_rerun_resumes_a_half_applied_migration():
+    conn = FakeConnection()
+    migrate(conn, target=3)
+    conn.fail_on = "idx_items_updated_at"
+    try:
+        migrate(conn, target=4)
+    except RuntimeError:
+        pass
+    assert ('items', 'updated_at') in conn.schema and max(conn.versions) == 3
+
+    conn.fail_on = None
+    conn.statements.clear()
+    assert migrate(conn, target=4) == [4]
+    assert not any(sql.startswith("ALTER TABLE") for sql in conn.statements)
+    assert ('items', 'idx_items_updated_at') in conn.schema
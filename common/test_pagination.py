@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from common.pagination import (MAX_PAGE_SIZE, decode_cursor, decode_cursor_state, encode_cursor,
+                               json_array_chunks, ndjson_lines, parse_page_args)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+
+
+def test_cursor_carries_sort_key():
+    assert decode_cursor_state(encode_cursor(7, '19.99', '-price')) == (7, '19.99', '-price')
+    assert decode_cursor_state(encode_cursor(7)) == (7, None, None)
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_parse_page_args_defaults():
+    limit, after_id, stream = parse_page_args({})
+    assert limit > 0
+    assert after_id == 0
+    assert stream is None
+
+
+@pytest.mark.parametrize('args', [{'limit': '0'}, {'limit': str(MAX_PAGE_SIZE + 1)}, {'limit': 'abc'}, {'stream': 'xml'}])
+def test_parse_page_args_rejects_bad_input(args):
+    with pytest.raises(ValueError):
+        parse_page_args(args)
+
+
+def test_streamed_bodies_are_valid_json():
+    rows = [(1,), (2,)]
+    to_dict = lambda row: {'id': row[0]}
+
+    lines = ''.join(ndjson_lines(rows, to_dict)).splitlines()
+    assert [json.loads(line)['id'] for line in lines] == [1, 2]
+
+    assert json.loads(''.join(json_array_chunks(rows, to_dict))) == {'items': [{'id': 1}, {'id': 2}]}
+    assert json.loads(''.join(json_array_chunks([], to_dict))) == {'items': []}
@@ -0,0 +1,121 @@
+import pytest
+
+from werkzeug.test import EnvironBuilder
+
+from common.ratelimit import (LocalRateLimiter, RateLimit, RedisRateLimiter, client_address, parse_rate_limit,
+                              retry_after_header)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+# Runs the token-bucket script's logic in Python against one shared dict, the
+# way a single Redis server serializes every worker's calls
+class FakeRedisScripts:
+    def __init__(self, clock):
+        self.clock = clock
+        self.hashes = {}
+        self.calls = []
+
+    def register_script(self, source):
+        assert "redis.call('TIME')" in source
+        return self.run
+
+    def run(self, keys, args):
+        self.calls.append((keys, args))
+        rate, burst, cost = (float(arg) for arg in args)
+        now = self.clock()
+        tokens, updated = self.hashes.get(keys[0], (burst, now))
+        tokens = min(burst, tokens + max(0, now - updated) * rate)
+        retry_after = 0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / rate
+        self.hashes[keys[0]] = (tokens, now)
+        return str(retry_after).encode()
+
+
+class BrokenRedis:
+    def register_script(self, source):
+        def run(keys, args):
+            raise ConnectionError("redis is down")
+        return run
+
+
+def test_parse():
+    limit = RateLimit.parse('10/minute')
+    assert limit.burst == 10 and limit.rate == pytest.approx(10 / 60)
+    assert RateLimit.parse('3').rate == 3
+    assert parse_rate_limit('off') is None and parse_rate_limit('') is None
+    for spec in ('ten/minute', '10/fortnight', '0/second'):
+        with pytest.raises(ValueError):
+            RateLimit.parse(spec)
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    limiter = LocalRateLimiter(clock=clock)
+    limit = RateLimit.parse('3/minute')
+
+    assert [limiter.hit('ip:1', limit) for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit('ip:1', limit) == pytest.approx(20)
+    # other keys have their own bucket
+    assert limiter.hit('ip:2', limit) == 0
+
+    clock.now += 20
+    assert limiter.hit('ip:1', limit) == 0
+    assert limiter.hit('ip:1', limit) > 0
+    assert limiter.stats()['limited'] == 2
+
+
+def test_buckets_are_bounded():
+    limiter = LocalRateLimiter(max_keys=2, clock=FakeClock())
+    limit = RateLimit.parse('1/minute')
+    for key in ('a', 'b', 'c'):
+        limiter.hit(key, limit)
+    assert limiter.stats()['buckets'] == 2
+    # the evicted bucket starts full again
+    assert limiter.hit('a', limit) == 0
+
+
+def test_redis_limit_is_shared_between_workers():
+    clock = FakeClock()
+    redis_client = FakeRedisScripts(clock)
+    worker_a = RedisRateLimiter(redis_client)
+    worker_b = RedisRateLimiter(redis_client)
+    limit = RateLimit.parse('2/minute')
+
+    assert worker_a.hit('login:user:alice', limit) == 0
+    assert worker_b.hit('login:user:alice', limit) == 0
+    assert worker_a.hit('login:user:alice', limit) == pytest.approx(30)
+    assert redis_client.calls[0][0] == ['ratelimit:login:user:alice']
+    assert worker_a.stats() == {"backend": "redis", "allowed": 1, "limited": 1, "errors": 0}
+
+
+def test_redis_outage_falls_back_to_local_buckets():
+    limiter = RedisRateLimiter(BrokenRedis(), fallback=LocalRateLimiter(clock=FakeClock()))
+    limit = RateLimit.parse('1/minute')
+    assert limiter.hit('ip:1', limit) == 0
+    assert limiter.hit('ip:1', limit) > 0
+    assert limiter.stats()['errors'] == 2
+
+
+def test_retry_after_header_rounds_up():
+    assert retry_after_header(0.2) == {'Retry-After': '1'}
+    assert retry_after_header(20.01) == {'Retry-After': '21'}
+
+
+def test_client_address_trusts_only_the_configured_proxies():
+    request = EnvironBuilder(headers={'X-Forwarded-For': 'spoofed, 203.0.113.7'},
+                             environ_base={'REMOTE_ADDR': '10.0.0.1'}).get_request()
+    assert client_address(request) == '10.0.0.1'
+    assert client_address(request, trusted_proxies=1) == '203.0.113.7'
+    assert client_address(request, trusted_proxies=2) == 'spoofed'
+    # fewer hops than proxies: the header can't be right, use the peer
+    assert client_address(request, trusted_proxies=3) == '10.0.0.1'
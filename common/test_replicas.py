@@ -0,0 +1,145 @@
+import time
+
+import mysql.connector
+import pytest
+
+from common.db_pool import ConnectionPool
+from common.replicas import ReplicaRouter, parse_hosts, replica_lag_seconds
+
+
+class NamedConnection:
+    def __init__(self, name):
+        self.name = name
+
+    def close(self):
+        pass
+
+
+def pool(name, pool_size=2):
+    return ConnectionPool(pool_size=pool_size, max_overflow=0, timeout=0.1, ping_interval=None,
+                          creator=lambda: NamedConnection(name))
+
+
+def failing_pool():
+    def connect():
+        raise mysql.connector.InterfaceError(msg="Can't connect")
+    return ConnectionPool(pool_size=1, max_overflow=0, creator=connect)
+
+
+def read_from(router, client=None):
+    conn = router.get_connection(client)
+    try:
+        return conn.name
+    finally:
+        conn.close()
+
+
+def lags(**values):
+    return lambda conn: values[conn.name]
+
+
+def checked(router):
+    router.check_lag()
+    return router
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_without_replicas_reads_use_the_primary():
+    router = ReplicaRouter(pool('primary'))
+    assert read_from(router) == 'primary'
+    assert router.stats()['primary_reads'] == 1
+
+
+def test_round_robin_over_healthy_replicas():
+    router = checked(ReplicaRouter(pool('primary'), {'r1': pool('r1'), 'r2': pool('r2')}, strategy='round_robin',
+                                   lag_fn=lags(r1=0, r2=1)))
+    assert {read_from(router) for _ in range(4)} == {'r1', 'r2'}
+    assert router.stats()['replica_reads'] == 4
+
+
+def test_least_busy_prefers_the_idlest_replica():
+    r1, r2 = pool('r1'), pool('r2')
+    router = checked(ReplicaRouter(pool('primary'), {'r1': r1, 'r2': r2}, lag_fn=lags(r1=0, r2=0)))
+    held = r1.get_connection()
+    assert read_from(router) == 'r2'
+    held.close()
+
+
+def test_lagging_replicas_fall_back_to_the_primary():
+    router = checked(ReplicaRouter(pool('primary'), {'r1': pool('r1'), 'r2': pool('r2')}, max_lag=5,
+                                   lag_fn=lags(r1=30, r2=None)))
+    assert read_from(router) == 'primary'
+    stats = router.stats()
+    assert stats['healthy_replicas'] == 0
+    assert stats['fallback_reads'] == 1
+    assert stats['max_lag_seconds'] == 30
+
+
+def test_lag_is_checked_in_the_background():
+    values = {'r1': 30}
+    router = ReplicaRouter(pool('primary'), {'r1': pool('r1')}, check_interval=0.01,
+                           lag_fn=lambda conn: values[conn.name])
+    # nothing is known yet, so the first read goes to the primary without waiting
+    assert read_from(router) == 'primary'
+    values['r1'] = 1
+    wait_until(lambda: router.stats()['healthy_replicas'] == 1)
+    assert read_from(router) == 'r1'
+    router.dispose()
+
+
+def test_writers_are_pinned_to_the_primary():
+    router = checked(ReplicaRouter(pool('primary'), {'r1': pool('r1')}, sticky_seconds=60, lag_fn=lags(r1=0)))
+    router.note_write('alice')
+    assert read_from(router, 'alice') == 'primary'
+    assert read_from(router, 'bob') == 'r1'
+    assert router.stats()['pinned_reads'] == 1
+
+
+def test_unreachable_replica_falls_back():
+    router = checked(ReplicaRouter(pool('primary'), {'r1': failing_pool()}, lag_fn=lags(r1=0)))
+    assert read_from(router) == 'primary'
+    assert router.stats()['replica_errors'] >= 1
+
+
+class StatusCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql):
+        if sql == "SHOW REPLICA STATUS" and self.rows is None:
+            raise mysql.connector.ProgrammingError(msg="syntax error")
+        self.sql = sql
+
+    def fetchall(self):
+        return self.rows or [{'Seconds_Behind_Master': 3}]
+
+    def close(self):
+        pass
+
+
+class StatusConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, dictionary=False):
+        return StatusCursor(self.rows)
+
+
+@pytest.mark.parametrize('rows, expected', [
+    ([{'Seconds_Behind_Source': 2}, {'Seconds_Behind_Source': 7}], 7),
+    ([{'Seconds_Behind_Source': None}], None),
+    (None, 3),
+])
+def test_replica_lag_seconds(rows, expected):
+    assert replica_lag_seconds(StatusConnection(rows)) == expected
+
+
+def test_parse_hosts():
+    assert parse_hosts('db-r1, db-r2:3307,') == [('db-r1', None), ('db-r2', 3307)]
+    assert parse_hosts(None) == []
@@ -0,0 +1,171 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+import common.filters
+from common.filters import ItemQuery
+from common.repository import (MemoryItemRepository, MongoItemRepository, RepositoryError, SQLiteItemRepository,
+                               make_item_repository)
+from common.standins import MemoryCollection
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'mongo'])
+def repository(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryItemRepository()
+    elif request.param == 'sqlite':
+        repository = SQLiteItemRepository(str(tmp_path / 'items.sqlite3'))
+        yield repository
+        repository.pool.dispose()
+    else:
+        yield MongoItemRepository(MemoryCollection(), MemoryCollection())
+
+
+def item(name, price, description='', id=None):
+    return SimpleNamespace(id=id, name=name, description=description, price=Decimal(price))
+
+
+def test_single_item_crud(repository):
+    item_id = repository.create('apple', 'fruit', Decimal('1.50'))
+    row = repository.get(item_id)
+    assert row[:4] == (item_id, 'apple', 'fruit', Decimal('1.50'))
+    assert row[4] is not None and row[5] is not None
+
+    assert repository.update(item_id, 'pear', 'fruit', Decimal('2.00'))
+    assert repository.get(item_id)[1:4] == ('pear', 'fruit', Decimal('2.00'))
+    assert not repository.update(item_id + 100, 'x', None, Decimal('1'))
+
+    assert repository.delete(item_id)
+    assert repository.get(item_id) is None
+    assert not repository.delete(item_id)
+
+
+def test_versioned_update_is_a_compare_and_set(repository):
+    item_id = repository.create('apple', 'fruit', Decimal('1.50'))
+    assert repository.get(item_id)[6] == 1
+
+    assert repository.update(item_id, 'pear', 'fruit', Decimal('2.00'), version=1)
+    assert repository.get(item_id)[6] == 2
+    # a second writer holding version 1 loses
+    assert not repository.update(item_id, 'plum', 'fruit', Decimal('3.00'), version=1)
+    assert repository.get(item_id)[1] == 'pear'
+    # unconditional updates and bulk updates bump the version too
+    assert repository.update(item_id, 'plum', 'fruit', Decimal('3.00'))
+    repository.update_many([item('fig', '4', id=item_id)])
+    assert repository.get(item_id)[6] == 4
+
+
+def test_bulk_operations_report_found_ids(repository):
+    ids = repository.create_many([item('a', '1'), item('b', '2'), item('c', '3')])
+    assert len(ids) == 3 and ids == sorted(ids) and ids[-1] - ids[0] == 2
+
+    # found ids come with the price they had before the change
+    found = repository.update_many([item('A', '10', id=ids[0]), item('X', '1', id=ids[-1] + 50)])
+    assert found == {ids[0]: Decimal('1.00')}
+    assert repository.get(ids[0])[1] == 'A'
+
+    assert repository.delete_many([ids[1], ids[-1] + 50]) == {ids[1]: Decimal('2.00')}
+    assert repository.get(ids[1]) is None
+
+
+def test_single_writes_return_the_replaced_price(repository):
+    item_id = repository.create('apple', 'fruit', Decimal('1.50'))
+    assert repository.update(item_id, 'pear', 'fruit', Decimal('2.00')) == {item_id: Decimal('1.50')}
+    assert repository.update(item_id, 'plum', 'fruit', Decimal('3.00'), version=1) == {}
+
+    assert repository.delete(item_id) == {item_id: Decimal('2.00')}
+    assert repository.delete(item_id) == {}
+
+
+def test_listing_filters_sorts_and_pages(repository):
+    repository.create_many([item('apple', '1.50'), item('Apricot', '2.50'), item('banana', '0.50'),
+                            item('a_b', '3.00'), item('avocado', '2.50')])
+
+    query = ItemQuery.from_args({'name_prefix': 'ap', 'sort': '-price'})
+    with repository.listing(query) as listing:
+        rows, next_cursor = listing.page(10)
+    assert [row[1] for row in rows] == ['Apricot', 'apple']
+    assert next_cursor is None
+
+    # LIKE wildcards in the prefix are literal
+    with repository.listing(ItemQuery.from_args({'name_prefix': 'a_'})) as listing:
+        assert [row[1] for row in listing.page(10)[0]] == ['a_b']
+
+    seen = []
+    args = {'sort': 'price'}
+    while True:
+        with repository.listing(ItemQuery.from_args(args)) as listing:
+            rows, next_cursor = listing.page(2)
+        seen.extend(row[1] for row in rows)
+        if not next_cursor:
+            break
+        args['after'] = next_cursor
+    assert seen == ['banana', 'apple', 'Apricot', 'avocado', 'a_b']
+
+    listing = repository.listing(ItemQuery.from_args({'min_price': '2', 'max_price': '2.5'}))
+    assert [row[1] for row in listing.stream()] == ['Apricot', 'avocado']
+    listing.close()
+
+
+def test_listing_reads_only_selected_columns(repository):
+    repository.create_many([item('apple', '1.50', 'a long description'), item('banana', '0.50')])
+    with repository.listing(ItemQuery.from_args({'sort': 'price'}).select(('name',))) as listing:
+        rows, _ = listing.page(10)
+    assert [row[1] for row in rows] == ['banana', 'apple']
+    assert rows[0][3] is not None
+    if not isinstance(repository, MemoryItemRepository):
+        assert all(row[2] is None for row in rows)
+
+
+def test_listing_etag_tracks_changes(repository):
+    item_id = repository.create('apple', 'fruit', Decimal('1.50'))
+    with repository.listing(ItemQuery()) as listing:
+        before = listing.etag
+        assert listing.last_modified is not None
+    with repository.listing(ItemQuery()) as listing:
+        assert listing.etag == before
+    with repository.listing(ItemQuery(), variant='limit=5') as listing:
+        assert listing.etag != before
+
+    # deleting an item that isn't the newest still changes the fingerprint
+    repository.create('banana', 'fruit', Decimal('0.50'))
+    with repository.listing(ItemQuery()) as listing:
+        before = listing.etag
+    repository.delete(item_id)
+    with repository.listing(ItemQuery()) as listing:
+        assert listing.etag != before
+
+
+def test_unindexed_filters_are_refused_on_large_tables(monkeypatch):
+    repository = MemoryItemRepository()
+    repository.create_many([item('apple', '1'), item('banana', '2'), item('cherry', '3')])
+    monkeypatch.setattr(common.filters, 'LARGE_TABLE_ROWS', 2)
+
+    with pytest.raises(ValueError):
+        repository.listing(ItemQuery.from_args({'name_prefix': 'a', 'sort': 'price'}))
+    with repository.listing(ItemQuery.from_args({'name_prefix': 'a'})) as listing:
+        assert len(listing.page(10)[0]) == 1
+
+
+def test_mysql_repository_reports_connection_failures():
+    repository = make_item_repository('mysql', get_connection=lambda: None)
+    with pytest.raises(RepositoryError):
+        repository.get(1)
+
+
+def test_primary_get_skips_the_read_connection(tmp_path):
+    primary = SQLiteItemRepository(str(tmp_path / 'primary.sqlite3'))
+    replica = SQLiteItemRepository(str(tmp_path / 'replica.sqlite3'))
+    repository = make_item_repository('mysql', get_connection=primary.pool.get_connection,
+                                      get_read_connection=replica.pool.get_connection)
+    item_id = repository.create('apple', 'fruit', Decimal('1.50'))
+    assert repository.get(item_id) is None
+    assert repository.get(item_id, primary=True)[1] == 'apple'
+    primary.pool.dispose()
+    replica.pool.dispose()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        make_item_repository('cassandra')
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask, jsonify
+
+from common.serializers import SERIALIZER_MODES, ItemSerializer, install_json_provider, parse_fields
+from common.bench_serializers import ItemResponse
+
+ROWS = [(1, 'Item 1', 'Description 1', Decimal('10.50'), datetime(2025, 1, 1, 12, 0), datetime(2025, 1, 1, 12, 0)),
+        (2, 'Item 2', 'Description 2', Decimal('0.99'), datetime(2025, 1, 2, 12, 0), datetime(2025, 1, 2, 12, 0))]
+
+
+@pytest.mark.parametrize('mode', SERIALIZER_MODES)
+def test_all_modes_produce_the_same_page(mode):
+    body = json.loads(ItemSerializer(ItemResponse, mode).dumps_page(ROWS, 'abc'))
+    assert body == {
+        'items': [
+            {'id': 1, 'name': 'Item 1', 'description': 'Description 1', 'price': 10.5, 'created_at': '2025-01-01T12:00:00'},
+            {'id': 2, 'name': 'Item 2', 'description': 'Description 2', 'price': 0.99, 'created_at': '2025-01-02T12:00:00'},
+        ],
+        'next_cursor': 'abc',
+    }
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ItemSerializer(ItemResponse, 'fast')
+
+
+def test_json_provider_handles_decimal():
+    app = Flask(__name__)
+    install_json_provider(app)
+    with app.app_context():
+        assert json.loads(jsonify(price=Decimal('1.25'), name='x').get_data()) == {'price': '1.25', 'name': 'x'}
+
+
+@pytest.mark.parametrize('mode', SERIALIZER_MODES)
+def test_projection_emits_only_the_requested_fields(mode):
+    fields = parse_fields('price, id,name', ItemResponse)
+    assert fields == ('id', 'name', 'price')
+    base = ItemSerializer(ItemResponse, mode)
+    serializer = base.project(fields)
+    assert base.project(fields) is serializer
+    assert base.project(None) is base
+    # a narrowed SELECT leaves the other columns NULL
+    rows = [row[:2] + (None, row[3], None, None) for row in ROWS]
+    assert json.loads(serializer.dumps_page(rows)) == {
+        'items': [{'id': 1, 'name': 'Item 1', 'price': 10.5}, {'id': 2, 'name': 'Item 2', 'price': 0.99}],
+        'next_cursor': None,
+    }
+    assert list(serializer.model.model_fields) == ['id', 'name', 'price']
+
+
+def test_unknown_fields_are_rejected():
+    assert parse_fields(None, ItemResponse) is None
+    assert parse_fields('', ItemResponse) is None
+    with pytest.raises(ValueError, match='secret'):
+        parse_fields('id,secret', ItemResponse)
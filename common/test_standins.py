@@ -0,0 +1,81 @@
+import mysql.connector
+import pytest
+
+from common.db_pool import ConnectionPool
+from common.etag import collection_validators
+from common.filters import ItemQuery
+from common.standins import MemoryCollection, sqlite_creator
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(pool_size=2, creator=sqlite_creator(str(tmp_path / 'items.sqlite3')))
+    yield pool
+    pool.dispose()
+
+
+def insert_items(pool, rows):
+    conn = pool.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO items (name, description, price) VALUES (%s, %s, %s)", rows)
+    first_id = cursor.lastrowid
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return first_id
+
+
+def test_sqlite_standin_runs_the_item_queries(pool):
+    first_id = insert_items(pool, [('apple', 'fruit', 1.5), ('apricot', 'fruit', 2.5), ('banana', 'fruit', 0.5)])
+    assert first_id == 1
+
+    conn = pool.get_connection()
+    etag, last_modified = collection_validators(conn)
+    assert etag and last_modified.year >= 2024
+
+    query = ItemQuery.from_args({'name_prefix': 'ap', 'sort': '-price'})
+    cursor = conn.cursor()
+    cursor.execute(*query.page_sql(10))
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    assert [row[1] for row in rows] == ['apricot', 'apple']
+    assert rows[0][4].year >= 2024
+
+
+def test_sqlite_standin_raises_mysql_errors(pool):
+    conn = pool.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", ('someone', 'x'))
+    conn.commit()
+    with pytest.raises(mysql.connector.IntegrityError):
+        cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", ('someone', 'y'))
+    conn.rollback()
+    cursor.close()
+    conn.close()
+
+
+def test_sqlite_standin_bumps_updated_at(pool):
+    item_id = insert_items(pool, [('apple', 'fruit', 1.5)])
+    conn = pool.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT updated_at FROM items WHERE id = %s", (item_id,))
+    before = cursor.fetchone()[0]
+    cursor.execute("UPDATE items SET price = %s WHERE id = %s", (2.0, item_id))
+    cursor.execute("SELECT updated_at FROM items WHERE id = %s", (item_id,))
+    after = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+    assert after >= before
+
+
+def test_memory_collection_crud():
+    collection = MemoryCollection()
+    inserted_id = collection.insert_one({"name": "a"}).inserted_id
+
+    assert collection.find_one({"_id": inserted_id})["name"] == "a"
+    assert collection.update_one({"_id": inserted_id}, {"$set": {"name": "b"}}).matched_count == 1
+    assert [doc["name"] for doc in collection.find()] == ["b"]
+    assert collection.delete_one({"_id": inserted_id}).deleted_count == 1
+    assert collection.find_one({"_id": inserted_id}) is None
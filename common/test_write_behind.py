@@ -0,0 +1,132 @@
+import threading
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from common.repository import MemoryItemRepository, RepositoryError
+from common.write_behind import GroupCommitter, QueueFull, RedisTicketStore
+
+
+def item(i):
+    return SimpleNamespace(name=f"item {i}", description=None, price=Decimal('1.00'))
+
+
+class FailingRepository:
+    def create_many(self, items):
+        raise RepositoryError("Database error: disk full")
+
+
+class BlockedRepository(MemoryItemRepository):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def create_many(self, items):
+        self.release.wait(5)
+        return super().create_many(items)
+
+
+def test_items_are_committed_in_batches():
+    repository = MemoryItemRepository()
+    committer = GroupCommitter(repository, max_batch=10, max_delay=0.5)
+    tickets = [committer.submit(item(i)) for i in range(25)]
+
+    ids = [ticket.result(timeout=5) for ticket in tickets]
+    assert ids == sorted(ids) and len(set(ids)) == 25
+    assert repository.get(ids[0])[1] == 'item 0'
+
+    stats = committer.stats()
+    assert stats['committed'] == 25
+    assert stats['batches'] == 3
+    assert stats['max_batch_size'] == 10
+    assert committer.flush(timeout=5)
+    assert committer.ticket_state(tickets[0].id) == {"ticket": tickets[0].id, "status": "committed", "id": ids[0]}
+    committer.close()
+
+
+def test_partial_batch_is_flushed_after_max_delay():
+    committer = GroupCommitter(MemoryItemRepository(), max_batch=100, max_delay=0.01)
+    ticket = committer.submit(item(1))
+    assert ticket.result(timeout=5) == 1
+    assert committer.stats()['last_batch_size'] == 1
+    committer.close()
+
+
+def test_flush_writes_without_waiting_for_the_delay():
+    committer = GroupCommitter(MemoryItemRepository(), max_batch=100, max_delay=60)
+    tickets = [committer.submit(item(i)) for i in range(3)]
+    assert committer.flush(timeout=5)
+    assert all(ticket.future.done() for ticket in tickets)
+    committer.close()
+
+
+def test_full_queue_is_rejected():
+    repository = BlockedRepository()
+    committer = GroupCommitter(repository, max_batch=1, max_delay=0, max_queue=2)
+    first = committer.submit(item(0))
+    # wait until the flusher holds the first item, then fill the queue
+    while committer.stats()['queue_depth']:
+        time.sleep(0.001)
+    committer.submit(item(1))
+    committer.submit(item(2))
+    with pytest.raises(QueueFull):
+        committer.submit(item(3))
+    assert committer.stats()['rejected'] == 1
+
+    repository.release.set()
+    assert first.result(timeout=5) == 1
+    committer.close()
+
+
+def test_commit_errors_reach_every_ticket():
+    committer = GroupCommitter(FailingRepository(), max_batch=5, max_delay=0.01)
+    tickets = [committer.submit(item(i)) for i in range(2)]
+    for ticket in tickets:
+        with pytest.raises(RepositoryError):
+            ticket.result(timeout=5)
+        assert ticket.as_dict()['status'] == 'failed'
+    assert committer.stats()['failed'] == 2
+    committer.close()
+
+
+# The hash commands RedisTicketStore pipelines, on one dict shared like a Redis server
+class FakeRedisHashes:
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = str(value).encode()
+
+    def hsetnx(self, key, field, value):
+        self.hashes.setdefault(key, {}).setdefault(field.encode(), str(value).encode())
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def execute(self):
+        pass
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+def test_ticket_states_are_shared_through_redis():
+    redis = FakeRedisHashes()
+    committer = GroupCommitter(MemoryItemRepository(), max_batch=100, max_delay=60,
+                               tickets=RedisTicketStore(redis, ttl=600))
+    # another worker, polling the same Redis
+    other = GroupCommitter(MemoryItemRepository(), tickets=RedisTicketStore(redis, ttl=600))
+
+    ticket = committer.submit(item(1))
+    assert other.ticket_state(ticket.id) == {"ticket": ticket.id, "status": "queued"}
+    assert committer.flush(timeout=5)
+    assert other.ticket_state(ticket.id) == {"ticket": ticket.id, "status": "committed", "id": 1}
+    assert set(redis.ttls.values()) == {600}
+    assert other.ticket_state('unknown') is None
+    committer.close()
@@ -0,0 +1,288 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError
+
+CREATE_MODES = ('direct', 'async', 'strong')
+
+
+class QueueFull(Exception):
+    pass
+
+
+# One queued create. `future` resolves to the new item id once its batch commits.
+class Ticket:
+    def __init__(self, item):
+        self.id = uuid.uuid4().hex
+        self.item = item
+        self.queued_at = time.monotonic()
+        self.future = Future()
+
+    # The item id, or None if the batch hasn't committed within `timeout`.
+    # Re-raises the commit error if the batch failed.
+    def result(self, timeout=None):
+        try:
+            return self.future.result(timeout)
+        except TimeoutError:
+            return None
+
+    def as_dict(self):
+        if not self.future.done():
+            return {"ticket": self.id, "status": "queued"}
+        if self.future.exception() is not None:
+            return {"ticket": self.id, "status": "failed", "error": str(self.future.exception())}
+        return {"ticket": self.id, "status": "committed", "id": self.future.result()}
+
+
+# Ticket states by id ({"ticket", "status", and "id" or "error"}) in a per-process
+# dict, keeping the latest `max_tickets`. Right for a single worker only: a poll
+# that lands on another worker finds nothing.
+class LocalTicketStore:
+    def __init__(self, max_tickets=10000):
+        self.max_tickets = max_tickets
+        self._tickets = OrderedDict()
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    # Record a new ticket's state, unless its batch has already reported back
+    def add(self, ticket_id, state):
+        with self._lock:
+            self._tickets.setdefault(ticket_id, state)
+            while len(self._tickets) > self.max_tickets:
+                self._tickets.popitem(last=False)
+
+    # {ticket_id: state}, replacing what was there
+    def update(self, states):
+        with self._lock:
+            self._tickets.update(states)
+            while len(self._tickets) > self.max_tickets:
+                self._tickets.popitem(last=False)
+
+    def get(self, ticket_id):
+        with self._lock:
+            return self._tickets.get(ticket_id)
+
+
+# Ticket states as Redis hashes that expire `ttl` seconds after the last write,
+# so a poll can land on any worker or node. add() only sets fields that are
+# missing, so a batch that reports back first isn't overwritten by "queued".
+# If Redis can't be reached, states go to a local store and polls see those.
+class RedisTicketStore:
+    def __init__(self, client, ttl=3600, prefix='write_behind:ticket:', fallback=None):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.fallback = fallback or LocalTicketStore()
+        self.errors = 0
+
+    def _write(self, states, command):
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for ticket_id, state in states.items():
+                key = self.prefix + ticket_id
+                for field, value in state.items():
+                    getattr(pipe, command)(key, field, value)
+                pipe.expire(key, self.ttl)
+            pipe.execute()
+            return True
+        except Exception:
+            self.errors += 1
+            return False
+
+    def add(self, ticket_id, state):
+        if not self._write({ticket_id: state}, 'hsetnx'):
+            self.fallback.add(ticket_id, state)
+
+    def update(self, states):
+        if not self._write(states, 'hset'):
+            self.fallback.update(states)
+
+    def get(self, ticket_id):
+        try:
+            raw = self.client.hgetall(self.prefix + ticket_id)
+        except Exception:
+            self.errors += 1
+            raw = None
+        if not raw:
+            return self.fallback.get(ticket_id)
+        state = {key.decode(): value.decode() for key, value in raw.items()}
+        if 'id' in state:
+            state['id'] = int(state['id'])
+        return state
+
+
+def make_ticket_store(redis_url=None, ttl=3600):
+    if redis_url:
+        import redis
+        client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return RedisTicketStore(client, ttl=ttl)
+    return LocalTicketStore()
+
+
+# Write-behind group commit for item creates: validated items are queued and a
+# background thread writes them with one multi-row INSERT and one COMMIT per
+# batch. A batch is flushed when it reaches `max_batch` items or when its oldest
+# item has waited `max_delay` seconds. At most `max_queue` items wait at a time;
+# beyond that submit() raises QueueFull so the caller can answer 503. Ticket
+# states go to `tickets` (see make_ticket_store) for ticket_state() to read back.
+class GroupCommitter:
+    def __init__(self, repository, max_batch=500, max_delay=0.005, max_queue=10000, tickets=None):
+        self.repository = repository
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.tickets = tickets or LocalTicketStore()
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._flush_now = False
+        self._flushing = 0
+
+        self.batches = 0
+        self.committed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.last_batch_size = 0
+        self.max_batch_seen = 0
+        self._commit_time_total = 0.0
+        self._commit_time_max = 0.0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    # The flusher starts on first use and again after a fork (threads don't survive one)
+    def _ensure_thread(self):
+        if self._thread is None or self._pid != os.getpid():
+            if self._pid != os.getpid():
+                self._queue.clear()
+                self._flushing = 0
+            self._pid = os.getpid()
+            if self._thread is None:
+                atexit.register(self.close)
+            self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        ticket = Ticket(item)
+        with self._cond:
+            if self._closed:
+                raise QueueFull("Write queue is closed")
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull("Write queue is full")
+            self._ensure_thread()
+            self._queue.append(ticket)
+            self._cond.notify_all()
+        self.tickets.add(ticket.id, {"ticket": ticket.id, "status": "queued"})
+        return ticket
+
+    # The ticket's state as a dict, or None if it is unknown or has expired
+    def ticket_state(self, ticket_id):
+        return self.tickets.get(ticket_id)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            deadline = self._queue[0].queued_at + self.max_delay
+            while len(self._queue) < self.max_batch and not self._closed and not self._flush_now:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+            if not self._queue:
+                self._flush_now = False
+            self._flushing += 1
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._commit(batch)
+
+    def _commit(self, batch):
+        started = time.monotonic()
+        try:
+            ids = self.repository.create_many([ticket.item for ticket in batch])
+            error = None
+        except Exception as e:
+            ids, error = None, e
+        finished = time.monotonic()
+
+        for index, ticket in enumerate(batch):
+            if error is None:
+                ticket.future.set_result(ids[index])
+            else:
+                ticket.future.set_exception(error)
+        self.tickets.update({ticket.id: ticket.as_dict() for ticket in batch})
+
+        with self._cond:
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self._commit_time_total += finished - started
+            self._commit_time_max = max(self._commit_time_max, finished - started)
+            for ticket in batch:
+                latency = finished - ticket.queued_at
+                self._latency_total += latency
+                self._latency_max = max(self._latency_max, latency)
+            if error is None:
+                self.committed += len(batch)
+            else:
+                self.failed += len(batch)
+            self._flushing -= 1
+            self._cond.notify_all()
+
+    # Block until everything queued so far has been written
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_now = bool(self._queue)
+            self._cond.notify_all()
+            while self._queue or self._flushing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # Stop accepting items and drain the queue; registered to run at exit
+    def close(self, timeout=10.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            items = self.committed + self.failed
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue": self.max_queue,
+                "max_batch": self.max_batch,
+                "max_delay": self.max_delay,
+                "batches": self.batches,
+                "committed": self.committed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "last_batch_size": self.last_batch_size,
+                "max_batch_size": self.max_batch_seen,
+                "avg_batch_size": round(items / self.batches, 2) if self.batches else 0.0,
+                "commit_time_avg": round(self._commit_time_total / self.batches, 6) if self.batches else 0.0,
+                "commit_time_max": round(self._commit_time_max, 6),
+                "latency_avg": round(self._latency_total / items, 6) if items else 0.0,
+                "latency_max": round(self._latency_max, 6),
+                "ticket_store_errors": self.tickets.errors,
+            }
@@ -0,0 +1,94 @@
+# gunicorn settings for the Flask apps. From the repository root:
+#   gunicorn --chdir MySQL 'mysql_crud:create_app()'
+#   gunicorn --chdir EndToEndTesting 'crud_mysql:create_app()'
+# (gunicorn picks up ./gunicorn.conf.py; elsewhere pass -c path/to/gunicorn.conf.py).
+# The asyncio app is served by Hypercorn instead.
+#
+# gthread workers: one process per core, each running `threads` requests at a
+# time, so blocking MySQL/Redis calls overlap without one process per request.
+# The app is built once in the master by create_app() and forked (preload_app);
+# building it opens no connections and starts no threads, the connection pools
+# reset themselves in each child, and each worker starts its own background
+# threads in post_fork, so nothing is shared across processes.
+import multiprocessing
+import os
+import signal
+import threading
+
+# Behind a load balancer or ingress, set TRUSTED_PROXIES to the number of proxies
+# in front so per-IP rate limits use the client address from X-Forwarded-For
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+preload_app = True
+
+# Write-behind tickets (CREATE_ITEM_MODE=async, or strong past GROUP_COMMIT_WAIT)
+# are polled on whichever worker the request lands on. Without Redis they only
+# exist in the worker that queued the write, so that takes a single worker.
+if os.getenv('CREATE_ITEM_MODE', 'direct') != 'direct' and workers > 1 and not os.getenv('REDIS_URL'):
+    raise RuntimeError(f"CREATE_ITEM_MODE={os.environ['CREATE_ITEM_MODE']} with {workers} workers needs "
+                       "REDIS_URL for ticket state; set it or run WEB_CONCURRENCY=1")
+
+# Keep-alive connections idle this long; set above the load balancer's idle timeout
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+# On SIGTERM a worker stops accepting and gets this long to finish in-flight requests
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Recycle workers now and then; the jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+# Worker heartbeat files on tmpfs, so a slow disk can't get workers killed
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+errorlog = '-'
+
+# Per-worker sizes create_app() reads from the environment: a DB connection for
+# every request thread, one hashing process (the workers already spread hashing
+# over the cores), and only a few event streams, since each holds a request thread
+os.environ.setdefault('MYSQL_POOL_SIZE', str(threads))
+os.environ.setdefault('HASH_WORKERS', '1')
+os.environ.setdefault('ITEM_FEED_MAX_CLIENTS', str(max(1, threads // 4)))
+
+
+# See common/lifecycle.py
+def _lifecycle(app):
+    extensions = getattr(app, 'extensions', None) or {}
+    return extensions.get('lifecycle')
+
+
+# In the master, with the app preloaded and before any worker is forked
+def on_starting(server):
+    if server.cfg.preload_app:
+        lifecycle = _lifecycle(server.app.wsgi())
+        if lifecycle is not None:
+            lifecycle.startup()
+
+
+# In each worker right after the fork: start its event subscriber and blocklist sync
+def post_fork(server, worker):
+    lifecycle = _lifecycle(worker.app.wsgi())
+    if lifecycle is not None:
+        lifecycle.worker_start()
+
+
+# Drain as soon as a worker is told to stop (event streams would otherwise hold
+# it until graceful_timeout), then let gunicorn's own handler stop the worker
+def post_worker_init(worker):
+    lifecycle = _lifecycle(worker.wsgi)
+    if lifecycle is None:
+        return
+    handle_exit = worker.handle_exit
+
+    def drain_and_exit(sig, frame):
+        handle_exit(sig, frame)
+        threading.Thread(target=lifecycle.drain, name='drain', daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain_and_exit)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+# After the worker has stopped serving: flush queued writes, close pools
+def worker_exit(server, worker):
+    lifecycle = _lifecycle(getattr(worker, 'wsgi', None))
+    if lifecycle is not None:
+        lifecycle.shutdown()